@@ -0,0 +1,359 @@
+import os
+import json
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import List, Dict
+from pocketcoach.params import *
+
+BQ_PROJECT = "lewagon-bootcamp-457509"
+BQ_TABLE_ID = "lewagon-bootcamp-457509.pocketcoachbq.user_sentiment"
+
+
+class SinkError(Exception):
+    """
+    Raised by a sink when a batch could not be written and should be retried.
+    """
+
+
+class BigQuerySink:
+    """
+    Streams rows into the BigQuery user_sentiment table with one client per process.
+    """
+
+    def __init__(self, project: str = BQ_PROJECT, table_id: str = BQ_TABLE_ID):
+        self.project = project
+        self.table_id = table_id
+        self._client = None
+
+    def write(self, rows: List[Dict]) -> None:
+        if self._client is None:
+            from google.cloud import bigquery
+            self._client = bigquery.Client(project=self.project)
+        try:
+            errors = self._client.insert_rows_json(self.table_id, rows)
+        except Exception as e:
+            raise SinkError(f"BigQuery insert failed: {e}") from e
+        if errors:
+            # Row level errors (e.g. schema mismatches) do not go away on retry
+            logging.error(f"BigQuery insert errors: {errors}")
+
+
+class JsonlSink:
+    """
+    Appends rows as JSON lines to a local file, a stand-in for BigQuery.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, rows: List[Dict]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+
+class SQLiteSink:
+    """
+    Inserts rows into a local SQLite table, a stand-in for BigQuery.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS user_sentiment (row TEXT NOT NULL)")
+
+    def write(self, rows: List[Dict]) -> None:
+        # Only the exporter thread writes, a short-lived connection is enough
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT INTO user_sentiment (row) VALUES (?)",
+                [(json.dumps(row),) for row in rows],
+            )
+
+
+class NullSink:
+    def write(self, rows: List[Dict]) -> None:
+        pass
+
+
+class AnalyticsExporter:
+    """
+    Background exporter for analytics rows.
+
+    `submit` only puts the row on a bounded in-memory queue and never blocks:
+    when the queue is full the row is dropped and counted. A worker thread
+    flushes the queue to the sink in batches of `batch_size` rows or every
+    `flush_interval_s` seconds, retrying failed batches with exponential
+    backoff. Batches that still fail are spilled to a local JSON lines file
+    and replayed after the next successful write.
+
+    A batch failing all retries also opens a breaker: for `breaker_s` seconds
+    batches are spilled without trying the sink, then a single attempt probes
+    it. So an outage does not hold the worker in backoff while the queue fills
+    up and rows get dropped.
+
+    Every process spills to its own `<spill stem>.<pid>.jsonl`, so pre-forked
+    workers sharing ANALYTICS_SPILL_PATH never append to or replay the same
+    file. Spills of processes that have exited are replayed by the others.
+    """
+
+    def __init__(
+        self,
+        sink,
+        max_queue_size=ANALYTICS_QUEUE_SIZE,
+        batch_size=ANALYTICS_BATCH_SIZE,
+        flush_interval_s=ANALYTICS_FLUSH_INTERVAL_S,
+        max_retries=ANALYTICS_MAX_RETRIES,
+        backoff_s=0.5,
+        spill_path: Path = ANALYTICS_SPILL_PATH,
+        breaker_s=ANALYTICS_BREAKER_S,
+    ):
+        self.sink = sink
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.spill_path = Path(spill_path)
+        self.breaker_s = breaker_s
+
+        self._start_lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._stop = None
+        self._pid = None
+        # Sink considered down until then (time.monotonic()), None while closed
+        self._breaker_until = None
+        # Maintained by the worker, so stats() never scans the spill directory
+        self._spill_pending = False
+        self._stats = {
+            "submitted": 0, "dropped": 0, "written": 0, "batches": 0, "retries": 0,
+            "spilled": 0, "replayed": 0, "corrupt": 0, "errors": 0, "breaker_trips": 0,
+        }
+
+    def submit(self, row: Dict) -> bool:
+        """
+        Queues a row for export. Returns False if the queue was full.
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._stats["dropped"] += 1
+            return False
+        self._stats["submitted"] += 1
+        return True
+
+    def stats(self) -> dict:
+        return dict(
+            self._stats,
+            queue_depth=self._queue.qsize() if self._queue is not None else 0,
+            spill_pending=self._spill_pending,
+            breaker_open=self._breaker_until is not None,
+        )
+
+    def close(self, timeout=10.0):
+        """
+        Flushes the rows still queued and stops the worker thread.
+        """
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _worker_running(self) -> bool:
+        # After close() the stopped thread is not restarted
+        return self._pid == os.getpid() and self._thread is not None and (self._thread.is_alive() or self._stop.is_set())
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, each process starts its own worker
+        if self._worker_running():
+            return
+        with self._start_lock:
+            if self._worker_running():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+                self._stop = threading.Event()
+                self._pid = os.getpid()
+            elif self._thread is not None:
+                logging.error("Analytics exporter thread died, restarting it")
+            self._thread = threading.Thread(target=self._run, name="analytics-exporter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            self._spill_pending = bool(self._pending_spills())
+        except OSError:
+            logging.exception("Could not look for analytics spill files")
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = []
+            try:
+                deadline = time.monotonic() + self.flush_interval_s
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or (self._stop.is_set() and self._queue.empty()):
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+                    except queue.Empty:
+                        continue
+                if batch:
+                    self._flush(batch)
+            except Exception:
+                # The thread keeps running, only this batch is lost
+                self._stats["errors"] += 1
+                logging.exception(f"Analytics export failed, lost {len(batch)} rows")
+
+    def _flush(self, rows: List[Dict]):
+        if self._breaker_until is not None and time.monotonic() < self._breaker_until:
+            self._spill(rows)
+        elif self._write_with_retry(rows):
+            self._replay_spill()
+        else:
+            self._spill(rows)
+
+    def _write_with_retry(self, rows: List[Dict]) -> bool:
+        """
+        Writes `rows` to the sink, with retries unless the breaker has been
+        open (then one attempt probes the sink). Opens the breaker on failure
+        and closes it on success.
+        """
+        retries = 0 if self._breaker_until is not None else self.max_retries
+        if self._write(rows, retries):
+            if self._breaker_until is not None:
+                logging.info("Analytics sink is back, closing the breaker")
+            self._breaker_until = None
+            return True
+        if self._breaker_until is None:
+            self._stats["breaker_trips"] += 1
+            logging.error(f"Analytics sink down, spilling without retries for {self.breaker_s}s")
+        self._breaker_until = time.monotonic() + self.breaker_s
+        return False
+
+    def _write(self, rows: List[Dict], retries: int) -> bool:
+        delay = self.backoff_s
+        for attempt in range(retries + 1):
+            try:
+                self.sink.write(rows)
+                self._stats["written"] += len(rows)
+                self._stats["batches"] += 1
+                return True
+            except Exception as e:
+                logging.warning(f"Analytics export failed (attempt {attempt + 1}): {e}")
+                if attempt == retries:
+                    return False
+                self._stats["retries"] += 1
+                # Stop waiting between retries on shutdown, the batch is spilled instead
+                if self._stop.wait(delay):
+                    return False
+                delay *= 2
+        return False
+
+    def _spill_file(self, pid: int = None, suffix: str = None) -> Path:
+        return self.spill_path.with_name(
+            f"{self.spill_path.stem}.{pid or os.getpid()}{suffix or self.spill_path.suffix}"
+        )
+
+    def _pending_spills(self) -> List[Path]:
+        """
+        Spill and interrupted replay files of this process and of processes
+        that no longer run, plus a spill file of older versions without pid.
+        """
+        pending = [self.spill_path] if self.spill_path.exists() else []
+        for path in self.spill_path.parent.glob(f"{self.spill_path.stem}.*"):
+            pid, _, suffix = path.name[len(self.spill_path.stem) + 1:].partition(".")
+            if not pid.isdigit() or f".{suffix}" not in (self.spill_path.suffix, ".replay"):
+                continue
+            if int(pid) == os.getpid() or not _process_alive(int(pid)):
+                pending.append(path)
+        return pending
+
+    def _spill(self, rows: List[Dict]):
+        spill_file = self._spill_file()
+        spill_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(spill_file, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        self._stats["spilled"] += len(rows)
+        self._spill_pending = True
+        logging.warning(f"Spilled {len(rows)} analytics rows to {spill_file}")
+
+    def _replay_spill(self):
+        for path in self._pending_spills():
+            # Claimed by renaming, of two processes replaying the same dead
+            # process's spill only one succeeds
+            replay_path = self._spill_file(suffix=".replay")
+            if path != replay_path:
+                if replay_path.exists():
+                    continue  # our own unfinished replay is picked up first
+                try:
+                    os.replace(path, replay_path)
+                except FileNotFoundError:
+                    continue
+            rows = []
+            with open(replay_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        rows.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        self._stats["corrupt"] += 1
+                        logging.error(f"Skipping corrupt analytics spill line in {path}: {line[:200]!r}")
+            failed = False
+            for i in range(0, len(rows), self.batch_size):
+                chunk = rows[i:i + self.batch_size]
+                if self._write_with_retry(chunk):
+                    self._stats["replayed"] += len(chunk)
+                else:
+                    self._spill(rows[i:])
+                    failed = True
+                    break
+            os.remove(replay_path)
+            if failed:
+                return
+        self._spill_pending = False
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+
+def make_sink(kind: str = ANALYTICS_SINK):
+    """
+    Builds the sink selected by ANALYTICS_SINK: bigquery, jsonl, sqlite or none.
+    """
+    if kind == "bigquery":
+        return BigQuerySink()
+    if kind == "jsonl":
+        return JsonlSink(ANALYTICS_PATH)
+    if kind == "sqlite":
+        return SQLiteSink(ANALYTICS_PATH)
+    if kind == "none":
+        return NullSink()
+    raise ValueError(f"Unknown ANALYTICS_SINK {kind}, use bigquery, jsonl, sqlite or none")
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def get_analytics_exporter() -> AnalyticsExporter:
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = AnalyticsExporter(make_sink())
+    return _exporter
@@ -1,82 +1,194 @@
-import os
-import json
+import asyncio
 import threading
 import logging
-from typing import List, Dict
-from pathlib import Path
-from langchain.memory import ConversationBufferMemory
-from pocketcoach.llm_logic.llm_logic import pick_random_question
+import uuid
+from typing import List, Dict, TYPE_CHECKING
+from collections import OrderedDict
+from pocketcoach.llm_logic.llm_logic import pick_random_question, asummarize_history, LLMBusyError, LLMTimeoutError
+from pocketcoach.llm_logic.history import CHARS_PER_TOKEN
+from pocketcoach.metrics import timed
+from pocketcoach import params
 from pocketcoach.params import *
-from google.cloud import bigquery
 from datetime import datetime
-import os
 
-# Store sessions for long term ### Change to Database in the future
-SESSIONS_DIR = Path("sessions")
-SESSIONS_DIR.mkdir(exist_ok=True)
-USER_SESSION_FILE = Path("sessions/user_sessions.json")
+from api.session_store import get_session_store
+from api.session_locks import session_lock
+from api.user_directory import get_user_directory
+from api.analytics import get_analytics_exporter
 
-# Global lock to protect file operations in multithreaded context
-_lock = threading.Lock()
+if TYPE_CHECKING:
+    from langchain.memory import ConversationBufferMemory
 
-def _session_file_path(session_id: str) -> str:
-    """
-    Returns the full file path for a given session_id.
-    """
-    return os.path.join(SESSIONS_DIR, f"{session_id}.json")
+def session_exists(session_id: str) -> bool:
+    return get_session_store().exists(session_id)
 
 def get_or_create_session(session_id: str):
-    session_file = SESSIONS_DIR / f"{session_id}.json"
-    if not session_file.exists():
-        with open(session_file, "w") as f:
-            json.dump({"messages": []}, f, indent=2)
-    return session_id, not session_file.exists()
+    """
+    Returns (session_id, created). A new id is generated when none is given.
+    """
+    if session_id is None:
+        session_id = str(uuid.uuid4())
+    created = get_session_store().create(session_id)
+    if created:
+        _invalidate_history_version(session_id)
+    return session_id, created
 
 def append_to_history(session_id: str, role: str, content: str, sentiment=None):
-    session_file = SESSIONS_DIR / f"{session_id}.json"
-    if not session_file.exists():
-        logging.error(f"Session file {session_file} does not exist when trying to append.")
-        raise KeyError("Session file does not exist")
-    with open(session_file, "r") as f:
-        data = json.load(f)
     message = {"role": role, "content": content}
     if sentiment is not None:
         message["sentiment"] = sentiment
-    data.setdefault("messages", []).append(message)
-    with open(session_file, "w") as f:
-        json.dump(data, f, indent=2)
-    logging.info(f"Appended message to {session_file}")
+    # Held until the cached memory is updated, so it sees appends in store order
+    with session_lock(session_id):
+        try:
+            get_session_store().append(session_id, message)
+        except KeyError:
+            logging.error(f"Session {session_id} does not exist when trying to append.")
+            evict_memory(session_id)
+            raise
+        finally:
+            _invalidate_history_version(session_id)
+        _update_cached_memory(session_id, role, content)
+    logging.info(f"Appended message to session {session_id}")
 
 def get_history_for_session(session_id: str) -> List[Dict[str, str]]:
     """
     Return the structured history list for the session: a list of {"role":..., "content":..., "timestamp":...}.
     Raises KeyError if session not found.
     """
-    path = _session_file_path(session_id)
-    with _lock:
-        if not os.path.isfile(path):
-            raise KeyError(f"Session {session_id} not found")
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    # Return a copy of messages list
-    messages = data.get("messages", [])
-    # We can omit timestamp if not needed by client; here we return full entries.
-    return list(messages)
-
-def get_memory_for_session(session_id: str) -> ConversationBufferMemory:
-    """
-    Reconstruct a new ConversationBufferMemory for this session by replaying messages from the JSON file.
-    We iterate through the messages list and for each user->assistant pair, we call save_context.
+    return get_session_store().messages(session_id)
+
+# Validators of recently read histories, so polling an unchanged history is
+# answered without touching the store. Writes in this process invalidate them,
+# writes in other worker processes cannot, so multi-worker setups turn the
+# cache off with HISTORY_VALIDATOR_CACHE=false. Both switches are read from
+# params at call time, api.prefork sets them for its workers.
+_history_versions = OrderedDict()
+_history_versions_lock = threading.Lock()
+# Bumped by every invalidation, a version read from the store is only cached
+# if no write happened meanwhile
+_history_generation = 0
+
+def get_cached_history_version(session_id: str):
+    """
+    Returns the cached (token, last_modified) of the session, or None.
+    """
+    if not params.HISTORY_VALIDATOR_CACHE:
+        return None
+    with _history_versions_lock:
+        version = _history_versions.get(session_id)
+        if version is not None:
+            _history_versions.move_to_end(session_id)
+        return version
+
+def get_history_version(session_id: str):
+    """
+    Returns (token, last_modified) of the session history, a cheap stat or
+    index lookup in the store. Raises KeyError if session not found.
+    """
+    version = get_cached_history_version(session_id)
+    if version is not None:
+        return version
+    generation = _history_generation
+    version = get_session_store().version(session_id)
+    if params.HISTORY_VALIDATOR_CACHE:
+        with _history_versions_lock:
+            if generation != _history_generation:
+                return version
+            _history_versions[session_id] = version
+            while len(_history_versions) > MEMORY_CACHE_SIZE:
+                _history_versions.popitem(last=False)
+    return version
+
+def _invalidate_history_version(session_id: str):
+    global _history_generation
+    with _history_versions_lock:
+        _history_generation += 1
+        _history_versions.pop(session_id, None)
+
+def get_history_page(session_id: str, after: int = None, last: int = None, limit: int = None) -> Dict:
+    """
+    Returns a page of the history: the `last` newest messages, the messages
+    after message id `after`, or the first `limit` ones (everything if no
+    argument is given). Message ids are positions in the history.
     Raises KeyError if session not found.
     """
-    path = _session_file_path(session_id)
-    with _lock:
-        if not os.path.isfile(path):
-            raise KeyError(f"Session {session_id} not found")
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    messages = data.get("messages", [])
+    if last is not None:
+        start, stop = -last, None
+    else:
+        start = after + 1 if after is not None else 0
+        stop = start + limit if limit is not None else None
+    messages, start, total = get_session_store().page(session_id, start, stop)
+    return {
+        "history": messages,
+        "total": total,
+        "has_earlier": start > 0,
+        "has_more": start + len(messages) < total,
+    }
+
+class _CachedMemory:
+    """
+    A live ConversationBufferMemory plus the user message still waiting for
+    its assistant reply, so appends can be applied incrementally, and the
+    session's running summary.
+    """
+
+    def __init__(self, memory: "ConversationBufferMemory"):
+        self.memory = memory
+        self.pending_user_text = None
+        self.message_count = 0
+        self.summary = None
+        self.summary_upto = 0
+
+    def add(self, role: str, content: str):
+        self.message_count += 1
+        # Mirrors the pairing rules of the replay in _build_memory
+        if role == "user":
+            self.pending_user_text = content
+        elif role == "assistant" and self.pending_user_text is not None:
+            self.memory.save_context({"user_text": self.pending_user_text}, {"response": content})
+            self.pending_user_text = None
+            _trim_memory(self.memory)
+
+    def context(self):
+        """
+        (memory, summary, unsummarized): the number of newest messages in
+        memory that the summary does not cover yet.
+        """
+        unsummarized = self.message_count - self.summary_upto - (self.pending_user_text is not None)
+        return self.memory, self.summary, unsummarized
+
+
+# Live per-session memories, least recently used first
+_memory_cache = OrderedDict()
+_memory_cache_lock = threading.Lock()
+_memory_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "stale": 0}
+
+def _trim_memory(memory: "ConversationBufferMemory", max_chars: int = HISTORY_TOKEN_BUDGET * CHARS_PER_TOKEN):
+    """
+    Drops the oldest messages that can no longer appear in the last `max_chars`
+    characters of the rendered history, more than the prompt's history budget.
+    """
+    messages = memory.chat_memory.messages
+    total = 0
+    keep_from = 0
+    for i in range(len(messages) - 1, -1, -1):
+        prefix = memory.human_prefix if messages[i].type == "human" else memory.ai_prefix
+        total += len(prefix) + 2 + len(messages[i].content)
+        if total >= max_chars:
+            keep_from = i
+            break
+        total += 1  # newline separator
+    if keep_from > 0:
+        del messages[:keep_from]
+
+def _build_memory(messages: List[Dict], summary: Dict = None) -> _CachedMemory:
+    from langchain.memory import ConversationBufferMemory
     memory = ConversationBufferMemory(memory_key="history", return_messages=False)
+    cached = _CachedMemory(memory)
+    cached.message_count = len(messages)
+    if summary:
+        cached.summary = summary["text"]
+        cached.summary_upto = summary["upto"]
     # Iterate messages in order, pairing user->assistant
     i = 0
     n = len(messages)
@@ -90,22 +202,147 @@ def get_memory_for_session(session_id: str) -> ConversationBufferMemory:
                 memory.save_context({"user_text": user_text}, {"response": assistant_text})
                 i += 2
             else:
-                # No assistant reply yet; skip or stop
+                # No assistant reply yet; remember it in case the reply follows
+                if i == n - 1:
+                    cached.pending_user_text = user_text
                 i += 1
         else:
             # If assistant message without preceding user, skip
             i += 1
-    return memory
+    _trim_memory(memory)
+    return cached
+
+def get_memory_for_session(session_id: str):
+    """
+    Return (memory, summary, unsummarized) for this session from the LRU cache:
+    the live ConversationBufferMemory, the running summary text (or None) and
+    how many of the newest messages in memory the summary does not cover.
+    On a miss the memory is reconstructed by replaying the messages from the
+    session store, pairing each user message with the assistant reply that follows it.
+    Raises KeyError if session not found.
+
+    With MEMORY_CACHE_VALIDATE a cached memory is only used while it holds as
+    many messages as the store, so appends by other worker processes rebuild it.
+    """
+    if not params.MEMORY_CACHE_VALIDATE:
+        with _memory_cache_lock:
+            cached = _memory_cache.get(session_id)
+            if cached is not None:
+                _memory_cache.move_to_end(session_id)
+                _memory_cache_stats["hits"] += 1
+                return cached.context()
+
+    # Appends wait until the rebuilt memory is cached, none can slip in between
+    # reading the store and caching the memory
+    with session_lock(session_id):
+        stored_count = get_session_store().message_count(session_id) if params.MEMORY_CACHE_VALIDATE else None
+        with _memory_cache_lock:
+            cached = _memory_cache.get(session_id)
+            if cached is not None and stored_count not in (None, cached.message_count):
+                _memory_cache.pop(session_id)
+                _memory_cache_stats["stale"] += 1
+                cached = None
+            if cached is not None:
+                # Built by another thread while we waited, or still current
+                _memory_cache.move_to_end(session_id)
+                _memory_cache_stats["hits"] += 1
+                return cached.context()
+            _memory_cache_stats["misses"] += 1
+        messages = get_session_store().messages(session_id)
+        summary = get_session_store().get_summary(session_id)
+        cached = _build_memory(messages, summary)
+
+        with _memory_cache_lock:
+            _memory_cache[session_id] = cached
+            while len(_memory_cache) > MEMORY_CACHE_SIZE:
+                _memory_cache.popitem(last=False)
+                _memory_cache_stats["evictions"] += 1
+            return cached.context()
+
+def _update_cached_memory(session_id: str, role: str, content: str):
+    with _memory_cache_lock:
+        cached = _memory_cache.get(session_id)
+        if cached is not None:
+            cached.add(role, content)
+
+# Sessions whose summary is being updated right now
+_summaries_in_progress = set()
+
+async def update_summary_if_due(session_id: str) -> bool:
+    """
+    Folds everything but the newest HISTORY_VERBATIM_TURNS turns into the running
+    summary once HISTORY_SUMMARY_EVERY new turns have piled up since the last
+    update. Meant to run in the background after a turn has been persisted:
+    the store is read and written in threads, the LLM call runs on the event loop.
+    Returns True if the summary was updated.
+    """
+    if HISTORY_SUMMARY_EVERY <= 0:
+        return False
+    with _memory_cache_lock:
+        cached = _memory_cache.get(session_id)
+        if cached is None or session_id in _summaries_in_progress:
+            return False
+        target = cached.message_count - 2 * HISTORY_VERBATIM_TURNS
+        if target - cached.summary_upto < 2 * HISTORY_SUMMARY_EVERY:
+            return False
+        _summaries_in_progress.add(session_id)
+
+    try:
+        store = get_session_store()
+        summary = await asyncio.to_thread(store.get_summary, session_id)
+        upto = summary["upto"] if summary else 0
+        messages = await asyncio.to_thread(store.messages, session_id)
+        target = len(messages) - 2 * HISTORY_VERBATIM_TURNS
+        if target <= upto:
+            # Another worker may have updated it meanwhile
+            if summary:
+                with _memory_cache_lock:
+                    cached = _memory_cache.get(session_id)
+                    if cached is not None and upto > cached.summary_upto:
+                        cached.summary = summary["text"]
+                        cached.summary_upto = upto
+            return False
+        with timed("summary_update"):
+            text = await asummarize_history(summary["text"] if summary else None, messages[upto:target])
+        await asyncio.to_thread(store.set_summary, session_id, text, target)
+        with _memory_cache_lock:
+            cached = _memory_cache.get(session_id)
+            if cached is not None:
+                cached.summary = text
+                cached.summary_upto = target
+        logging.info(f"Updated running summary of session {session_id} up to message {target}")
+        return True
+    except KeyError:
+        return False
+    except (LLMBusyError, LLMTimeoutError) as e:
+        # Retried after the next turn
+        logging.warning(f"Could not update the summary of session {session_id}: {e}")
+        return False
+    except Exception:
+        logging.exception(f"Could not update the summary of session {session_id}")
+        return False
+    finally:
+        with _memory_cache_lock:
+            _summaries_in_progress.discard(session_id)
+
+def evict_memory(session_id: str):
+    with _memory_cache_lock:
+        _memory_cache.pop(session_id, None)
+
+def get_memory_cache_stats() -> dict:
+    with _memory_cache_lock:
+        return dict(_memory_cache_stats, size=len(_memory_cache), max_size=MEMORY_CACHE_SIZE)
 
 def delete_session(session_id: str) -> None:
     """
-    Delete the session file. Raises KeyError if session not found.
+    Delete the session. Raises KeyError if session not found.
     """
-    path = _session_file_path(session_id)
-    with _lock:
-        if not os.path.isfile(path):
-            raise KeyError(f"Session {session_id} not found")
-        os.remove(path)
+    with session_lock(session_id):
+        try:
+            get_session_store().delete(session_id)
+        finally:
+            evict_memory(session_id)
+            _invalidate_history_version(session_id)
 
 
 def get_system_prompt_with_question(username: str = None):
@@ -118,23 +355,27 @@ def get_system_prompt_with_question(username: str = None):
     )
 
 def get_user_sessions():
-    if USER_SESSION_FILE.exists():
-        with open(USER_SESSION_FILE, "r") as f:
-            return json.load(f)
-    return {}
+    """
+    Returns a {username: session_id} snapshot of the user directory.
+    """
+    return get_user_directory().as_dict()
+
+def get_username_for_session(session_id: str):
+    return get_user_directory().username_for(session_id)
 
-def save_user_sessions(sessions):
-    with open(USER_SESSION_FILE, "w") as f:
-        json.dump(sessions, f, indent=2)
+def login_user(username: str):
+    """
+    Returns (session_id, created) for `username`, registering new users.
+    """
+    return get_user_directory().get_or_create(username)
 
 
 def log_to_bigquery(user_uuid, sentiment, user_message, assistant_message, sentiment_value, user_name,  timestamp=None):
-    print("initializing client")
-    client = bigquery.Client(project="lewagon-bootcamp-457509")
-    table_id = "lewagon-bootcamp-457509.pocketcoachbq.user_sentiment"
+    """
+    Queues one analytics row for the background exporter, never blocks on the sink.
+    """
     if timestamp is None:
         timestamp = datetime.utcnow().isoformat()
-    print("ready to write to BigQuery")
     row = {
         "user_uuid": user_uuid,
         "user_name": user_name,
@@ -144,7 +385,5 @@ def log_to_bigquery(user_uuid, sentiment, user_message, assistant_message, senti
         "assistant_message": assistant_message,
         "sentiment_value": sentiment_value,
     }
-    errors = client.insert_rows_json(table_id, [row])
-    print("apparently wrote to bq")
-    if errors:
-        print("BigQuery insert errors:", errors)
+    if not get_analytics_exporter().submit(row):
+        logging.warning("Analytics queue full, dropped row")
@@ -1,33 +1,49 @@
+import asyncio
+import inspect
 import logging
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, WebSocketDisconnect, Request
+from typing import List, Optional
 from starlette.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pathlib import Path
-import tempfile
-import uuid
 from pocketcoach.params import *
 import os
-import shutil
 from datetime import datetime
-from pocketcoach.whisper_function import transcribe_audio
-import soundfile as sf
-import io
-from pathlib import Path
-
-from api.schemas import ChatRequest, ChatResponse, LoginRequest
+from pocketcoach.whisper_function import transcribe_audio, transcribe_batch, get_asr_pipeline
+from pocketcoach.whisper_stream import StreamingTranscriber
+from pocketcoach.audio import decode_audio
+import json
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+
+from api.schemas import ChatRequest, ChatResponse, LoginRequest, ClassifyBatchRequest
 from api.chat_manager import (
     get_or_create_session,
+    session_exists,
     get_memory_for_session,
+    get_memory_cache_stats,
+    update_summary_if_due,
     append_to_history,
     log_to_bigquery,
     get_history_for_session,
+    get_history_page,
+    get_history_version,
+    get_cached_history_version,
     delete_session,
     get_system_prompt_with_question,
-    get_user_sessions,
-    save_user_sessions,
+    get_username_for_session,
+    login_user,
+)
+from api.analytics import get_analytics_exporter
+from api import readiness
+from api.prefork import process_memory
+from pocketcoach.llm_logic.llm_logic import (
+    get_chat_model, pick_random_question, build_and_run_chain, arun_chain, astream_chain, get_sentiment_stats,
+    get_llm_stats, LLMBusyError, LLMTimeoutError,
 )
-from pocketcoach.llm_logic.llm_logic import init_models, pick_random_question, build_and_run_chain
-from pocketcoach.main import classify
+from pocketcoach.dl_logic.service import classify, get_batcher, get_batcher_stats, get_classifier, get_result_cache_stats
+from pocketcoach.metrics import MetricsMiddleware, timed, register_stats, render_metrics, THREADPOOL_BUSY, THREADPOOL_SIZE
+from anyio.to_thread import current_default_thread_limiter
 
 
 app = FastAPI()
@@ -40,6 +56,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route latency histograms and Server-Timing headers, see /metrics
+app.add_middleware(MetricsMiddleware)
+register_stats("sentiment_batcher", get_batcher_stats, counters=("requests", "batches", "errors"))
+register_stats("memory_cache", get_memory_cache_stats, counters=("hits", "misses", "evictions", "stale"))
+register_stats("llm", get_llm_stats, counters=("calls", "busy", "timeouts", "errors", "hedges", "hedge_wins", "hedges_skipped"))
+register_stats("classify_cache", get_result_cache_stats, counters=("hits", "misses", "evictions", "expired"))
+register_stats(
+    "analytics", lambda: get_analytics_exporter().stats(),
+    counters=("submitted", "dropped", "written", "batches", "retries", "spilled", "replayed", "corrupt", "errors", "breaker_trips"),
+)
 
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "raw_data", "uploads")
@@ -52,26 +78,25 @@ logging.basicConfig(
 )
 
 
-whisper_pipe = None
+# Heavy libraries (TensorFlow, torch, Vertex AI) are imported by these loaders,
+# not at import time, so the server accepts traffic before they are loaded
+readiness.register("classifier", get_batcher)
+readiness.register("chat_model", get_chat_model)
+readiness.register("whisper", lambda: get_asr_pipeline("local"), required=False)
 
 @app.post("/login")
 async def login(req: LoginRequest):
     username = req.username
-    sessions = get_user_sessions()
-    if username in sessions:
-        session_id = sessions[username]
-        logging.info(f"Existing user: {username}, session_id: {session_id}")
-    else:
-        session_id = str(uuid.uuid4())
-        sessions[username] = session_id
-        save_user_sessions(sessions)
+    session_id, created = await run_in_threadpool(login_user, username)
+    if created:
         logging.info(f"New user: {username}, session_id: {session_id}")
+    else:
+        logging.info(f"Existing user: {username}, session_id: {session_id}")
 
     # --- Always ensure session file exists and has initial question ---
-    session_file = Path("sessions") / f"{session_id}.json"
-    if not session_file.exists():
+    if not await run_in_threadpool(session_exists, session_id):
         await run_in_threadpool(get_or_create_session, session_id)
-        logging.info(f"Session file created for {session_id}")
+        logging.info(f"Session created for {session_id}")
         question = pick_random_question()
         await run_in_threadpool(append_to_history, session_id, "assistant", question)
         logging.info(f"Initial question written for {session_id}")
@@ -80,55 +105,162 @@ async def login(req: LoginRequest):
 
 @app.on_event("startup")
 def on_startup():
-    logging.info("Initializing models/pipelines...")
-    init_models()
-    logging.info("Models initialized.")
+    logging.info(f"Warming up {', '.join(WARM_UP_MODELS) or 'no models'} in the background")
+    readiness.start_warm_up()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    get_analytics_exporter().close()
 
 @app.get("/")
 def root():
     return {"greeting": "Hello"}
 
+@app.get("/livez")
+def livez():
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readyz():
+    """
+    200 once all required models of WARM_UP_MODELS are loaded, 503 before,
+    with the per-model state.
+    """
+    ready = readiness.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "models": readiness.model_states()},
+    )
+
+@app.get("/stats")
+def stats():
+    try:
+        memory = dict(process_memory(), pid=os.getpid())
+    except FileNotFoundError:
+        memory = None  # no /proc/<pid>/smaps_rollup, not Linux
+    return {
+        "models": readiness.model_states(),
+        "sentiment_batcher": get_sentiment_stats(),
+        "memory_cache": get_memory_cache_stats(),
+        "classify_cache": get_result_cache_stats(),
+        "llm": get_llm_stats(),
+        "analytics": get_analytics_exporter().stats(),
+        "memory": memory,
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: stage and request latency histograms, error and cache
+    counters, threadpool and queue depths. Under api.prefork the histograms and
+    counters are summed over all workers, the batcher, cache, LLM and analytics
+    stats are those of the worker answering (see their pid label).
+    """
+    limiter = current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/first_question")
 async def first_question():
     question = pick_random_question()
     return {"greeting": question}
 
 
-async def process_user_message(user_text: str, session_id: str = None) -> dict:
+# References to fire-and-forget tasks so they are not garbage collected
+_background_tasks = set()
+
+def run_in_background(func, *args):
     """
-    Process a user message (text), manage session, memory, LLM call, and persisting history.
-    Returns a dict with keys: session_id, sentiment, llm_response.
+    Run a blocking function in the threadpool, or a coroutine function on the
+    event loop, without awaiting it.
+    """
+    coro = func(*args) if inspect.iscoroutinefunction(func) else run_in_threadpool(func, *args)
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def prepare_turn(user_text: str, session_id: str = None):
+    """
+    Get or create the session and its memory for a chat turn.
+    Returns (session_id_used, memory, system_prompt, summary, unsummarized).
     """
     # 1. Get or create session
     try:
-        sid, is_new = await run_in_threadpool(get_or_create_session, session_id)
+        with timed("session"):
+            sid, is_new = await run_in_threadpool(get_or_create_session, session_id)
         session_id_used = sid
     except Exception:
         logging.exception("Error in get_or_create_session; creating new session")
-        sid, _ = await run_in_threadpool(get_or_create_session, None)
+        sid, is_new = await run_in_threadpool(get_or_create_session, None)
         session_id_used = sid
 
-    # 2. Reconstruct memory
+    # 2. Get the cached (or reconstructed) memory
     try:
-        memory = await run_in_threadpool(get_memory_for_session, session_id_used)
-        print("Reconstructin memory")
-        memory = await run_in_threadpool(get_memory_for_session, session_id)
+        with timed("memory"):
+            memory, summary, unsummarized = await run_in_threadpool(get_memory_for_session, session_id_used)
     except KeyError:
         logging.exception(f"Session {session_id_used} not found; creating fresh session")
-        sid, _ = await run_in_threadpool(get_or_create_session, None)
+        sid, is_new = await run_in_threadpool(get_or_create_session, None)
         session_id_used = sid
-        memory = await run_in_threadpool(get_memory_for_session, session_id_used)
+        memory, summary, unsummarized = await run_in_threadpool(get_memory_for_session, session_id_used)
     except Exception:
         logging.exception("Unexpected error in get_memory_for_session")
         raise HTTPException(status_code=500, detail="Internal server error loading session history.")
 
-    # 3. Call LLM logic in threadpool
+    if is_new:
+        system_prompt = get_system_prompt_with_question()
+    else:
+        system_prompt = SYSTEM_PROMPT
+    return session_id_used, memory, system_prompt, summary, unsummarized
+
+async def persist_turn(session_id_used: str, user_text: str, llm_response: str, sentiment: dict):
+    """
+    Append both messages of a turn to the history and queue the analytics row.
+    """
     try:
-        if is_new:
-            system_prompt = get_system_prompt_with_question()
+        with timed("persist"):
+            await run_in_threadpool(append_to_history, session_id_used, "user", user_text, sentiment)
+            await run_in_threadpool(append_to_history, session_id_used, "assistant", llm_response)
+
+        with timed("user_lookup"):
+            username = await run_in_threadpool(get_username_for_session, session_id_used)
+        with timed("analytics"):
+            log_to_bigquery(
+                user_uuid=session_id_used,
+                sentiment=sentiment.get("label") if sentiment else None,
+                user_message=user_text,
+                assistant_message=llm_response,
+                sentiment_value=sentiment.get("score", 0.0) if sentiment else 0.0,
+                user_name=username,
+            )
+        run_in_background(update_summary_if_due, session_id_used)
+
+    except KeyError:
+        logging.exception(f"Session {session_id_used} disappeared when appending history")
+    except Exception:
+        logging.exception("Error appending to history")
+
+async def process_user_message(user_text: str, session_id: str = None) -> dict:
+    """
+    Process a user message (text), manage session, memory, LLM call, and persisting history.
+    Returns a dict with keys: session_id, sentiment, llm_response.
+    """
+    session_id_used, memory, system_prompt, summary, unsummarized = await prepare_turn(user_text, session_id)
+
+    # 3. Call LLM logic, on the event loop or in the threadpool
+    try:
+        if LLM_ASYNC:
+            result = await arun_chain(user_text, memory, system_prompt, summary, unsummarized)
         else:
-            system_prompt = SYSTEM_PROMPT
-        result = await run_in_threadpool(build_and_run_chain, user_text, memory, system_prompt)
+            result = await run_in_threadpool(build_and_run_chain, user_text, memory, system_prompt, summary, unsummarized)
+    except LLMBusyError:
+        logging.warning("No LLM slot free, rejecting the message")
+        raise HTTPException(status_code=503, detail="Too many conversations right now, please try again.", headers={"Retry-After": "5"})
+    except LLMTimeoutError:
+        logging.warning("LLM call timed out")
+        raise HTTPException(status_code=504, detail="The model took too long to answer, please try again.")
     except Exception:
         logging.exception("Error in build_and_run_chain")
         raise HTTPException(status_code=500, detail="Internal model error, please try again later.")
@@ -137,69 +269,140 @@ async def process_user_message(user_text: str, session_id: str = None) -> dict:
     sentiment = result.get("sentiment")
 
     # 4. Persist messages
-    try:
-        await run_in_threadpool(append_to_history, session_id_used, "user", user_text, sentiment)
-        await run_in_threadpool(append_to_history, session_id_used, "assistant", llm_response)
-
-        sessions = get_user_sessions()
-        username = None
-        for user, sid in sessions.items():
-            if sid == session_id_used:
-                username = user
-                break
-        print("Calling bigquery logging")
-        log_to_bigquery(
-            user_uuid=session_id_used,
-            sentiment=sentiment.get("label") if sentiment else None,
-            user_message=user_text,
-            assistant_message=llm_response,
-            sentiment_value=sentiment.get("score", 0.0) if sentiment else 0.0,
-            user_name=username,
-        )
-
-    except KeyError:
-        logging.exception(f"Session {session_id_used} disappeared when appending history")
-    except Exception:
-        logging.exception("Error appending to history")
-
+    await persist_turn(session_id_used, user_text, llm_response, sentiment)
 
     return {"session_id": session_id_used, "llm_response": llm_response}
 
-from api.schemas import ChatRequest, ChatResponse
-
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(req: ChatRequest):
-    user_text = req.message.strip()
+async def check_message_allowed(user_text: str, session_id: str):
     # Allow empty message only if this is a new session (no history)
     if not user_text:
         # Check if session exists and has history
         try:
-            history = await run_in_threadpool(get_history_for_session, req.session_id)
+            history = await run_in_threadpool(get_history_for_session, session_id)
             if history:  # If history is not empty, reject
                 raise HTTPException(status_code=400, detail="Empty message is not allowed.")
         except KeyError:
             pass  # No history, allow
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(req: ChatRequest):
+    user_text = req.message.strip()
+    await check_message_allowed(user_text, req.session_id)
     out = await process_user_message(user_text, req.session_id)
     return ChatResponse(**out)
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """
+    Same as /chat, but the answer is streamed as Server-Sent Events while the
+    LLM generates it: one "session" event, "token" events with text chunks and
+    a final "done" event with the full response, sent after the turn has been
+    persisted. A failure mid-stream ends with an "error" event.
+    """
+    user_text = req.message.strip()
+    await check_message_allowed(user_text, req.session_id)
+    session_id_used, memory, system_prompt, summary, unsummarized = await prepare_turn(user_text, req.session_id)
+    try:
+        sentiment, chunks = await astream_chain(user_text, memory, system_prompt, summary, unsummarized)
+    except Exception:
+        logging.exception("Error in astream_chain")
+        raise HTTPException(status_code=500, detail="Internal model error, please try again later.")
+
+    async def events():
+        parts = []
+        try:
+            yield _sse("session", {"session_id": session_id_used})
+            async for text in chunks:
+                parts.append(text)
+                yield _sse("token", {"text": text})
+        except Exception:
+            logging.exception("Error while streaming LLM response")
+            yield _sse("error", {"detail": "Internal model error, please try again later."})
+            return
+        finally:
+            # Also on a client disconnect, which cancels this generator: closing
+            # the stream releases the LLM slot now rather than when GC gets to it
+            await chunks.aclose()
+        llm_response = "".join(parts).strip()
+        await persist_turn(session_id_used, user_text, llm_response, sentiment)
+        yield _sse("done", {"session_id": session_id_used, "llm_response": llm_response, "sentiment": sentiment})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
 @app.get("/chat/{session_id}/history")
-async def get_chat_history(session_id: str):
+async def get_chat_history(
+    session_id: str,
+    request: Request,
+    after: Optional[int] = None,
+    last: Optional[int] = None,
+    limit: Optional[int] = None,
+):
     """
-    Return the structured chat history for a given session_id, as read from the JSON file.
+    Return the structured chat history for a given session_id, as read from the session store.
+
+    Paginated with `last=N` (newest N messages) or `after=ID` (messages after
+    message id ID, with `limit`), every message carries its "id". Responses
+    carry ETag/Last-Modified validators and a conditional request for an
+    unchanged history is answered with 304.
     """
+    if last is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either 'last' or 'after', not both.")
+    for name, value in (("last", last), ("limit", limit)):
+        if value is not None and not 0 < value <= HISTORY_PAGE_MAX:
+            raise HTTPException(status_code=400, detail=f"'{name}' must be between 1 and {HISTORY_PAGE_MAX}.")
+    if after is not None and after < -1:
+        raise HTTPException(status_code=400, detail="'after' must be a message id or -1.")
+
     try:
-        history = await run_in_threadpool(get_history_for_session, session_id)
+        with timed("history_version"):
+            version = get_cached_history_version(session_id) or await run_in_threadpool(get_history_version, session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    token, last_modified = version
+    page_key = f"{token}|{after}|{last}|{limit}"
+    etag = f'W/"{hashlib.sha1(page_key.encode()).hexdigest()[:20]}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        with timed("history_page"):
+            page = await run_in_threadpool(get_history_page, session_id, after, last, limit)
     except KeyError:
         raise HTTPException(status_code=404, detail="Session not found")
     except Exception:
         logging.exception("Error retrieving history")
         raise HTTPException(status_code=500, detail="Internal server error retrieving history")
-    return {"session_id": session_id, "history": history}
+    return JSONResponse(content={"session_id": session_id, **page}, headers=headers)
 
 @app.post("/chat/{session_id}/reset")
 async def reset_chat(session_id: str):
     """
-    Delete the session file. Subsequent POST /chat without session_id creates a new session.
+    Delete the session. Subsequent POST /chat without session_id creates a new session.
     """
     try:
         await run_in_threadpool(delete_session, session_id)
@@ -218,34 +421,196 @@ async def map(req: ChatRequest):
         raise HTTPException(status_code=400, detail="Empty message is not allowed.")
 
     print(f"USER TEXT: {user_text}")
-    emotion_classificaiton = classify(user_text)
+    with timed("sentiment"):
+        emotion_classificaiton = await run_in_threadpool(classify, user_text)
 
     return {user_text: emotion_classificaiton}
 
+# Bulk scoring runs full batches through the classifier directly (the micro
+# batcher is for single interactive messages); the semaphore limits how many
+# batches are in the model at once, so large jobs queue up instead of
+# starving /chat
+_bulk_slots = asyncio.Semaphore(CLASSIFY_BULK_CONCURRENCY)
+
+async def classify_texts(texts: List[str]) -> List:
+    """
+    Classifies one batch of texts, None for empty texts.
+    """
+    indices = [i for i, text in enumerate(texts) if text.strip()]
+    predictions = [None] * len(texts)
+    if indices:
+        async with _bulk_slots:
+            classifier = await run_in_threadpool(get_classifier)
+            with timed("sentiment_batch"):
+                results = await run_in_threadpool(classifier.predict_batch, [texts[i] for i in indices])
+        for i, result in zip(indices, results):
+            predictions[i] = result
+    return predictions
+
+@app.post("/classify/batch")
+async def classify_batch_endpoint(req: ClassifyBatchRequest):
+    """
+    Classify a list of texts. Returns one {"text", "prediction"} per input in
+    order, prediction is null for empty texts.
+    """
+    if len(req.texts) > CLASSIFY_MAX_BATCH_TEXTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {CLASSIFY_MAX_BATCH_TEXTS} texts per request, use /classify/stream for more.",
+        )
+    results = []
+    for start in range(0, len(req.texts), CLASSIFY_BULK_BATCH_SIZE):
+        texts = req.texts[start:start + CLASSIFY_BULK_BATCH_SIZE]
+        predictions = await classify_texts(texts)
+        results.extend({"text": text, "prediction": prediction} for text, prediction in zip(texts, predictions))
+    return {"results": results}
+
+async def _ndjson_lines(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+def _parse_ndjson_line(line: bytes, line_number: int) -> dict:
+    """
+    A line is a JSON string or an object with "text" and an optional "id".
+    """
+    item = json.loads(line)
+    if isinstance(item, str):
+        return {"id": line_number, "text": item}
+    if isinstance(item, dict) and isinstance(item.get("text"), str):
+        return {"id": item.get("id", line_number), "text": item["text"]}
+    raise ValueError('expected a JSON string or an object with a "text" field')
+
+@app.post("/classify/stream")
+async def classify_stream_endpoint(request: Request):
+    """
+    NDJSON in, NDJSON out: every request line holds a text (a JSON string or
+    {"text": ..., "id": ...}), every response line {"id", "text", "prediction"}
+    in input order, or {"id", "error"} for an unreadable line. Lines are
+    scored in batches as they arrive and the request body is only read as
+    fast as the classifier keeps up.
+    """
+    async def results():
+        pending = []
+
+        async def flush():
+            predictions = await classify_texts([item["text"] for item in pending])
+            lines = "".join(
+                json.dumps(dict(item, prediction=prediction)) + "\n"
+                for item, prediction in zip(pending, predictions)
+            )
+            pending.clear()
+            return lines
+
+        line_number = 0
+        async for line in _ndjson_lines(request):
+            line_number += 1
+            try:
+                pending.append(_parse_ndjson_line(line, line_number))
+            except ValueError as e:
+                # Earlier lines first, so the output stays in input order
+                if pending:
+                    yield await flush()
+                yield json.dumps({"id": line_number, "error": f"Invalid line: {e}"}) + "\n"
+                continue
+            if len(pending) >= CLASSIFY_BULK_BATCH_SIZE:
+                yield await flush()
+        if pending:
+            yield await flush()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.post("/transcribe-audio/")
 async def transcribe_audio_endpoint(audio_file: UploadFile = File(...)):
-    if not audio_file.filename.endswith('.wav'):
-        raise HTTPException(400, "Only WAV files allowed")
-    audio_bytes = await audio_file.read()
-
-    tmp_path = None
+    """
+    Transcribe one upload. WAV, FLAC and OGG are decoded in memory, other
+    formats (MP3, M4A, WebM, ...) are streamed through ffmpeg.
+    """
     try:
-        # Try to read the audio bytes as a WAV file
-        audio_buffer = io.BytesIO(audio_bytes)
-        data, samplerate = sf.read(audio_buffer)
-
-        # Use the resampled data
-        data = data[:, :1].reshape(-1)
-
-        # Save as a proper WAV file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-            sf.write(tmp.name, data, samplerate)
-            tmp_path = tmp.name
+        # Decoded straight from the upload's spooled file, downmixed and resampled to 16 kHz
+        with timed("decode"):
+            audio = await run_in_threadpool(decode_audio, audio_file.file)
         # Transcribe
-        transcription = transcribe_audio(tmp_path, model_type = "local")
+        with timed("transcribe"):
+            transcription = await run_in_threadpool(transcribe_audio, audio, "local")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Could not decode or transcribe audio: {e}")
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
     return {"transcription": transcription}
+
+@app.post("/transcribe-audio/batch")
+async def transcribe_audio_batch_endpoint(audio_files: List[UploadFile] = File(...)):
+    """
+    Transcribe several uploads with one Whisper invocation.
+    """
+    clips = []
+    for audio_file in audio_files:
+        try:
+            with timed("decode"):
+                clips.append(await run_in_threadpool(decode_audio, audio_file.file))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not decode {audio_file.filename}: {e}")
+
+    try:
+        with timed("transcribe"):
+            results = await run_in_threadpool(transcribe_batch, clips, "local")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not transcribe audio: {e}")
+    return {
+        "transcriptions": [
+            {"filename": audio_file.filename, "transcription": result}
+            for audio_file, result in zip(audio_files, results)
+        ]
+    }
+
+@app.websocket("/ws/transcribe")
+async def transcribe_stream_endpoint(
+    websocket: WebSocket,
+    sample_rate: int = 16000,
+    encoding: str = "pcm_s16le",
+):
+    """
+    Streaming transcription. The client sends mono PCM frames (`encoding` is
+    pcm_s16le or pcm_f32le at `sample_rate`) as binary messages and the text
+    message "end" when the recording stops. The server answers with JSON
+    events {"type": "partial" | "final", "segment": n, "text": ...} and a
+    closing {"type": "done"}.
+    """
+    await websocket.accept()
+    try:
+        transcriber = StreamingTranscriber(
+            model_type="local", sampling_rate=sample_rate, encoding=encoding
+        )
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1003)
+        return
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                events = await run_in_threadpool(transcriber.feed_bytes, message["bytes"])
+            elif (message.get("text") or "").strip().lower() == "end":
+                for event in await run_in_threadpool(transcriber.finish):
+                    await websocket.send_json(event)
+                await websocket.send_json({"type": "done"})
+                await websocket.close()
+                return
+            else:
+                continue
+            for event in events:
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        logging.info("Transcription stream closed by client")
+    except Exception as e:
+        logging.exception("Error in transcription stream")
+        await websocket.send_json({"type": "error", "detail": f"Could not transcribe audio: {e}"})
+        await websocket.close(code=1011)
@@ -0,0 +1,330 @@
+import io
+import os
+import sys
+import json
+import time
+import wave
+import random
+import asyncio
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+
+# Relative weight of each endpoint in the generated traffic
+DEFAULT_MIX = {"login": 1, "chat": 4, "classify": 4, "transcribe": 1}
+RESULTS_DIR = Path("raw_data/load_tests")
+
+SAMPLE_MESSAGES = [
+    "I feel a bit anxious about my exam tomorrow",
+    "Today was a great day, I finally finished my project!",
+    "I don't know why but I am so tired and sad lately",
+    "My friend didn't call me back and I am annoyed",
+    "I love spending Sunday mornings with my family",
+    "ok",
+]
+
+
+def make_wav(seconds: float = 2.0, sampling_rate: int = 16000) -> bytes:
+    """
+    A mono 16 bit WAV with a quiet tone, small enough not to dominate the test.
+    """
+    t = np.arange(int(seconds * sampling_rate)) / sampling_rate
+    samples = (0.1 * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sampling_rate)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def _get_json(url: str, timeout: float = 5):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+
+
+def start_server(port: int, workdir: str, env: dict = None, ready_timeout_s: float = 600, args=()) -> subprocess.Popen:
+    """
+    Starts the API with uvicorn for an offline test: the fake chat model, a
+    local JSONL analytics sink and sessions under `workdir`. Waits until
+    /readyz reports the models as loaded.
+    """
+    server_env = dict(os.environ)
+    server_env.update({
+        "CHAT_MODEL": "fake",
+        "ANALYTICS_SINK": "jsonl",
+        "ANALYTICS_PATH": os.path.join(workdir, "analytics.jsonl"),
+        "ANALYTICS_SPILL_PATH": os.path.join(workdir, "analytics_spill.jsonl"),
+        "SESSIONS_PATH": os.path.join(workdir, "sessions"),
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions", "sessions.db"),
+    })
+    server_env.update(env or {})
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.fast:app", "--port", str(port), "--log-level", "warning", *args],
+        env=server_env,
+    )
+
+    deadline = time.monotonic() + ready_timeout_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            status, body = _get_json(f"http://127.0.0.1:{port}/readyz")
+            if status == 200:
+                return proc
+            failed = [name for name, model in body.get("models", {}).items()
+                      if model["state"] == "failed" and model["required"]]
+            if failed:
+                raise RuntimeError(f"Could not load {', '.join(failed)}: {body}")
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    stop_server(proc)
+    raise TimeoutError(f"Server not ready after {ready_timeout_s}s")
+
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+class LoadTestUser:
+    """
+    One simulated user: logs in once, then sends requests picked from `mix`
+    until `deadline`, recording (endpoint, latency_s, ok) for each request.
+    """
+
+    def __init__(self, http, base_url: str, user_id: int, mix: dict, wav: bytes, seed: int):
+        self.http = http
+        self.base_url = base_url
+        self.username = f"loadtest-{seed}-{user_id}"
+        self.mix = mix
+        self.wav = wav
+        self.random = random.Random(seed * 100003 + user_id)
+        self.session_id = None
+        self.records = []
+
+    async def _request(self, endpoint: str, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            async with self.http.request(method, self.base_url + path, **kwargs) as resp:
+                body = await resp.read()
+                ok = resp.status < 400
+        except Exception:
+            body, ok = b"", False
+        self.records.append((endpoint, time.perf_counter() - start, ok))
+        return json.loads(body) if ok and body else None
+
+    async def login(self):
+        body = await self._request("login", "POST", "/login", json={"username": self.username})
+        if body:
+            self.session_id = body["session_id"]
+
+    async def chat(self):
+        message = self.random.choice(SAMPLE_MESSAGES)
+        body = await self._request("chat", "POST", "/chat", json={"message": message, "session_id": self.session_id})
+        if body:
+            self.session_id = body["session_id"]
+
+    async def classify(self):
+        await self._request("classify", "POST", "/classify", json={"message": self.random.choice(SAMPLE_MESSAGES)})
+
+    async def transcribe(self):
+        import aiohttp
+        form = aiohttp.FormData()
+        form.add_field("audio_file", self.wav, filename="load_test.wav", content_type="audio/wav")
+        await self._request("transcribe", "POST", "/transcribe-audio/", data=form)
+
+    async def run(self, deadline: float):
+        await self.login()
+        endpoints = list(self.mix)
+        weights = [self.mix[endpoint] for endpoint in endpoints]
+        while time.perf_counter() < deadline:
+            endpoint = self.random.choices(endpoints, weights)[0]
+            await getattr(self, endpoint)()
+
+
+def summarize(records, duration_s: float) -> dict:
+    """
+    Throughput and latency percentiles (in ms) per endpoint and overall.
+    """
+    by_endpoint = {}
+    for endpoint, latency, ok in records:
+        by_endpoint.setdefault(endpoint, []).append((latency, ok))
+    by_endpoint["all"] = [(latency, ok) for _, latency, ok in records]
+
+    summary = {}
+    for endpoint, rows in by_endpoint.items():
+        latencies = np.array([latency for latency, _ in rows]) * 1000
+        errors = sum(1 for _, ok in rows if not ok)
+        summary[endpoint] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "rps": round(len(rows) / duration_s, 2),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 1) if rows else None,
+            "p95_ms": round(float(np.percentile(latencies, 95)), 1) if rows else None,
+            "p99_ms": round(float(np.percentile(latencies, 99)), 1) if rows else None,
+            "max_ms": round(float(latencies.max()), 1) if rows else None,
+        }
+    return summary
+
+
+async def run_load(base_url: str, duration_s: float, concurrency: int, mix: dict, seed: int = 0) -> dict:
+    import aiohttp
+
+    wav = make_wav()
+    timeout = aiohttp.ClientTimeout(total=120)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as http:
+        users = [LoadTestUser(http, base_url, i, mix, wav, seed) for i in range(concurrency)]
+        start = time.perf_counter()
+        await asyncio.gather(*(user.run(start + duration_s) for user in users))
+        elapsed = time.perf_counter() - start
+    records = [record for user in users for record in user.records]
+    return summarize(records, elapsed)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def parse_mix(mix: str) -> dict:
+    """
+    "chat=4,classify=4" -> {"chat": 4, "classify": 4}
+    """
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(DEFAULT_MIX)
+    if unknown:
+        raise ValueError(f"Unknown endpoints {unknown}, use {', '.join(DEFAULT_MIX)}")
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def run_load_test(duration_s=30, concurrency=16, mix=None, base_url=None, port=8765, seed=0, output=None, server_env=None, server_args=()):
+    """
+    Drives concurrent /login, /chat, /classify and /transcribe-audio/ traffic
+    against the API and saves throughput and p50/p95/p99 latency per endpoint
+    as JSON (to RESULTS_DIR/<time>_<commit>.json unless `output` is given).
+
+    Without `base_url`, the API is started locally with the fake chat model
+    and a local analytics sink, so nothing leaves the machine; the classifier
+    and Whisper are the real ones. Returns the path of the results file.
+    """
+    mix = parse_mix(mix) if isinstance(mix, str) else (mix or DEFAULT_MIX)
+    env = dict(server_env or {})
+    env.setdefault("WARM_UP_MODELS", "classifier,chat_model,whisper" if "transcribe" in mix else "classifier,chat_model")
+
+    proc = None
+    if base_url is None:
+        workdir = tempfile.mkdtemp(prefix="pocketcoach-load-test-")
+        print(f"Starting API on port {port} (state in {workdir})")
+        proc = start_server(port, workdir, env, args=server_args)
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        print(f"Running load test: {concurrency} users for {duration_s}s, mix {mix}")
+        summary = asyncio.run(run_load(base_url, duration_s, concurrency, mix, seed))
+        _, server_stats = _get_json(f"{base_url}/stats")
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+    result = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "duration_s": duration_s,
+            "concurrency": concurrency,
+            "mix": mix,
+            "seed": seed,
+            "base_url": base_url,
+            "server_env": env,
+            "server_args": list(server_args),
+        },
+        "endpoints": summary,
+        "server_stats": server_stats,
+    }
+    path = Path(output or RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}_{result['commit'] or 'nogit'}.json")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, indent=2))
+
+    for endpoint, row in summary.items():
+        print(f"{endpoint:>11}: {row['requests']:6d} req {row['rps']:8.1f} req/s  p50 {row['p50_ms']} ms  "
+              f"p95 {row['p95_ms']} ms  p99 {row['p99_ms']} ms  errors {row['errors']}")
+    print(f"✅ Results saved to {path}")
+    return path
+
+
+def compare_results(baseline_path, current_path, tolerance=0.10) -> bool:
+    """
+    Prints throughput and latency changes per endpoint between two result
+    files. Returns False if any endpoint got more than `tolerance` slower
+    (p95) or lost more than `tolerance` of its throughput.
+    """
+    baseline = json.loads(Path(baseline_path).read_text())["endpoints"]
+    current = json.loads(Path(current_path).read_text())["endpoints"]
+    ok = True
+    for endpoint in sorted(set(baseline) & set(current)):
+        before, after = baseline[endpoint], current[endpoint]
+        rps_change = after["rps"] / before["rps"] - 1 if before["rps"] else 0.0
+        p95_change = after["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        regressed = rps_change < -tolerance or p95_change > tolerance
+        ok = ok and not regressed
+        print(f"{endpoint:>11}: rps {before['rps']} -> {after['rps']} ({rps_change:+.0%}), "
+              f"p95 {before['p95_ms']} -> {after['p95_ms']} ms ({p95_change:+.0%})"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def benchmark_llm_paths(duration_s=30, concurrency=64, latency_s=1.0, slow_rate=0.05, slow_latency_s=8.0, failure_rate=0.02, hedge_after_s=2.0):
+    """
+    Load tests /chat and /classify against a fake chat model with slow and
+    failing calls, once with the LLM called from the threadpool, once awaited
+    on the event loop and once with hedged calls, and prints their results
+    side by side. Returns the paths of the three results files.
+    """
+    fake_env = {
+        "FAKE_LLM_LATENCY_S": str(latency_s),
+        "FAKE_LLM_SLOW_RATE": str(slow_rate),
+        "FAKE_LLM_SLOW_LATENCY_S": str(slow_latency_s),
+        "FAKE_LLM_FAILURE_RATE": str(failure_rate),
+    }
+    runs = {
+        "threadpool": {"LLM_ASYNC": "false"},
+        "async": {"LLM_ASYNC": "true", "LLM_HEDGE_AFTER_S": "0"},
+        "async_hedged": {"LLM_ASYNC": "true", "LLM_HEDGE_AFTER_S": str(hedge_after_s)},
+    }
+    stamp = f"{datetime.now():%Y%m%d_%H%M%S}"
+    paths = {}
+    for name, env in runs.items():
+        print(f"--- {name} ---")
+        paths[name] = run_load_test(
+            duration_s, concurrency, {"chat": 1, "classify": 1},
+            server_env=dict(fake_env, **env), output=RESULTS_DIR / f"{stamp}_llm_{name}.json",
+        )
+
+    print(f"{'':>13} {'endpoint':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, path in paths.items():
+        endpoints = json.loads(Path(path).read_text())["endpoints"]
+        for endpoint in ("chat", "classify"):
+            row = endpoints.get(endpoint)
+            if row:
+                print(f"{name:>13} {endpoint:>9} {row['rps']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                      f"{row['p99_ms']:>8} {row['error_rate']:>7.1%}")
+    return paths
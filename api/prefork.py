@@ -0,0 +1,269 @@
+# Pre-fork serving: the master loads the models once and forks the uvicorn
+# workers afterwards, so they share the weights copy-on-write
+import gc
+import os
+import sys
+import time
+import random
+import signal
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from pocketcoach import params
+from pocketcoach.params import *
+
+# Models that must not be loaded before the fork, and why
+_FORK_UNSAFE = {
+    "chat_model": "its gRPC channel does not survive a fork",
+}
+
+_MEMORY_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_mb",
+    "Shared_Dirty": "shared_mb",
+    "Private_Clean": "private_mb",
+    "Private_Dirty": "private_mb",
+}
+
+
+def process_memory(pid: int = None) -> dict:
+    """
+    Resident memory of a process in MB from /proc/<pid>/smaps_rollup: rss,
+    pss (shared pages split between the processes mapping them), shared and
+    private. Summing pss over all workers gives what they really cost.
+    """
+    pid = pid or os.getpid()
+    memory = {"rss_mb": 0.0, "pss_mb": 0.0, "shared_mb": 0.0, "private_mb": 0.0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            field, _, value = line.partition(":")
+            if field in _MEMORY_FIELDS:
+                memory[_MEMORY_FIELDS[field]] += int(value.split()[0]) / 1024
+    return {key: round(value, 1) for key, value in memory.items()}
+
+
+def child_pids(pid: int) -> list:
+    try:
+        return [int(child) for child in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+    except FileNotFoundError:
+        return []
+
+
+def memory_report(master_pid: int = None) -> dict:
+    """
+    Prints the memory of the master and each of its workers, and the total
+    RSS (shared pages counted once per worker) next to the total PSS.
+    """
+    master_pid = master_pid or os.getpid()
+    report = {"master": dict(process_memory(master_pid), pid=master_pid), "workers": []}
+    for pid in child_pids(master_pid):
+        try:
+            report["workers"].append(dict(process_memory(pid), pid=pid))
+        except FileNotFoundError:
+            pass  # recycled meanwhile
+    processes = [report["master"]] + report["workers"]
+    report["total_rss_mb"] = round(sum(p["rss_mb"] for p in processes), 1)
+    report["total_pss_mb"] = round(sum(p["pss_mb"] for p in processes), 1)
+
+    print(f"{'':>8} {'pid':>8} {'rss MB':>9} {'pss MB':>9} {'shared MB':>10} {'private MB':>11}")
+    for name, p in [("master", report["master"])] + [("worker", w) for w in report["workers"]]:
+        print(f"{name:>8} {p['pid']:>8} {p['rss_mb']:>9} {p['pss_mb']:>9} {p['shared_mb']:>10} {p['private_mb']:>11}")
+    print(f"{len(report['workers'])} workers, {report['total_rss_mb']} MB RSS, {report['total_pss_mb']} MB PSS")
+    return report
+
+
+def enable_multiprocess_metrics(path: str = PROMETHEUS_MULTIPROC_DIR):
+    """
+    Makes the workers keep their metrics in files under `path` (a temporary
+    directory if empty), so /metrics of any worker reports them all. Has to run
+    before prometheus_client is imported. Returns the directory or None.
+    """
+    if "prometheus_client" in sys.modules:
+        logging.warning("prometheus_client is already imported, /metrics will only report the worker answering")
+        return None
+    path = Path(path or tempfile.mkdtemp(prefix="pocketcoach-metrics-"))
+    path.mkdir(parents=True, exist_ok=True)
+    # Left over from a previous run, their pids are gone
+    for stale in path.glob("*.db"):
+        stale.unlink()
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(path)
+    logging.info(f"Sharing the metrics of the workers in {path}")
+    return path
+
+
+def preload_models(names=PREFORK_MODELS):
+    """
+    Loads the `names` models in the master, in this thread: a thread started
+    before the fork would not exist in the workers.
+    """
+    from api import readiness
+    from pocketcoach.dl_logic.service import preload_classifier
+
+    loaded = []
+    for name in names:
+        if name in _FORK_UNSAFE:
+            logging.warning(f"Not preloading {name}, {_FORK_UNSAFE[name]}, every worker loads its own")
+            continue
+        if name == "classifier":
+            if MODEL_BACKEND == "keras":
+                logging.warning(
+                    "Not preloading the classifier, TensorFlow is not fork safe. "
+                    "Export it (make export_model) and serve MODEL_BACKEND=tflite or onnx to share it"
+                )
+                continue
+            # One runtime thread per worker: thread pools would not survive the fork
+            preload_classifier(num_threads=1)
+        if readiness.load(name):
+            loaded.append(name)
+    return loaded
+
+
+class _Worker:
+    """
+    A forked uvicorn worker serving the shared listening socket until it has
+    handled `max_requests` requests or its private memory exceeds
+    `max_memory_mb`.
+    """
+
+    def __init__(self, app, sock: socket.socket, max_requests: int, max_memory_mb: int, check_interval_s: float):
+        self.app = app
+        self.sock = sock
+        self.max_requests = max_requests
+        self.max_memory_mb = max_memory_mb
+        self.check_interval_s = check_interval_s
+
+    def _watch_memory(self, server):
+        while not server.should_exit:
+            time.sleep(self.check_interval_s)
+            private_mb = process_memory()["private_mb"]
+            if private_mb > self.max_memory_mb:
+                logging.info(f"Worker {os.getpid()} uses {private_mb} MB private memory, recycling")
+                server.should_exit = True
+
+    def run(self):
+        import uvicorn
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+            signal.signal(sig, signal.SIG_DFL)
+        # Forked workers would otherwise all draw the same "random" questions
+        random.seed()
+        # Jittered, so workers started together are not recycled together
+        max_requests = self.max_requests + random.randint(0, self.max_requests // 10) if self.max_requests else None
+        server = uvicorn.Server(uvicorn.Config(self.app, limit_max_requests=max_requests, log_level="info"))
+        if self.max_memory_mb:
+            threading.Thread(target=self._watch_memory, args=(server,), name="memory-watch", daemon=True).start()
+        server.run(sockets=[self.sock])
+
+
+def serve(
+    host="0.0.0.0",
+    port=8000,
+    workers=SERVE_WORKERS,
+    max_requests=WORKER_MAX_REQUESTS,
+    max_memory_mb=WORKER_MAX_MEMORY_MB,
+    check_interval_s=5.0,
+):
+    """
+    Loads the app and the PREFORK_MODELS once, then forks `workers` uvicorn
+    workers sharing the listening socket and the loaded weights. Workers that
+    exit (recycled after `max_requests` requests or above `max_memory_mb` of
+    private memory, or crashed) are replaced. SIGUSR1 prints a memory report,
+    SIGTERM/SIGINT stop the workers gracefully.
+    """
+    metrics_dir = None
+    if workers > 1:
+        # Other workers' writes could not invalidate the per-process caches.
+        # chat_manager reads both switches from params on every call.
+        if params.HISTORY_VALIDATOR_CACHE:
+            logging.info("Disabling HISTORY_VALIDATOR_CACHE, it is per process")
+            params.HISTORY_VALIDATOR_CACHE = False
+        if not params.MEMORY_CACHE_VALIDATE:
+            logging.info("Enabling MEMORY_CACHE_VALIDATE, the memory cache is per process")
+            params.MEMORY_CACHE_VALIDATE = True
+        metrics_dir = enable_multiprocess_metrics()
+
+    from api.fast import app
+
+    start = time.perf_counter()
+    loaded = preload_models()
+    logging.info(f"Preloaded {', '.join(loaded) or 'no models'} in {time.perf_counter() - start:.1f}s")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Objects allocated so far move to a generation the collector never
+    # visits, so collections in the workers do not write to (and copy) them
+    gc.collect()
+    gc.freeze()
+
+    worker = _Worker(app, sock, max_requests, max_memory_mb, check_interval_s)
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                worker.run()
+            except BaseException:
+                logging.exception(f"Worker {os.getpid()} failed")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+        logging.info(f"Started worker {pid}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: memory_report())
+
+    for _ in range(workers):
+        spawn()
+    logging.info(f"Serving on {host}:{port} with {workers} workers, master pid {os.getpid()}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if metrics_dir is not None:
+            # Drops the in-progress gauges of the dead worker, its counters stay in the sums
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(pid)
+        if started is None or stopping:
+            continue
+        logging.info(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, replacing it")
+        if time.monotonic() - started < 1:
+            time.sleep(1)  # do not spin on a worker that crashes at startup
+        spawn()
+    sock.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Serve api.fast:app from pre-forked workers sharing the models")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--max-requests", type=int, default=WORKER_MAX_REQUESTS, help="Recycle workers after N requests, 0 = never")
+    parser.add_argument("--max-memory-mb", type=int, default=WORKER_MAX_MEMORY_MB, help="Recycle workers above N MB private memory, 0 = never")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.max_requests, args.max_memory_mb)
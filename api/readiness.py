@@ -0,0 +1,135 @@
+import re
+import sys
+import time
+import logging
+import threading
+import subprocess
+from pocketcoach.params import *
+
+
+class ModelLoader:
+    """
+    Load state of one model: "pending", "loading", "ready" or "failed".
+    `load` is the model's own lazy getter, so a request that needs the model
+    before warm-up got to it simply loads it itself.
+    """
+
+    def __init__(self, name: str, load, required: bool = True):
+        self.name = name
+        self.required = required
+        self.state = "pending"
+        self.error = None
+        self.load_s = None
+        self._load = load
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.state == "ready":
+                return
+            self.state = "loading"
+            start = time.perf_counter()
+            try:
+                self._load()
+            except Exception as e:
+                self.state = "failed"
+                self.error = f"{type(e).__name__}: {e}"
+                logging.exception(f"Could not load {self.name}")
+                return
+            self.load_s = round(time.perf_counter() - start, 3)
+            self.state = "ready"
+            logging.info(f"{self.name} loaded in {self.load_s}s")
+
+    def to_dict(self) -> dict:
+        return {"state": self.state, "required": self.required, "load_s": self.load_s, "error": self.error}
+
+
+_MODELS = {}
+
+
+def register(name: str, load, required: bool = True):
+    """
+    Registers a model for warm-up and readiness reporting.
+    """
+    _MODELS[name] = ModelLoader(name, load, required)
+
+
+def start_warm_up(names=WARM_UP_MODELS):
+    """
+    Loads the `names` models in background threads, one per model, so the
+    fast ones do not wait for the slow ones.
+    """
+    threads = []
+    for name in names:
+        if name not in _MODELS:
+            logging.warning(f"Unknown model {name} in WARM_UP_MODELS, known: {', '.join(_MODELS)}")
+            continue
+        thread = threading.Thread(target=_MODELS[name].load, name=f"warm-up-{name}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def load(name: str) -> bool:
+    """
+    Loads the `name` model in the calling thread, returns True if it is ready.
+    """
+    loader = _MODELS.get(name)
+    if loader is None:
+        logging.warning(f"Unknown model {name}, known: {', '.join(_MODELS)}")
+        return False
+    loader.load()
+    return loader.state == "ready"
+
+
+def model_states() -> dict:
+    return {name: loader.to_dict() for name, loader in _MODELS.items()}
+
+
+def is_ready(names=WARM_UP_MODELS) -> bool:
+    """
+    True once every required model among the warmed up `names` is loaded.
+    Models left out of the warm-up load lazily on first use, through their
+    getter rather than their loader, so they cannot hold up readiness.
+    """
+    return all(
+        loader.state == "ready"
+        for name, loader in _MODELS.items()
+        if loader.required and name in names
+    )
+
+
+_IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(module: str = "api.fast", top: int = 25) -> list:
+    """
+    Imports `module` in a fresh interpreter with `-X importtime` and prints
+    the `top` top-level packages by cumulative import time.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        raise RuntimeError(f"Importing {module} failed")
+
+    packages = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative_us, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        # Only the outermost imports, their cumulative time includes everything below
+        if indent == 1:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + cumulative_us
+            total_us += cumulative_us
+
+    ranking = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    print(f"Importing {module} took {total_us / 1e6:.2f}s")
+    for package, us in ranking:
+        print(f"{us / 1e3:10.1f} ms  {package}")
+    return ranking
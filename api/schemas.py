@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 
 class ChatRequest(BaseModel):
     session_id: Optional[str] = None
@@ -12,3 +12,6 @@ class ChatResponse(BaseModel):
 
 class LoginRequest(BaseModel):
     username: str
+
+class ClassifyBatchRequest(BaseModel):
+    texts: List[str]
@@ -0,0 +1,81 @@
+import os
+import zlib
+import fcntl
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from pocketcoach.params import *
+
+
+class StripedLocks:
+    """
+    Per-key locks from a fixed pool: a key always maps to the same one of
+    `stripes` locks, so memory stays bounded however many sessions exist and
+    two sessions only contend when they share a stripe.
+
+    With `lock_dir` the lock is also held across processes: every stripe has a
+    lock file that is flock()ed while its thread lock is held.
+    """
+
+    def __init__(self, stripes: int = SESSION_LOCK_STRIPES, lock_dir: Path = None):
+        self.stripes = stripes
+        self.lock_dir = Path(lock_dir) if lock_dir else None
+        self._locks = [threading.RLock() for _ in range(stripes)]
+        # Re-entry depth per stripe, only the outermost acquisition takes the
+        # file lock (flock on a second descriptor would block on our own lock)
+        self._depth = [0] * stripes
+        self._files = {}
+        self._pid = os.getpid()
+        if self.lock_dir:
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+
+    def _stripe(self, key: str) -> int:
+        # crc32 rather than hash(), so all processes agree on the stripe
+        return zlib.crc32(key.encode("utf-8")) % self.stripes
+
+    def _lock_file(self, stripe: int):
+        if self._pid != os.getpid():
+            # Descriptors inherited over fork share their lock with the parent
+            self._files = {}
+            self._pid = os.getpid()
+        f = self._files.get(stripe)
+        if f is None:
+            f = self._files[stripe] = open(self.lock_dir / f"{stripe}.lock", "a+")
+        return f
+
+    @contextmanager
+    def hold(self, key: str):
+        stripe = self._stripe(key)
+        with self._locks[stripe]:
+            self._depth[stripe] += 1
+            f = self._lock_file(stripe) if self.lock_dir and self._depth[stripe] == 1 else None
+            try:
+                if f is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                yield
+            finally:
+                if f is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                self._depth[stripe] -= 1
+
+
+_session_locks = None
+_session_locks_lock = threading.Lock()
+
+def get_session_locks() -> StripedLocks:
+    """
+    The in-process session locks of chat_manager. The session store takes its
+    own, cross-process locks around each file rewrite.
+    """
+    global _session_locks
+    if _session_locks is None:
+        with _session_locks_lock:
+            if _session_locks is None:
+                _session_locks = StripedLocks(SESSION_LOCK_STRIPES)
+    return _session_locks
+
+def session_lock(session_id: str):
+    """
+    Context manager serializing the updates of one session in this process.
+    """
+    return get_session_locks().hold(session_id)
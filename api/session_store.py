@@ -0,0 +1,512 @@
+import os
+import re
+import json
+import struct
+import sqlite3
+import threading
+import logging
+from typing import List, Dict, Optional
+from pathlib import Path
+from datetime import datetime, timezone
+import numpy as np
+from pocketcoach.params import *
+from api.session_locks import StripedLocks
+
+# Store sessions for long term
+SESSIONS_DIR = Path(SESSIONS_PATH)
+SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+USER_SESSION_FILE = SESSIONS_DIR / "user_sessions.json"
+
+
+_MESSAGES_START = re.compile(r'"messages"\s*:\s*\[')
+_DECODER = json.JSONDecoder()
+# (file size, file mtime_ns, message count) ahead of the (start, end) pairs of an index
+_INDEX_HEADER = struct.Struct("<qqq")
+
+
+def _tmp_path(path: Path) -> Path:
+    """
+    A temporary name next to `path`, unique per process and thread.
+    """
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _utc_now() -> str:
+    # Naive ISO UTC, the format of the rows written so far
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _resolve_slice(total: int, start: int, stop: Optional[int]):
+    """
+    Clamps Python slice bounds (negative start counts from the end) to [0, total].
+    """
+    start, stop, _ = slice(start, stop).indices(total)
+    return start, max(start, stop)
+
+
+class JsonSessionStore:
+    """
+    One `sessions/<session_id>.json` file per session holding {"messages": [...]}.
+
+    Every message is written on its own line, and `<session_id>.idx` records the
+    byte range of each one, so a page of the history is read with one seek
+    instead of parsing the whole file. The index stores the size and mtime of
+    the file it describes and the number of messages, and is rebuilt when they
+    no longer match (e.g. for files written by older versions or a truncated index).
+
+    Files are replaced atomically (written under a temporary name, then
+    renamed), so readers never take a lock. Read-modify-write cycles hold a
+    per-session lock that also excludes other processes.
+    """
+
+    def __init__(self, sessions_dir: Path = SESSIONS_DIR):
+        self.sessions_dir = Path(sessions_dir)
+        self.sessions_dir.mkdir(exist_ok=True)
+        self._locks = StripedLocks(SESSION_LOCK_STRIPES, self.sessions_dir / ".locks")
+
+    def _path(self, session_id: str) -> Path:
+        return self.sessions_dir / f"{session_id}.json"
+
+    def _index_path(self, session_id: str) -> Path:
+        return self.sessions_dir / f"{session_id}.idx"
+
+    def _read(self, path: Path) -> Dict:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, path: Path, data: Dict) -> None:
+        """
+        Writes `data` with one message per line and its byte range index.
+        ASCII only (json's default), so string and byte offsets agree.
+        """
+        chunks = ['{\n  "messages": [']
+        position = len(chunks[0])
+        bounds = []
+        for i, message in enumerate(data.get("messages", [])):
+            separator = "\n    " if i == 0 else ",\n    "
+            encoded = json.dumps(message)
+            position += len(separator)
+            bounds.append((position, position + len(encoded)))
+            position += len(encoded)
+            chunks += [separator, encoded]
+        chunks.append("\n  ]" if bounds else "]")
+        for key, value in data.items():
+            if key != "messages":
+                chunks.append(f",\n  {json.dumps(key)}: {json.dumps(value)}")
+        chunks.append("\n}\n")
+        tmp_path = _tmp_path(path)
+        with open(tmp_path, "w", encoding="ascii") as f:
+            f.write("".join(chunks))
+        # The rename keeps the mtime, so the index can be written first
+        self._write_index(path, np.array(bounds, dtype="<u8").reshape(-1, 2), tmp_path.stat())
+        os.replace(tmp_path, path)
+
+    def _write_index(self, path: Path, bounds: np.ndarray, stat: os.stat_result) -> None:
+        index_path = path.with_suffix(".idx")
+        tmp_path = _tmp_path(index_path)
+        with open(tmp_path, "wb") as f:
+            f.write(_INDEX_HEADER.pack(stat.st_size, stat.st_mtime_ns, len(bounds)))
+            f.write(bounds.tobytes())
+        os.replace(tmp_path, index_path)
+
+    def _bounds(self, session_id: str, f) -> np.ndarray:
+        """
+        The (start, end) byte offsets of every message in the open session file
+        `f`, from the index or rebuilt with one parse of the file.
+        """
+        stat = os.fstat(f.fileno())
+        try:
+            raw = self._index_path(session_id).read_bytes()
+            size, mtime_ns, count = _INDEX_HEADER.unpack_from(raw)
+            # A truncated index (or one of the old format without the count) fails the length check
+            if (size, mtime_ns) == (stat.st_size, stat.st_mtime_ns) and len(raw) == _INDEX_HEADER.size + 16 * count:
+                return np.frombuffer(raw, dtype="<u8", offset=_INDEX_HEADER.size).reshape(-1, 2)
+        except (FileNotFoundError, struct.error):
+            pass
+
+        f.seek(0)
+        text = f.read().decode("utf-8")
+        # Files are ASCII unless written by hand, then offsets need converting
+        to_bytes = (lambda i: i) if text.isascii() else (lambda i: len(text[:i].encode("utf-8")))
+        bounds = []
+        match = _MESSAGES_START.search(text)
+        position = match.end() if match else len(text)
+        while position < len(text):
+            while text[position] in " \t\r\n,":
+                position += 1
+            if text[position] == "]":
+                break
+            _, end = _DECODER.raw_decode(text, position)
+            bounds.append((to_bytes(position), to_bytes(end)))
+            position = end
+        bounds = np.array(bounds, dtype="<u8").reshape(-1, 2)
+        path = self._path(session_id)
+        try:
+            current = path.stat()
+        except FileNotFoundError:
+            current = None
+        # Skipped if the file was replaced meanwhile, the writer indexed it
+        if current is not None and (current.st_ino, current.st_size, current.st_mtime_ns) == (
+            stat.st_ino, stat.st_size, stat.st_mtime_ns
+        ):
+            self._write_index(path, bounds, stat)
+        return bounds
+
+    def exists(self, session_id: str) -> bool:
+        return self._path(session_id).is_file()
+
+    def create(self, session_id: str) -> bool:
+        """
+        Creates an empty session. Returns False if it already existed.
+        """
+        path = self._path(session_id)
+        with self._locks.hold(session_id):
+            if path.exists():
+                return False
+            self._write(path, {"messages": []})
+        return True
+
+    def append(self, session_id: str, message: Dict) -> None:
+        path = self._path(session_id)
+        with self._locks.hold(session_id):
+            if not path.exists():
+                raise KeyError(f"Session {session_id} not found")
+            data = self._read(path)
+            data.setdefault("messages", []).append(message)
+            self._write(path, data)
+
+    def messages(self, session_id: str) -> List[Dict]:
+        path = self._path(session_id)
+        if not path.is_file():
+            raise KeyError(f"Session {session_id} not found")
+        data = self._read(path)
+        return list(data.get("messages", []))
+
+    def page(self, session_id: str, start: int = 0, stop: Optional[int] = None):
+        """
+        Returns (messages[start:stop], start, total) with each message's
+        position as "id". A negative `start` counts from the end.
+        """
+        path = self._path(session_id)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            raise KeyError(f"Session {session_id} not found")
+        with f:
+            bounds = self._bounds(session_id, f)
+            total = len(bounds)
+            start, stop = _resolve_slice(total, start, stop)
+            if start == stop:
+                return [], start, total
+            base = int(bounds[start][0])
+            f.seek(base)
+            blob = f.read(int(bounds[stop - 1][1]) - base)
+        messages = []
+        for i, (begin, end) in enumerate(bounds[start:stop], start):
+            message = json.loads(blob[int(begin) - base:int(end) - base])
+            message["id"] = i
+            messages.append(message)
+        return messages, start, total
+
+    def message_count(self, session_id: str) -> int:
+        """
+        Number of messages in the session, from the index.
+        """
+        try:
+            f = open(self._path(session_id), "rb")
+        except FileNotFoundError:
+            raise KeyError(f"Session {session_id} not found")
+        with f:
+            return len(self._bounds(session_id, f))
+
+    def version(self, session_id: str):
+        """
+        Returns (token, last_modified) that change whenever the session does,
+        from a stat of its file.
+        """
+        try:
+            stat = self._path(session_id).stat()
+        except FileNotFoundError:
+            raise KeyError(f"Session {session_id} not found")
+        return f"{stat.st_size:x}-{stat.st_mtime_ns:x}", datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+    def get_summary(self, session_id: str) -> Optional[Dict]:
+        """
+        Returns the running summary {"text": ..., "upto": n_messages} or None.
+        """
+        path = self._path(session_id)
+        if not path.is_file():
+            raise KeyError(f"Session {session_id} not found")
+        return self._read(path).get("summary")
+
+    def set_summary(self, session_id: str, text: str, upto: int) -> None:
+        path = self._path(session_id)
+        with self._locks.hold(session_id):
+            if not path.exists():
+                raise KeyError(f"Session {session_id} not found")
+            data = self._read(path)
+            data["summary"] = {"text": text, "upto": upto}
+            self._write(path, data)
+
+    def delete(self, session_id: str) -> None:
+        path = self._path(session_id)
+        with self._locks.hold(session_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                raise KeyError(f"Session {session_id} not found")
+            try:
+                os.remove(self._index_path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def session_ids(self) -> List[str]:
+        return sorted(
+            path.stem for path in self.sessions_dir.glob("*.json")
+            if path.name != USER_SESSION_FILE.name
+        )
+
+
+class SQLiteSessionStore:
+    """
+    Embedded SQLite database in WAL mode. Appending a message is a single row
+    insert and reading a history is an indexed range scan on (session_id, id).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            sentiment TEXT,
+            created_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+        CREATE TABLE IF NOT EXISTS summaries (
+            session_id TEXT PRIMARY KEY REFERENCES sessions(session_id) ON DELETE CASCADE,
+            summary TEXT NOT NULL,
+            upto INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: Path = None):
+        self.db_path = Path(db_path or SESSION_DB_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread (and per process, connections must not
+        # cross a fork).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def exists(self, session_id: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row is not None
+
+    def create(self, session_id: str) -> bool:
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, created_at) VALUES (?, ?)",
+                (session_id, _utc_now()),
+            )
+        return cursor.rowcount == 1
+
+    def append(self, session_id: str, message: Dict) -> None:
+        sentiment = message.get("sentiment")
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT INTO messages (session_id, role, content, sentiment, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        session_id,
+                        message.get("role", ""),
+                        message.get("content", ""),
+                        json.dumps(sentiment) if sentiment is not None else None,
+                        _utc_now(),
+                    ),
+                )
+        except sqlite3.IntegrityError:
+            raise KeyError(f"Session {session_id} not found")
+
+    def append_many(self, session_id: str, messages: List[Dict]) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, created_at) VALUES (?, ?)",
+                (session_id, _utc_now()),
+            )
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content, sentiment, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        session_id,
+                        message.get("role", ""),
+                        message.get("content", ""),
+                        json.dumps(message["sentiment"]) if message.get("sentiment") is not None else None,
+                        _utc_now(),
+                    )
+                    for message in messages
+                ],
+            )
+
+    def messages(self, session_id: str) -> List[Dict]:
+        conn = self._connection()
+        if not self.exists(session_id):
+            raise KeyError(f"Session {session_id} not found")
+        rows = conn.execute(
+            "SELECT role, content, sentiment FROM messages WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        ).fetchall()
+        return [self._to_message(row) for row in rows]
+
+    def page(self, session_id: str, start: int = 0, stop: Optional[int] = None):
+        """
+        Returns (messages[start:stop], start, total) with each message's
+        position as "id". A negative `start` counts from the end.
+        """
+        conn = self._connection()
+        if not self.exists(session_id):
+            raise KeyError(f"Session {session_id} not found")
+        (total,) = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+        start, stop = _resolve_slice(total, start, stop)
+        rows = conn.execute(
+            "SELECT role, content, sentiment FROM messages WHERE session_id = ? ORDER BY id LIMIT ? OFFSET ?",
+            (session_id, stop - start, start),
+        ).fetchall()
+        messages = []
+        for i, row in enumerate(rows, start):
+            message = self._to_message(row)
+            message["id"] = i
+            messages.append(message)
+        return messages, start, total
+
+    def message_count(self, session_id: str) -> int:
+        conn = self._connection()
+        if not self.exists(session_id):
+            raise KeyError(f"Session {session_id} not found")
+        (count,) = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+        return count
+
+    def version(self, session_id: str):
+        """
+        Returns (token, last_modified) that change whenever a message is added
+        or the session is recreated, from the (session_id, id) index.
+        """
+        row = self._connection().execute(
+            "SELECT s.created_at, COUNT(m.id), MAX(m.id), MAX(m.created_at) "
+            "FROM sessions s LEFT JOIN messages m ON m.session_id = s.session_id "
+            "WHERE s.session_id = ? GROUP BY s.session_id",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Session {session_id} not found")
+        created_at, count, max_id, last_message_at = row
+        last_modified = datetime.fromisoformat(last_message_at or created_at).replace(tzinfo=timezone.utc)
+        return f"{count:x}-{max_id or 0:x}-{created_at}", last_modified
+
+    def get_summary(self, session_id: str) -> Optional[Dict]:
+        if not self.exists(session_id):
+            raise KeyError(f"Session {session_id} not found")
+        row = self._connection().execute(
+            "SELECT summary, upto FROM summaries WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"text": row[0], "upto": row[1]}
+
+    def set_summary(self, session_id: str, text: str, upto: int) -> None:
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO summaries (session_id, summary, upto, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (session_id, text, upto, _utc_now()),
+                )
+        except sqlite3.IntegrityError:
+            raise KeyError(f"Session {session_id} not found")
+
+    def delete(self, session_id: str) -> None:
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            if cursor.rowcount == 0:
+                raise KeyError(f"Session {session_id} not found")
+
+    def session_ids(self) -> List[str]:
+        rows = self._connection().execute(
+            "SELECT session_id FROM sessions ORDER BY session_id"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _to_message(row) -> Dict:
+        role, content, sentiment = row
+        message = {"role": role, "content": content}
+        if sentiment is not None:
+            message["sentiment"] = json.loads(sentiment)
+        return message
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_session_store():
+    """
+    Returns the process-wide session store selected by SESSION_BACKEND
+    ("json" or "sqlite").
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if SESSION_BACKEND == "sqlite":
+                    _store = SQLiteSessionStore(SESSION_DB_PATH)
+                elif SESSION_BACKEND == "json":
+                    _store = JsonSessionStore(SESSIONS_DIR)
+                else:
+                    raise ValueError(f"Unknown SESSION_BACKEND {SESSION_BACKEND}, use 'json' or 'sqlite'")
+    return _store
+
+
+def migrate_json_sessions(sessions_dir: Path = SESSIONS_DIR, db_path: Path = None) -> int:
+    """
+    Imports every `sessions/<session_id>.json` file into the SQLite store.
+    Sessions that already exist in the database are skipped, so the migration
+    can be re-run safely. Returns the number of imported sessions.
+    """
+    source = JsonSessionStore(sessions_dir)
+    target = SQLiteSessionStore(db_path or SESSION_DB_PATH)
+    imported = 0
+    for session_id in source.session_ids():
+        if target.exists(session_id):
+            continue
+        try:
+            messages = source.messages(session_id)
+            summary = source.get_summary(session_id)
+        except (ValueError, KeyError):
+            logging.exception(f"Skipping unreadable session {session_id}")
+            continue
+        target.append_many(session_id, messages)
+        if summary:
+            target.set_summary(session_id, summary["text"], summary["upto"])
+        imported += 1
+    print(f"✅ Imported {imported} sessions into {target.db_path}")
+    return imported
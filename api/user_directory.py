@@ -0,0 +1,129 @@
+import os
+import json
+import fcntl
+import uuid
+import threading
+import logging
+from typing import Dict, Optional, Tuple
+from pathlib import Path
+from api.session_store import SESSIONS_DIR, USER_SESSION_FILE
+
+USER_DIRECTORY_FILE = SESSIONS_DIR / "user_sessions.jsonl"
+
+
+class UserDirectory:
+    """
+    Bidirectional username <-> session_id index.
+
+    Lookups in both directions are dict lookups. New users are appended as one
+    JSON line to `log_path` instead of rewriting the whole file, under a thread
+    lock and an exclusive file lock, so concurrent logins in threads or worker
+    processes never create two sessions for the same user. Entries appended by
+    other processes are picked up by reading the log tail on a miss.
+    """
+
+    def __init__(self, log_path: Path = USER_DIRECTORY_FILE, legacy_path: Path = USER_SESSION_FILE):
+        self.log_path = Path(log_path)
+        self._lock = threading.Lock()
+        self._by_username: Dict[str, str] = {}
+        self._by_session: Dict[str, str] = {}
+        self._offset = 0
+        self._import_legacy(Path(legacy_path))
+        with self._lock:
+            self._refresh()
+
+    def session_for(self, username: str) -> Optional[str]:
+        session_id = self._by_username.get(username)
+        if session_id is None:
+            with self._lock:
+                self._refresh()
+                session_id = self._by_username.get(username)
+        return session_id
+
+    def username_for(self, session_id: str) -> Optional[str]:
+        username = self._by_session.get(session_id)
+        if username is None:
+            with self._lock:
+                self._refresh()
+                username = self._by_session.get(session_id)
+        return username
+
+    def get_or_create(self, username: str) -> Tuple[str, bool]:
+        """
+        Returns (session_id, created) for `username`.
+        """
+        session_id = self._by_username.get(username)
+        if session_id is not None:
+            return session_id, False
+        with self._lock, open(self.log_path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                session_id = self._by_username.get(username)
+                if session_id is not None:
+                    return session_id, False
+                session_id = str(uuid.uuid4())
+                f.write(json.dumps({"username": username, "session_id": session_id}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+                self._offset = f.tell()
+                self._add(username, session_id)
+                return session_id, True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def as_dict(self) -> Dict[str, str]:
+        with self._lock:
+            self._refresh()
+            return dict(self._by_username)
+
+    def _add(self, username: str, session_id: str):
+        previous = self._by_username.get(username)
+        if previous is not None:
+            self._by_session.pop(previous, None)
+        self._by_username[username] = session_id
+        self._by_session[session_id] = username
+
+    def _refresh(self):
+        # Caller holds self._lock. Reads only the lines appended since the
+        # last refresh; a partially written last line is left for next time.
+        if not self.log_path.exists():
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._offset)
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                self._offset = f.tell()
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logging.error(f"Skipping corrupt line in {self.log_path}")
+                    continue
+                self._add(entry["username"], entry["session_id"])
+
+    def _import_legacy(self, legacy_path: Path):
+        # One-off conversion of the old {"username": "session_id"} file
+        if self.log_path.exists() or not legacy_path.exists():
+            return
+        with open(legacy_path, "r") as f:
+            sessions = json.load(f)
+        tmp_path = self.log_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for username, session_id in sessions.items():
+                f.write(json.dumps({"username": username, "session_id": session_id}) + "\n")
+        os.replace(tmp_path, self.log_path)
+        logging.info(f"Imported {len(sessions)} users from {legacy_path} into {self.log_path}")
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+def get_user_directory() -> UserDirectory:
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                _directory = UserDirectory()
+    return _directory
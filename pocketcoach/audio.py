@@ -0,0 +1,104 @@
+# Decoding uploads into the 16 kHz mono float32 arrays Whisper expects
+import subprocess
+import threading
+from math import gcd
+import numpy as np
+import soundfile as sf
+
+TARGET_SAMPLING_RATE = 16000
+_CHUNK_SIZE = 1 << 16
+# Tail of ffmpeg's stderr kept for the error message
+_MAX_ERROR_BYTES = 4096
+
+
+class AudioDecodeError(ValueError):
+    """
+    Raised when an upload cannot be decoded as audio.
+    """
+
+
+def to_mono(data: np.ndarray) -> np.ndarray:
+    """
+    Averages the channels of a (frames, channels) array, a view for mono input.
+    """
+    if data.ndim == 1:
+        return data
+    if data.shape[1] == 1:
+        return data[:, 0]
+    return data.mean(axis=1, dtype=np.float32)
+
+
+def resample(data: np.ndarray, sampling_rate: int, target: int = TARGET_SAMPLING_RATE) -> np.ndarray:
+    """
+    Polyphase resampling to `target` Hz, a no-op if the rate already matches.
+    """
+    if sampling_rate == target:
+        return data
+    from scipy.signal import resample_poly
+    factor = gcd(sampling_rate, target)
+    return resample_poly(data, target // factor, sampling_rate // factor).astype(np.float32, copy=False)
+
+
+def _ffmpeg_decode(fileobj, sampling_rate: int) -> np.ndarray:
+    """
+    Streams `fileobj` through ffmpeg (for MP3, M4A, WebM, ...), which downmixes
+    and resamples while decoding. Input is fed in chunks from a thread while
+    the decoded samples are read, so neither side is held in memory twice.
+    stderr is drained by another thread, ffmpeg would block on a full pipe.
+    """
+    try:
+        proc = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-ac", "1", "-ar", str(sampling_rate), "-f", "f32le", "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise AudioDecodeError("ffmpeg is needed to decode this audio format")
+
+    def feed():
+        try:
+            for chunk in iter(lambda: fileobj.read(_CHUNK_SIZE), b""):
+                proc.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            pass  # ffmpeg stopped reading, its exit code tells why
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    stderr = bytearray()
+
+    def drain():
+        for chunk in iter(lambda: proc.stderr.read(_MAX_ERROR_BYTES), b""):
+            stderr.extend(chunk)
+            del stderr[:-_MAX_ERROR_BYTES]
+
+    threads = [threading.Thread(target=feed, daemon=True), threading.Thread(target=drain, daemon=True)]
+    for thread in threads:
+        thread.start()
+    decoded = bytearray()
+    for chunk in iter(lambda: proc.stdout.read(_CHUNK_SIZE), b""):
+        decoded += chunk
+    for thread in threads:
+        thread.join()
+    errors = stderr.decode(errors="replace").strip()
+    if proc.wait() != 0 or not decoded:
+        raise AudioDecodeError(f"Could not decode audio: {errors or 'no audio stream'}")
+    return np.frombuffer(decoded[:len(decoded) - len(decoded) % 4], dtype="<f4")
+
+
+def decode_audio(fileobj, sampling_rate: int = TARGET_SAMPLING_RATE) -> np.ndarray:
+    """
+    Decodes an audio file object (WAV, FLAC, OGG natively, anything else via
+    ffmpeg) into a mono float32 array at `sampling_rate`, without temp files.
+    """
+    start = fileobj.tell()
+    try:
+        data, file_rate = sf.read(fileobj, dtype="float32", always_2d=True)
+    except RuntimeError:
+        fileobj.seek(start)
+        return _ffmpeg_decode(fileobj, sampling_rate)
+    if data.size == 0:
+        raise AudioDecodeError("Audio file contains no samples")
+    return resample(to_mono(data), file_rate, sampling_rate)
@@ -0,0 +1,176 @@
+# Offline re-labelling of large CSV/Parquet files with the sentiment classifier
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, ALL_COMPLETED, wait
+import numpy as np
+import pandas as pd
+from pocketcoach.params import MODEL_BACKEND
+
+CHECKPOINT_NAME = "_checkpoint.json"
+
+# The classifier of a pool worker, loaded once by _init_worker
+_worker_classifier = None
+
+
+def iter_chunks(path: Path, chunk_size: int, text_column: str = "text"):
+    """
+    Yields the rows of a CSV or Parquet file as DataFrames of `chunk_size` rows
+    without loading the whole file.
+    """
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype={text_column: str}, keep_default_na=False)
+
+
+def _init_worker(backend: str, num_threads: int):
+    global _worker_classifier
+    from pocketcoach.dl_logic.service import load_classifier
+    _worker_classifier = load_classifier(backend, num_threads=num_threads)
+
+
+def _score_texts(texts, batch_size: int) -> np.ndarray:
+    """
+    Cleans, tokenizes and classifies `texts` in a worker, returning an
+    (N, classes) float32 score matrix.
+    """
+    rows = []
+    for start in range(0, len(texts), batch_size):
+        for result in _worker_classifier.predict_batch(texts[start:start + batch_size]):
+            rows.append([c["score"] for c in result])
+    return np.asarray(rows, dtype=np.float32)
+
+
+class Checkpoint:
+    """
+    The chunks of an input already written to the output directory, so an
+    interrupted run continues where it stopped.
+    """
+
+    def __init__(self, output_dir: Path, input_path: Path, chunk_size: int):
+        self.path = output_dir / CHECKPOINT_NAME
+        self.state = {"input": str(input_path.resolve()), "chunk_size": chunk_size, "done": [], "rows": 0}
+        if self.path.is_file():
+            saved = json.loads(self.path.read_text())
+            if saved["input"] != self.state["input"] or saved["chunk_size"] != chunk_size:
+                raise ValueError(
+                    f"{output_dir} holds results of {saved['input']} in chunks of {saved['chunk_size']}, "
+                    "use another output directory or the same input and chunk size"
+                )
+            self.state = saved
+        self.done = set(self.state["done"])
+
+    def mark_done(self, chunk_index: int, rows: int):
+        self.done.add(chunk_index)
+        self.state["done"] = sorted(self.done)
+        self.state["rows"] += rows
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.state))
+        os.replace(tmp_path, self.path)
+
+
+def _write_part(output_dir: Path, chunk_index: int, chunk: pd.DataFrame, scores: np.ndarray):
+    from pocketcoach.dl_logic.data import emotion_of
+    labels = np.array([emotion_of(i) for i in range(scores.shape[1])])
+    top = scores.argmax(axis=1)
+    result = chunk.assign(label=labels[top], score=scores[np.arange(len(top)), top])
+    for i, label in enumerate(labels):
+        result[f"score_{label}"] = scores[:, i]
+    # Written under a temporary name first, a part file is always complete
+    path = output_dir / f"part-{chunk_index:05d}.parquet"
+    tmp_path = output_dir / f".part-{chunk_index:05d}.parquet.tmp"
+    result.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def score_file(
+    input_path,
+    output_dir,
+    text_column="text",
+    chunk_size=50000,
+    batch_size=1024,
+    n_jobs=0,
+    backend=MODEL_BACKEND,
+):
+    """
+    Classifies the `text_column` of a CSV or Parquet file and writes the input
+    rows plus label, score and one score_<emotion> column per class to
+    `output_dir` as one Parquet part per chunk (read them back with
+    pd.read_parquet(output_dir)).
+
+    Chunks are scored by `n_jobs` worker processes (0 = one per CPU), each
+    loading the model once and using an equal share of the CPU threads. At most
+    two chunks per worker are read ahead. Finished chunks are recorded in a
+    checkpoint, running the same command again skips them.
+    """
+    input_path, output_dir = Path(input_path), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = Checkpoint(output_dir, input_path, chunk_size)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    threads_per_worker = max(1, (os.cpu_count() or 1) // n_jobs)
+    if checkpoint.done:
+        print(f"Resuming, {len(checkpoint.done)} chunks ({checkpoint.state['rows']} rows) already scored")
+
+    rows_scored = 0
+    start = time.perf_counter()
+    # TensorFlow is not fork safe, workers start from a fresh interpreter
+    with ProcessPoolExecutor(
+        max_workers=n_jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(backend, threads_per_worker),
+    ) as executor:
+        pending = {}
+
+        def collect(return_when):
+            nonlocal rows_scored
+            finished, _ = wait(pending, return_when=return_when)
+            for future in finished:
+                chunk_index, chunk = pending.pop(future)
+                _write_part(output_dir, chunk_index, chunk, future.result())
+                checkpoint.mark_done(chunk_index, len(chunk))
+                rows_scored += len(chunk)
+                elapsed = time.perf_counter() - start
+                print(f"Chunk {chunk_index} done, {rows_scored} rows in {elapsed:.0f}s ({rows_scored / elapsed:.0f} rows/s)")
+
+        for chunk_index, chunk in enumerate(iter_chunks(input_path, chunk_size, text_column)):
+            if chunk_index in checkpoint.done:
+                continue
+            if text_column not in chunk:
+                raise KeyError(f"Column {text_column} not found, columns are {list(chunk.columns)}")
+            texts = chunk[text_column].fillna("").astype(str).tolist()
+            pending[executor.submit(_score_texts, texts, batch_size)] = (chunk_index, chunk)
+            if len(pending) >= 2 * n_jobs:
+                collect(FIRST_COMPLETED)
+        if pending:
+            collect(ALL_COMPLETED)
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "rows": rows_scored,
+        "total_rows": checkpoint.state["rows"],
+        "seconds": round(elapsed, 1),
+        "rows_per_s": round(rows_scored / elapsed, 1) if elapsed else 0.0,
+        "workers": n_jobs,
+    }
+    print(f"✅ Scored {rows_scored} rows in {elapsed:.0f}s ({report['rows_per_s']} rows/s), results in {output_dir}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Label a CSV or Parquet file with the sentiment classifier")
+    parser.add_argument("input", help="CSV or Parquet file")
+    parser.add_argument("output", help="Directory for the Parquet parts and the checkpoint")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--n-jobs", type=int, default=0, help="Worker processes, 0 = one per CPU")
+    parser.add_argument("--backend", default=MODEL_BACKEND, help="keras, tflite or onnx")
+    args = parser.parse_args()
+    score_file(args.input, args.output, args.text_column, args.chunk_size, args.batch_size, args.n_jobs, args.backend)
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects single-text classification requests from concurrent threads and
+    coroutines and runs them through `predict_batch` in one forward pass.
+
+    A batch is flushed as soon as it holds `max_batch_size` requests or the
+    oldest request has waited `max_wait_ms` milliseconds, whichever comes
+    first. Every caller gets back the result for its own text.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=32, max_wait_ms=5.0):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._last_batch_size = 0
+        self._max_batch_size_seen = 0
+        self._batch_size_counts = {}
+        self._total_wait = 0.0
+
+    def submit(self, text) -> Future:
+        """
+        Enqueues `text` and returns a Future resolving to its classification.
+        """
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def classify(self, text, timeout=None):
+        """
+        Blocking helper for threads: waits for the batched result of `text`.
+        """
+        return self.submit(text).result(timeout=timeout)
+
+    async def aclassify(self, text):
+        """
+        Awaitable helper for coroutines: never blocks the event loop.
+        """
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stats(self) -> dict:
+        """
+        Returns queue-depth and batch-size statistics.
+        """
+        with self._stats_lock:
+            batches = self._batches
+            return {
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "requests": self._requests,
+                "batches": batches,
+                "errors": self._errors,
+                "avg_batch_size": self._requests / batches if batches else 0.0,
+                "last_batch_size": self._last_batch_size,
+                "max_batch_size_seen": self._max_batch_size_seen,
+                "batch_size_counts": dict(self._batch_size_counts),
+                "avg_wait_ms": self._total_wait * 1000.0 / self._requests if self._requests else 0.0,
+            }
+
+    def close(self):
+        """
+        Stops the worker thread after the requests already queued are served.
+        """
+        self._closed = True
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            if self._thread is not None:
+                self._thread.join()
+
+    def _ensure_worker(self):
+        # The worker thread (and its queue) do not survive a fork, so a child
+        # process lazily starts its own.
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,), name="sentiment-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, requests):
+        while True:
+            item = requests.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = requests.get(timeout=remaining) if remaining > 0 else requests.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch):
+        texts = [text for text, _, _ in batch]
+        started = time.perf_counter()
+        try:
+            results = self.predict_batch(texts)
+            error = None
+        except Exception as e:
+            results = None
+            error = e
+
+        with self._stats_lock:
+            size = len(batch)
+            self._requests += size
+            self._batches += 1
+            self._last_batch_size = size
+            self._max_batch_size_seen = max(self._max_batch_size_seen, size)
+            self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+            self._total_wait += sum(started - enqueued for _, _, enqueued in batch)
+            if error is not None:
+                self._errors += 1
+
+        for i, (_, future, _) in enumerate(batch):
+            if not future.set_running_or_notify_cancel():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
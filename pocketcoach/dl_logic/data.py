@@ -1,10 +1,14 @@
+import os
+import sys
 import pandas as pd
 from pathlib import Path
 import string
+from functools import lru_cache
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
 from nltk import word_tokenize
 from nltk.stem import WordNetLemmatizer
-import tensorflow as tf
-from keras.preprocessing.sequence import pad_sequences
+from pocketcoach.params import CLEAN_N_JOBS, CLEAN_CHUNK_SIZE
 
 def get_data(
         cache_path:Path,
@@ -25,16 +29,26 @@ def get_data(
     return df
 
 
-def clean_data_set(df: pd.DataFrame):
+def clean_data_set(df: pd.DataFrame, n_jobs: int = CLEAN_N_JOBS):
     """
     Adds a column with cleaned texts to the data frame.
     """
 
-    df['cleaned_text'] = df['text'].apply(clean)
+    df['cleaned_text'] = clean_batch(df['text'], n_jobs=n_jobs)
     print("✅ data cleaned")
 
     return df
 
+@lru_cache(maxsize=1)
+def _removal_table():
+    """
+    Translation table deleting everything clean() drops: every character for
+    which str.isdigit() is true (not only 0-9) and string.punctuation.
+    Built once per process, worker processes get it passed along.
+    """
+    digits = "".join(filter(str.isdigit, map(chr, range(sys.maxunicode + 1))))
+    return str.maketrans("", "", digits + string.punctuation)
+
 def clean(text: str):
     """
     Cleans the raw texts by lower casing, strip for leading or trailing white-
@@ -44,9 +58,7 @@ def clean(text: str):
 
     text = text.strip()
     text = text.lower()
-    text = ''.join(word for word in text if not word.isdigit())
-    for punctuation in string.punctuation:
-        text = text.replace(punctuation, '')
+    text = text.translate(_removal_table())
     # tokenized = word_tokenize(text)
     # tokenized_lemmatized = lemmatize(tokenized, "v")
     # tokenized_lemmatized = lemmatize(tokenized_lemmatized, "n")
@@ -55,17 +67,56 @@ def clean(text: str):
 
     return text
 
+def _clean_chunk(texts, table=None):
+    # Python str methods, not .str: Arrow-backed strings lower-case some
+    # characters ("İ", final "Σ") differently from clean()
+    table = table or _removal_table()
+    return [text.strip().lower().translate(table) if isinstance(text, str) else text for text in texts]
+
+def clean_batch(texts, n_jobs: int = 1, chunk_size: int = CLEAN_CHUNK_SIZE):
+    """
+    Cleans many texts at once with the same result as calling clean() on each.
+
+    A pandas Series is returned as a Series with the same index (missing
+    values stay missing), anything else (list, array) as a list. Inputs
+    longer than `chunk_size` are split into chunks cleaned by `n_jobs` worker
+    processes (0 means one per CPU).
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    table = _removal_table()
+    values = list(texts)
+    if n_jobs > 1 and len(values) > chunk_size:
+        chunks = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            cleaned = [text for chunk in executor.map(_clean_chunk, chunks, repeat(table)) for text in chunk]
+    else:
+        cleaned = _clean_chunk(values, table)
+
+    if isinstance(texts, pd.Series):
+        return pd.Series(cleaned, index=texts.index, name=texts.name, dtype=texts.dtype)
+    return cleaned
+
 def pad(X, tk):
+    if hasattr(tk, "encode_batch"):
+        # Compact tokenizer: encodes straight into an int32 array
+        return tk.encode_batch(list(X), maxlen=30)
+    from keras.preprocessing.sequence import pad_sequences
     X_token = tk.texts_to_sequences(X)
     return pad_sequences(X_token, dtype='float32', padding='post', maxlen=30)
 
 
+@lru_cache(maxsize=1)
+def _get_lemmatizer():
+    # One lemmatizer per process (and so per pool worker)
+    return WordNetLemmatizer()
+
 def lemmatize(word_tokens, pos):
     """
     Lemmatizes word tokens based on pos
     """
+    lemmatizer = _get_lemmatizer()
     return [
-        WordNetLemmatizer().lemmatize(word, pos=pos)
+        lemmatizer.lemmatize(word, pos=pos)
         for word in word_tokens
     ]
 
@@ -0,0 +1,130 @@
+import os
+import time
+from pathlib import Path
+import numpy as np
+import tensorflow as tf
+from pocketcoach.params import *
+from pocketcoach.dl_logic.data import get_data, clean_batch, pad
+from pocketcoach.dl_logic.tokenizer import load_tokenizer, MAXLEN
+
+SAMPLE_TEXTS = [
+    "i feel so happy today",
+    "i am really scared of tomorrow",
+    "i feel lonely and sad",
+    "this makes me so angry",
+    "i love spending time with my family",
+    "i was surprised by the news",
+    "ok",
+    "i don't know",
+]
+
+
+def _load_texts(file_name, limit):
+    """
+    Cleaned texts from LOCAL_DATA_PATH/`file_name`, or SAMPLE_TEXTS if missing.
+    """
+    path = Path(LOCAL_DATA_PATH or "raw_data").joinpath(file_name)
+    if not path.is_file():
+        return SAMPLE_TEXTS
+    texts = get_data(path)['text'].head(limit)
+    return list(clean_batch(texts))
+
+
+def export_tflite(path=MODEL_TFLITE_PATH, quantize="none"):
+    """
+    Converts the trained Keras model to TFLite.
+
+    quantize: "none", "dynamic" (int8 weights) or "int8" (int8 weights and
+    activations, calibrated on up to 500 training sentences).
+    """
+    model = tf.keras.models.load_model(BASE_MODEL_NAME)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "int8":
+        inputs = pad(_load_texts("training.csv", 500), load_tokenizer()).astype(np.int32)
+
+        def representative_dataset():
+            for row in inputs:
+                yield [row.reshape(1, MAXLEN)]
+
+        converter.representative_dataset = representative_dataset
+    elif quantize not in ("none", "dynamic"):
+        raise ValueError(f"Unknown quantization {quantize}, use none, dynamic or int8")
+
+    tflite_model = converter.convert()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(tflite_model)
+    print(f"✅ Model exported to {path} ({len(tflite_model) / 1024:.0f} KiB, quantize={quantize})")
+    return path
+
+
+def export_onnx(path=MODEL_ONNX_PATH, quantize="none"):
+    """
+    Converts the trained Keras model to ONNX (needs tf2onnx), optionally with
+    dynamic int8 weight quantization (needs onnxruntime).
+    """
+    import tf2onnx
+
+    model = tf.keras.models.load_model(BASE_MODEL_NAME)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    input_signature = (tf.TensorSpec((None, MAXLEN), tf.int32, name="input"),)
+    if quantize == "none":
+        tf2onnx.convert.from_keras(model, input_signature=input_signature, opset=13, output_path=path)
+    elif quantize in ("dynamic", "int8"):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        float_path = f"{path}.float"
+        tf2onnx.convert.from_keras(model, input_signature=input_signature, opset=13, output_path=float_path)
+        quantize_dynamic(float_path, path, weight_type=QuantType.QInt8)
+        os.remove(float_path)
+    else:
+        raise ValueError(f"Unknown quantization {quantize}, use none, dynamic or int8")
+    print(f"✅ Model exported to {path} ({os.path.getsize(path) / 1024:.0f} KiB, quantize={quantize})")
+    return path
+
+
+def export_model(fmt="tflite", quantize="none"):
+    if fmt == "tflite":
+        return export_tflite(quantize=quantize)
+    if fmt == "onnx":
+        return export_onnx(quantize=quantize)
+    raise ValueError(f"Unknown export format {fmt}, use tflite or onnx")
+
+
+def check_parity(backend="tflite", texts=None, batch_size=32):
+    """
+    Compares an exported backend with the Keras model on `texts` (by default up
+    to 2000 sentences of the test set). Returns the share of identical top
+    labels, the largest score difference and the per-batch latency of both;
+    tests/test_export.py checks them against the parity thresholds.
+    """
+    from pocketcoach.dl_logic.model import load_model
+    from pocketcoach.dl_logic.lite_backend import load_lite_model
+
+    texts = texts or _load_texts("test.csv", 2000)
+    reference = load_model()
+    candidate = load_lite_model(backend)
+
+    def run(pipeline):
+        results = []
+        start = time.perf_counter()
+        for i in range(0, len(texts), batch_size):
+            results.extend(pipeline.predict_batch(texts[i:i + batch_size]))
+        elapsed = time.perf_counter() - start
+        scores = np.array([[c["score"] for c in result] for result in results])
+        return scores, elapsed * 1000 / max(1, -(-len(texts) // batch_size))
+
+    expected, reference_ms = run(reference)
+    actual, candidate_ms = run(candidate)
+
+    report = {
+        "backend": backend,
+        "texts": len(texts),
+        "label_agreement": float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean()),
+        "max_score_diff": float(np.abs(expected - actual).max()),
+        "keras_ms_per_batch": reference_ms,
+        f"{backend}_ms_per_batch": candidate_ms,
+    }
+    print(report)
+    return report
@@ -0,0 +1,43 @@
+import numpy as np
+import tensorflow as tf
+
+# Sequences are padded to the end of their bucket (7, 15, 23 or 30 tokens)
+# instead of always to 30. All boundaries minus one must cover maxlen.
+BUCKET_BOUNDARIES = [8, 16, 24, 31]
+
+
+def make_dataset(
+    texts,
+    labels,
+    tokenizer,
+    batch_size=32,
+    shuffle=False,
+    cache_path="",
+    maxlen=30,
+    bucket_boundaries=BUCKET_BOUNDARIES,
+):
+    """
+    Builds a tf.data pipeline of (int32 token ids, label) batches.
+
+    - Tokenizes once, truncating like pad_sequences (keeps the last `maxlen` ids)
+    - Caches the tokenized dataset in memory, or in `cache_path` if given
+    - Shuffles every epoch when `shuffle` is set
+    - Batches sequences of similar length together, padded to their bucket
+      boundary, so short sentences don't pay for 30 padded steps
+    - Prefetches the next batches while the model trains
+    """
+    sequences = [sequence[-maxlen:] for sequence in tokenizer.texts_to_sequences(list(texts))]
+    ragged = tf.ragged.constant(sequences, dtype=tf.int32, ragged_rank=1)
+    labels = np.asarray(labels, dtype=np.int32)
+
+    ds = tf.data.Dataset.from_tensor_slices((ragged, labels))
+    ds = ds.cache(cache_path)
+    if shuffle:
+        ds = ds.shuffle(len(sequences), reshuffle_each_iteration=True)
+    ds = ds.bucket_by_sequence_length(
+        element_length_func=lambda x, y: tf.shape(x)[0],
+        bucket_boundaries=bucket_boundaries,
+        bucket_batch_sizes=[batch_size] * (len(bucket_boundaries) + 1),
+        pad_to_bucket_boundary=True,
+    )
+    return ds.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,98 @@
+import threading
+import numpy as np
+from pocketcoach.params import *
+
+
+class TFLiteModel:
+    """
+    Runs an exported .tflite classifier with the standalone tflite_runtime
+    interpreter (falling back to tf.lite if only TensorFlow is installed).
+    Called like the Keras model: model(int32 ids of shape (N, 30)) -> probabilities.
+
+    Batches are padded up to the next power of two and every padded size
+    gets its own interpreter, allocated once, so the varying batch sizes of
+    the micro-batcher never resize and reallocate the tensor arena.
+    """
+
+    def __init__(self, path=MODEL_TFLITE_PATH, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.path = path
+        self.num_threads = num_threads
+        self._interpreter_class = Interpreter
+        with open(path, "rb") as f:
+            self._model_content = f.read()
+        # Padded batch size -> (interpreter, input details, output details)
+        self._interpreters = {}
+        # An interpreter must not be invoked from two threads at once
+        self._lock = threading.Lock()
+        _, self._input, _ = self._interpreter_for(1)
+
+    def _interpreter_for(self, batch_size):
+        entry = self._interpreters.get(batch_size)
+        if entry is None:
+            interpreter = self._interpreter_class(model_content=self._model_content, num_threads=self.num_threads)
+            input_details = interpreter.get_input_details()[0]
+            shape = (batch_size, *input_details["shape"][1:])
+            if tuple(input_details["shape"]) != shape:
+                interpreter.resize_tensor_input(input_details["index"], shape)
+            interpreter.allocate_tensors()
+            entry = self._interpreters[batch_size] = (
+                interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0]
+            )
+        return entry
+
+    def __call__(self, inputs, training=False):
+        inputs = np.asarray(inputs, dtype=self._input["dtype"])
+        n = len(inputs)
+        padded_size = 1 << max(0, n - 1).bit_length()
+        if padded_size != n:
+            inputs = np.concatenate([inputs, np.zeros((padded_size - n, *inputs.shape[1:]), dtype=inputs.dtype)])
+        with self._lock:
+            interpreter, input_details, output_details = self._interpreter_for(padded_size)
+            interpreter.set_tensor(input_details["index"], inputs)
+            interpreter.invoke()
+            output = interpreter.get_tensor(output_details["index"])[:n].copy()
+        scale, zero_point = output_details.get("quantization", (0.0, 0))
+        if scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+class OnnxModel:
+    """
+    Runs an exported .onnx classifier with onnxruntime on the CPU.
+    Called like the Keras model: model(int32 ids of shape (N, 30)) -> probabilities.
+    """
+
+    def __init__(self, path=MODEL_ONNX_PATH, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self._session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+
+    def __call__(self, inputs, training=False):
+        return self._session.run(None, {self._input_name: np.asarray(inputs, dtype=np.int32)})[0]
+
+
+def load_lite_model(backend=MODEL_BACKEND, num_threads=None):
+    """
+    Loads the exported classifier for `backend` ("tflite" or "onnx") wrapped in
+    a ModelPipeline, without importing TensorFlow.
+    """
+    from pocketcoach.dl_logic.model_pipeline import ModelPipeline
+    from pocketcoach.dl_logic.tokenizer import load_tokenizer
+
+    num_threads = num_threads or TF_INTRA_OP_THREADS or None
+    if backend == "tflite":
+        model = TFLiteModel(MODEL_TFLITE_PATH, num_threads=num_threads)
+    elif backend == "onnx":
+        model = OnnxModel(MODEL_ONNX_PATH, num_threads=num_threads)
+    else:
+        raise ValueError(f"Unknown MODEL_BACKEND {backend}, use keras, tflite or onnx")
+    return ModelPipeline(model=model, tokenizer=load_tokenizer())
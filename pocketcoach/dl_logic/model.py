@@ -8,24 +8,25 @@ import tensorflow as tf
 from pocketcoach.dl_logic.model_pipeline import ModelPipeline
 from pocketcoach.dl_logic.tokenizer import load_tokenizer
 
-def train_base_model(
-    X_train,
-    y_train,
-    X_val,
-    y_val,
-    vocab_size
-):
+def build_base_model(vocab_size, variable_length=False):
     """
-    Trains a base model on the training set
+    Creates and compiles the model architecture. With `variable_length` the
+    Flatten layer, which needs a fixed input length, is replaced by global max
+    pooling so the model accepts length-bucketed batches.
     """
 
     print("Creating model architecture")
     embedding_size = 50
 
     model = Sequential()
+    if variable_length:
+        model.add(Input(shape=(None,), dtype="int32"))
     model.add(layers.Embedding(input_dim=vocab_size + 1, output_dim=embedding_size, mask_zero=True))
     model.add(layers.Conv1D(16, kernel_size=3))
-    model.add(layers.Flatten())
+    if variable_length:
+        model.add(layers.GlobalMaxPooling1D())
+    else:
+        model.add(layers.Flatten())
     model.add(layers.Dense(5,))
     model.add(layers.Dense(6, activation='softmax'))
 
@@ -35,16 +36,63 @@ def train_base_model(
                 optimizer='adam',
                 metrics=['accuracy'])
 
+    return model
+
+def train_base_model(
+    X_train,
+    y_train,
+    X_val,
+    y_val,
+    vocab_size,
+    epochs=50,
+    callbacks=None,
+    variable_length=False
+):
+    """
+    Trains a base model on the training set, the variable-length architecture
+    of `train_base_model_on_dataset` with `variable_length`
+    """
+
+    model = build_base_model(vocab_size, variable_length=variable_length)
+
     print("Fitting model")
-    es = tf.keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True)
+    if callbacks is None:
+        callbacks = [tf.keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True)]
     model.fit(
         X_train,
         y_train,
         validation_data=(X_val, y_val),
-        epochs=50,
+        epochs=epochs,
         batch_size=32,
         verbose=1,
-        callbacks=[es]
+        callbacks=callbacks
+    )
+
+    return model
+
+def train_base_model_on_dataset(
+    train_ds,
+    val_ds,
+    vocab_size,
+    epochs=50,
+    callbacks=None
+):
+    """
+    Trains a variable-length base model on tf.data datasets from
+    `input_pipeline.make_dataset`
+    """
+
+    model = build_base_model(vocab_size, variable_length=True)
+
+    print("Fitting model")
+    if callbacks is None:
+        callbacks = [tf.keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True)]
+    model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=epochs,
+        verbose=1,
+        callbacks=callbacks
     )
 
     return model
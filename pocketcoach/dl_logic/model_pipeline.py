@@ -1,28 +1,19 @@
-from transformers import Pipeline
-import tensorflow as tf
-from pocketcoach.dl_logic.data import pad, clean, emotion_of
+import numpy as np
+from pocketcoach.dl_logic.data import pad, clean, clean_batch, emotion_of
 
-class ModelPipeline(Pipeline):
+class ModelPipeline:
+    """
+    Text classification pipeline around the Keras model or a TFLite/ONNX
+    runner: pipeline(text) -> list of {"score", "label"} dicts. A plain class,
+    so serving an exported model imports neither TensorFlow nor transformers.
+    """
 
     def __init__(self, model, tokenizer):
-        # Do NOT call super().__init__()
         self.model = model
         self.tokenizer = tokenizer
 
-        # Required internal attributes to mimic Hugging Face pipeline behavior
-        self._batch_size = 1
-        self._num_workers = 0
-        self.device = -1
-        self.framework = "tf"
-        self.model_input_names = []
-        self._preprocess_params = {}
-        self._forward_params = {}
-        self._postprocess_params = {}
-        self.call_count = 0
-
-    def _sanitize_parameters(self, **kwargs):
-        # No extra params used here
-        return {}, {}, {}
+    def __call__(self, inputs):
+        return self.postprocess(self._forward(self.preprocess(inputs)))
 
     def preprocess(self, inputs):
         # Expect `inputs` as a string or dict
@@ -31,16 +22,37 @@ class ModelPipeline(Pipeline):
         cleaned_text = clean(inputs)
         padded_input = pad([cleaned_text], self.tokenizer)
 
-        return {"input": tf.convert_to_tensor(padded_input, dtype=tf.int32)}
+        return {"input": np.asarray(padded_input, dtype=np.int32)}
 
     def _forward(self, model_inputs):
+        # `model` is the Keras model or a TFLite/ONNX runner with the same call
         input_tensor = model_inputs["input"]
         output = self.model(input_tensor, training=False)
-        return {"output": output}
+        return {"output": np.asarray(output)}
 
     def postprocess(self, model_outputs):
         # Process the raw model output into something user-friendly
         # Example: softmax and return labels and scores
-        output_tensor = model_outputs["output"]
-        probs = tf.nn.softmax(output_tensor).numpy().tolist()
-        return [{"score": s, "label": emotion_of(idx)} for idx, s in enumerate(probs[0])]
+        return self._to_labels(model_outputs["output"])[0]
+
+    def predict_batch(self, texts):
+        """
+        Classifies a list of texts with a single forward pass and returns one
+        list of {"score", "label"} dicts per text, in input order.
+        """
+        if not texts:
+            return []
+        cleaned_texts = clean_batch(texts)
+        padded_input = pad(cleaned_texts, self.tokenizer)
+        model_outputs = self._forward({"input": np.asarray(padded_input, dtype=np.int32)})
+        return self._to_labels(model_outputs["output"])
+
+    def _to_labels(self, output_tensor):
+        # Softmax in NumPy, so non-Keras backends don't need TensorFlow
+        logits = np.asarray(output_tensor, dtype=np.float32)
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        probs = (exp / exp.sum(axis=-1, keepdims=True)).tolist()
+        return [
+            [{"score": s, "label": emotion_of(idx)} for idx, s in enumerate(row)]
+            for row in probs
+        ]
@@ -0,0 +1,107 @@
+import sys
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def _sizeof(obj) -> int:
+    """
+    Approximate memory of a classification result (lists of flat dicts).
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_sizeof(item) for item in obj)
+    return size
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of classification results with a time to live.
+
+    Keys are digests of the model version and the cleaned text, so entries are
+    small whatever the text length, texts that clean to the same string share
+    an entry, and results of another model can never be returned. Setting a new
+    version also drops every entry.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_s: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+
+    def set_version(self, version: str):
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._entries.clear()
+                self._bytes = 0
+
+    def key(self, cleaned_text: str) -> bytes:
+        return hashlib.blake2b(f"{self.version}\0{cleaned_text}".encode("utf-8"), digest_size=16).digest()
+
+    def get(self, key: bytes):
+        """
+        Returns a copy of the cached result, or None.
+        """
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, result, size = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return [dict(c) for c in result]
+
+    def put(self, key: bytes, result):
+        if self.max_entries <= 0:
+            return
+        size = sys.getsizeof(key) + _sizeof(result)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (time.monotonic() + self.ttl_s, [dict(c) for c in result], size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expired": self._expired,
+            }
@@ -0,0 +1,193 @@
+import os
+import hashlib
+import threading
+from pocketcoach.params import *
+from pocketcoach.dl_logic.batcher import MicroBatcher
+from pocketcoach.dl_logic.result_cache import ResultCache
+
+# One classifier (and one batching queue in front of it) per process, shared
+# by /classify, /chat and the CLI.
+_lock = threading.Lock()
+_classifier = None
+_batcher = None
+_threads_configured = False
+# Results of repeated texts ("ok", "thanks"), keyed by the loaded model's version
+_result_cache = ResultCache(CLASSIFY_CACHE_SIZE, CLASSIFY_CACHE_TTL_S)
+
+
+def configure_threads(intra_op_threads=TF_INTRA_OP_THREADS, inter_op_threads=TF_INTER_OP_THREADS):
+    """
+    Applies TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS. Has to run before the
+    TF runtime executes its first op, later calls are ignored by TF.
+    """
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+    import tensorflow as tf
+    try:
+        if intra_op_threads > 0:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads > 0:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        print(f"Could not configure TF threads, runtime already initialized: {e}")
+
+
+def warm_up(classifier):
+    """
+    Runs dummy batches through the classifier so the first real request does
+    not pay for kernel initialization: every power of two up to the largest
+    micro-batch, the sizes the TFLite backend pads batches to.
+    """
+    size = 1
+    while size < SENTIMENT_MAX_BATCH_SIZE:
+        classifier.predict_batch(["warm up"] * size)
+        size *= 2
+    classifier.predict_batch(["warm up"] * SENTIMENT_MAX_BATCH_SIZE)
+
+
+def load_classifier(backend=MODEL_BACKEND, num_threads=None):
+    """
+    Loads a new ModelPipeline for `backend`, using `num_threads` CPU threads
+    (TF_INTRA_OP_THREADS when not given).
+    """
+    num_threads = num_threads or TF_INTRA_OP_THREADS
+    if backend == "keras":
+        from pocketcoach.dl_logic.model import load_model
+        configure_threads(num_threads, TF_INTER_OP_THREADS)
+        return load_model()
+    # TFLite/ONNX runtimes get their thread count passed directly
+    from pocketcoach.dl_logic.lite_backend import load_lite_model
+    return load_lite_model(backend, num_threads=num_threads or None)
+
+
+def model_version(backend=MODEL_BACKEND) -> str:
+    """
+    Fingerprint of the model and tokenizer files a classifier for `backend`
+    is loaded from, changes when either is replaced.
+    """
+    from pocketcoach.dl_logic.tokenizer import TOKENIZER_NAME, TOKENIZER_VOCAB_NAME
+    model_path = {"keras": BASE_MODEL_NAME, "tflite": MODEL_TFLITE_PATH, "onnx": MODEL_ONNX_PATH}.get(backend)
+    tokenizer_path = TOKENIZER_VOCAB_NAME if os.path.isfile(TOKENIZER_VOCAB_NAME) else TOKENIZER_NAME
+    digest = hashlib.sha1(backend.encode())
+    for path in (model_path, tokenizer_path):
+        if not path or not os.path.exists(path):
+            continue
+        # A SavedModel is a directory
+        files = [path] if os.path.isfile(path) else sorted(
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+        )
+        for file in files:
+            stat = os.stat(file)
+            digest.update(f"{file}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return f"{backend}-{digest.hexdigest()[:12]}"
+
+
+def _set_classifier(classifier, backend=MODEL_BACKEND):
+    global _classifier
+    classifier.version = model_version(backend)
+    # A new model or tokenizer drops the results of the previous one
+    _result_cache.set_version(classifier.version)
+    _classifier = classifier
+
+
+def get_classifier():
+    """
+    Returns the process-wide ModelPipeline, loading and warming it on first use.
+    """
+    if _classifier is None:
+        with _lock:
+            if _classifier is None:
+                classifier = load_classifier()
+                print("Warming up classifier")
+                warm_up(classifier)
+                _set_classifier(classifier)
+    return _classifier
+
+
+def preload_classifier(num_threads=1):
+    """
+    Loads the process-wide classifier with `num_threads` runtime threads, for
+    a master process that forks workers sharing it. With one thread the
+    TFLite/ONNX runtimes start no thread pools, which would not survive the fork.
+    """
+    with _lock:
+        if _classifier is None:
+            classifier = load_classifier(num_threads=num_threads)
+            warm_up(classifier)
+            _set_classifier(classifier)
+    return _classifier
+
+
+def batcher_loaded() -> bool:
+    return _batcher is not None
+
+
+def get_batcher_stats() -> dict:
+    """
+    Queue-depth and batch-size statistics of the batcher, empty until it is loaded.
+    """
+    return _batcher.stats() if _batcher is not None else {}
+
+
+def get_result_cache_stats() -> dict:
+    return _result_cache.stats()
+
+
+def _cache_key(text) -> bytes:
+    from pocketcoach.dl_logic.data import clean
+    return _result_cache.key(clean(text))
+
+
+def classify_cached(text):
+    """
+    Classifies `text` through the batcher unless the result of the same
+    cleaned text is cached.
+    """
+    batcher = get_batcher()
+    key = _cache_key(text)
+    result = _result_cache.get(key)
+    if result is None:
+        result = batcher.classify(text)
+        _result_cache.put(key, result)
+    return result
+
+
+async def aclassify_cached(text):
+    """
+    Same as classify_cached, awaiting the batcher instead of blocking a thread.
+    The classifier has to be loaded already.
+    """
+    # Before the key: loading the classifier sets the cache's model version
+    batcher = get_batcher()
+    key = _cache_key(text)
+    result = _result_cache.get(key)
+    if result is None:
+        result = await batcher.aclassify(text)
+        _result_cache.put(key, result)
+    return result
+
+
+def classify(text):
+    print(f"Predicting text {text}")
+    prediction = classify_cached(text)
+    print(f"Result of the prediction is {prediction}")
+    return prediction
+
+
+def get_batcher() -> MicroBatcher:
+    """
+    Returns the process-wide MicroBatcher in front of `get_classifier()`.
+    """
+    global _batcher
+    if _batcher is None:
+        classifier = get_classifier()
+        with _lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    classifier.predict_batch,
+                    max_batch_size=SENTIMENT_MAX_BATCH_SIZE,
+                    max_wait_ms=SENTIMENT_MAX_WAIT_MS,
+                )
+    return _batcher
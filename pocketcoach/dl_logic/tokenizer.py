@@ -1,6 +1,15 @@
+import os
+import json
+import mmap
 import pickle
+import struct
+import numpy as np
 
 TOKENIZER_NAME = 'tokenizer.pkl'
+TOKENIZER_VOCAB_NAME = 'tokenizer.vocab'
+MAXLEN = 30
+
+_MAGIC = b"PCVOCAB1"
 
 def save(tokenizer):
     print(f"Saving tokenizer as {TOKENIZER_NAME}")
@@ -8,6 +17,186 @@ def save(tokenizer):
         pickle.dump(tokenizer, f)
 
 def load_tokenizer():
+    """
+    Loads the compact tokenizer if it has been converted, else the pickled
+    Keras tokenizer.
+    """
+    if os.path.isfile(TOKENIZER_VOCAB_NAME):
+        print(f"Loading tokenizer with name {TOKENIZER_VOCAB_NAME}")
+        return CompactTokenizer(TOKENIZER_VOCAB_NAME)
     print(f"Loading tokenizer with name {TOKENIZER_NAME}")
     with open(TOKENIZER_NAME, 'rb') as f:
         return pickle.load(f)
+
+
+class CompactTokenizer:
+    """
+    Read-only replacement for a fitted Keras Tokenizer at inference time.
+
+    The vocabulary lives in a memory-mapped file: a JSON header with the text
+    splitting settings, then the byte offsets and ids of all words sorted by
+    their UTF-8 bytes, then the words themselves. Words are looked up by binary
+    search, so loading is instant and the pages are shared between processes.
+
+    File layout (little endian):
+        magic "PCVOCAB1" | uint32 header length | header JSON (padded to 8 bytes)
+        | uint64 offsets[count + 1] | int32 ids[count] | UTF-8 word blob
+    """
+
+    def __init__(self, path=TOKENIZER_VOCAB_NAME):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != _MAGIC:
+            raise ValueError(f"{path} is not a compact tokenizer file")
+        (header_len,) = struct.unpack_from("<I", self._mm, 8)
+        header = json.loads(self._mm[12:12 + header_len].decode("utf-8"))
+        self.count = header["count"]
+        self.filters = header["filters"]
+        self.lower = header["lower"]
+        self.split = header["split"]
+        self.oov_id = header["oov_id"]
+        self.maxlen = header.get("maxlen", MAXLEN)
+        self._filter_table = str.maketrans({c: self.split for c in self.filters})
+
+        start = _align(12 + header_len)
+        self._offsets = np.frombuffer(self._mm, dtype="<u8", count=self.count + 1, offset=start)
+        start += 8 * (self.count + 1)
+        self._ids = np.frombuffer(self._mm, dtype="<i4", count=self.count, offset=start)
+        self._blob_start = start + 4 * self.count
+
+    def _word(self, i):
+        return self._mm[self._blob_start + int(self._offsets[i]):self._blob_start + int(self._offsets[i + 1])]
+
+    def lookup(self, word):
+        """
+        Returns the id of `word`, the OOV id or 0 if it is not in the vocabulary.
+        """
+        key = word.encode("utf-8")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._word(lo) == key:
+            return int(self._ids[lo])
+        return self.oov_id
+
+    def text_to_words(self, text):
+        # Same splitting as keras text_to_word_sequence
+        if self.lower:
+            text = text.lower()
+        text = text.translate(self._filter_table)
+        return [word for word in text.split(self.split) if word]
+
+    def texts_to_sequences(self, texts):
+        ids = {}
+        sequences = []
+        for text in texts:
+            sequence = []
+            for word in self.text_to_words(text):
+                i = ids.get(word)
+                if i is None:
+                    i = ids[word] = self.lookup(word)
+                if i:
+                    sequence.append(i)
+            sequences.append(sequence)
+        return sequences
+
+    def encode_batch(self, texts, maxlen=None, out=None):
+        """
+        Encodes texts straight into an int32 (N, maxlen) array, padded at the
+        end and truncated at the front like pad_sequences(padding='post').
+        """
+        maxlen = maxlen or self.maxlen
+        if out is None:
+            out = np.zeros((len(texts), maxlen), dtype=np.int32)
+        else:
+            out[:] = 0
+        for row, sequence in enumerate(self.texts_to_sequences(texts)):
+            sequence = sequence[-maxlen:]
+            out[row, :len(sequence)] = sequence
+        return out
+
+
+def _align(n, to=8):
+    return (n + to - 1) // to * to
+
+def save_compact(tokenizer, path=TOKENIZER_VOCAB_NAME, maxlen=MAXLEN):
+    """
+    Writes the vocabulary of a fitted Keras Tokenizer in the compact format.
+    """
+    if tokenizer.char_level:
+        raise ValueError("Character level tokenizers are not supported")
+    oov_id = tokenizer.word_index.get(tokenizer.oov_token, 0) if tokenizer.oov_token else 0
+    vocab = {}
+    for word, i in tokenizer.word_index.items():
+        if tokenizer.num_words and i >= tokenizer.num_words:
+            # texts_to_sequences maps these to the OOV id, or drops them
+            if oov_id:
+                vocab[word] = oov_id
+        else:
+            vocab[word] = i
+
+    entries = sorted((word.encode("utf-8"), i) for word, i in vocab.items())
+    header = json.dumps({
+        "count": len(entries),
+        "filters": tokenizer.filters,
+        "lower": tokenizer.lower,
+        "split": tokenizer.split,
+        "oov_id": oov_id,
+        "maxlen": maxlen,
+    }).encode("utf-8")
+    offsets = np.zeros(len(entries) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(word) for word, _ in entries])
+    ids = np.array([i for _, i in entries], dtype="<i4")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(b"\0" * (_align(12 + len(header)) - 12 - len(header)))
+        f.write(offsets.tobytes())
+        f.write(ids.tobytes())
+        for word, _ in entries:
+            f.write(word)
+    os.replace(tmp_path, path)
+    print(f"Saved compact tokenizer with {len(entries)} words as {path}")
+
+def convert_tokenizer(pkl_path=TOKENIZER_NAME, out_path=TOKENIZER_VOCAB_NAME, texts=None):
+    """
+    Converts the pickled Keras tokenizer to the compact format and verifies
+    that every vocabulary word and every text in `texts` (by default sentences
+    made of the vocabulary itself, padded and truncated) encodes to identical ids.
+    The output is removed again if anything differs.
+    """
+    from keras.preprocessing.sequence import pad_sequences
+
+    with open(pkl_path, 'rb') as f:
+        tokenizer = pickle.load(f)
+    save_compact(tokenizer, out_path)
+    compact = CompactTokenizer(out_path)
+
+    try:
+        words = list(tokenizer.word_index)
+        expected = dict(zip(words, (seq[0] if seq else 0 for seq in tokenizer.texts_to_sequences(words))))
+        for word in words:
+            # Words split by the filters map to several ids, compare those as texts
+            if len(compact.text_to_words(word)) == 1 and compact.lookup(word) != expected[word]:
+                raise ValueError(f"Id mismatch for {word!r}")
+
+        if texts is None:
+            texts = [" ".join(words[i:i + 37]) for i in range(0, len(words), 37)]
+            texts += ["", "   ", "Hello, WORLD!! 42 times", "unknownwordxyz i feel"]
+        expected = pad_sequences(tokenizer.texts_to_sequences(texts), padding='post', maxlen=compact.maxlen)
+        if not np.array_equal(compact.encode_batch(texts), expected):
+            raise ValueError("Encoded texts differ from the Keras tokenizer")
+    except Exception:
+        os.remove(out_path)
+        raise
+
+    print(f"✅ {out_path} encodes {len(words)} words and {len(texts)} texts identically to {pkl_path}")
+    return compact
@@ -0,0 +1,102 @@
+import re
+import time
+import random
+import asyncio
+from itertools import cycle
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+DEFAULT_RESPONSES = [
+    "That sounds like a lot to carry. What part of it weighs on you the most right now?",
+    "Thank you for sharing that with me. How did it make you feel in the moment?",
+    "It is completely understandable to feel that way. What would help you right now?",
+]
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Deterministic offline stand-in for Gemini.
+
+    Cycles through `responses` and simulates a remote model: the first token
+    arrives after `latency_s` seconds and the rest at `tokens_per_s`. Supports
+    invoke/ainvoke and stream/astream like the real chat model.
+
+    For tail latency and error handling benchmarks, a `slow_rate` share of the
+    calls waits `slow_latency_s` for the first token instead, and a
+    `failure_rate` share raises after the first-token latency.
+    """
+
+    responses: List[str] = DEFAULT_RESPONSES
+    latency_s: float = 0.3
+    tokens_per_s: float = 50.0
+    failure_rate: float = 0.0
+    slow_rate: float = 0.0
+    slow_latency_s: float = 5.0
+    seed: int = 0
+    _responses: Any = None
+    _random: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat"
+
+    def _next_tokens(self) -> List[str]:
+        if self._responses is None:
+            self._responses = cycle(self.responses)
+        return re.findall(r"\S+\s*", next(self._responses))
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+
+    def _draw_call(self):
+        """
+        Returns (first-token latency, whether the call fails) of one call.
+        """
+        if self._random is None:
+            self._random = random.Random(self.seed)
+        latency = self.slow_latency_s if self._random.random() < self.slow_rate else self.latency_s
+        return latency, self._random.random() < self.failure_rate
+
+    @staticmethod
+    def _fail():
+        raise RuntimeError("Simulated chat model failure")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        latency, fails = self._draw_call()
+        tokens = self._next_tokens()
+        time.sleep(latency)
+        if fails:
+            self._fail()
+        time.sleep(self._token_delay() * max(len(tokens) - 1, 0))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        latency, fails = self._draw_call()
+        tokens = self._next_tokens()
+        await asyncio.sleep(latency)
+        if fails:
+            self._fail()
+        await asyncio.sleep(self._token_delay() * max(len(tokens) - 1, 0))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        latency, fails = self._draw_call()
+        time.sleep(latency)
+        if fails:
+            self._fail()
+        for i, token in enumerate(self._next_tokens()):
+            if i:
+                time.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        latency, fails = self._draw_call()
+        await asyncio.sleep(latency)
+        if fails:
+            self._fail()
+        for i, token in enumerate(self._next_tokens()):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
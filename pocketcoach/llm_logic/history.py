@@ -0,0 +1,95 @@
+from typing import List, Dict, Optional
+from langchain.prompts.chat import ChatPromptTemplate
+from pocketcoach.params import *
+
+# Rough token estimate, good enough to keep prompts within budget without
+# calling a tokenizer (or the Vertex AI count_tokens API) on every turn
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "You maintain a running summary of a conversation between a user and a supportive coach. "
+     "Update the summary with the new messages. Keep names, feelings, events and open questions, "
+     "drop small talk. Write at most {max_words} words in plain prose."),
+    ("human", "Current summary:\n{summary}\n\nNew messages:\n{messages}"),
+])
+
+
+def count_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _truncate_to_tokens(text: str, max_tokens: int, keep_end: bool) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if keep_end:
+        cut = text[-max_chars:]
+        if text[-max_chars - 1] == " ":
+            return cut
+        space = cut.find(" ")
+        return cut[space + 1:] if 0 <= space < len(cut) - 1 else cut
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    return cut[:space] if space > 0 else cut
+
+
+def compact_history(
+    memory,
+    summary: Optional[str] = None,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+    unsummarized: Optional[int] = None,
+) -> str:
+    """
+    Renders the history for the prompt within `token_budget` tokens: the running
+    summary of the older conversation (at most half the budget) followed by the
+    newest whole messages from `memory` that still fit. Only the newest message
+    is ever cut, at a word boundary.
+
+    `unsummarized` is the number of newest messages the summary does not cover
+    yet, only those are rendered verbatim (all of `memory` when None).
+    """
+    parts = []
+    remaining = token_budget
+    if summary:
+        summary_line = _truncate_to_tokens(
+            f"Summary of the earlier conversation: {summary}", token_budget // 2, keep_end=False
+        )
+        parts.append(summary_line)
+        remaining -= count_tokens(summary_line) + 1
+
+    lines = []
+    messages = memory.chat_memory.messages
+    if unsummarized is not None:
+        messages = messages[max(len(messages) - max(unsummarized, 0), 0):]
+    for message in reversed(messages):
+        prefix = memory.human_prefix if message.type == "human" else memory.ai_prefix
+        line = f"{prefix}: {message.content}"
+        tokens = count_tokens(line) + 1
+        if tokens > remaining:
+            if not lines and remaining > 0:
+                lines.append(_truncate_to_tokens(line, remaining, keep_end=True))
+            break
+        lines.append(line)
+        remaining -= tokens
+
+    parts.extend(reversed(lines))
+    return "\n".join(parts)
+
+
+def render_messages(messages: List[Dict]) -> str:
+    return "\n".join(
+        f"{'Human' if m.get('role') == 'user' else 'AI'}: {m.get('content', '')}"
+        for m in messages
+    )
+
+
+def summary_prompt_vars(previous_summary: Optional[str], messages: List[Dict]) -> dict:
+    """
+    Variables of SUMMARY_PROMPT folding `messages` into `previous_summary`.
+    """
+    return {
+        "summary": previous_summary or "(empty)",
+        "messages": render_messages(messages),
+        "max_words": max(20, HISTORY_TOKEN_BUDGET * 3 // 8),
+    }
@@ -1,19 +1,39 @@
 import random
 import os
-from transformers import pipeline
-from langchain.chat_models import init_chat_model
+import asyncio
+import threading
+from typing import TYPE_CHECKING
 from langchain.prompts.chat import (
     ChatPromptTemplate,
     SystemMessagePromptTemplate,
     HumanMessagePromptTemplate,
 )
-from langchain.memory import ConversationBufferMemory
-from pocketcoach.dl_logic.model import load_model
-from langchain_google_vertexai import ChatVertexAI
+from pocketcoach.dl_logic.service import get_batcher, get_batcher_stats, batcher_loaded, classify_cached, aclassify_cached
+from pocketcoach.llm_logic.history import compact_history, summary_prompt_vars, SUMMARY_PROMPT
+from pocketcoach.metrics import timed
+from pocketcoach.params import (
+    CHAT_MODEL, FAKE_LLM_LATENCY_S, FAKE_LLM_TOKENS_PER_S, FAKE_LLM_FAILURE_RATE, FAKE_LLM_SLOW_RATE,
+    FAKE_LLM_SLOW_LATENCY_S, LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT_S, LLM_TIMEOUT_S, LLM_HEDGE_AFTER_S,
+)
+
+if TYPE_CHECKING:
+    from langchain.memory import ConversationBufferMemory
 
-# Global models to prevent reloding for new sessions
-sentiment_analyzer = None
+# Global model to prevent reloading for new sessions, created on first use
 chat_model = None
+_chat_model_lock = threading.Lock()
+
+
+class LLMBusyError(RuntimeError):
+    """
+    Raised when no LLM call slot frees up within LLM_QUEUE_TIMEOUT_S.
+    """
+
+
+class LLMTimeoutError(TimeoutError):
+    """
+    Raised when the LLM does not answer within LLM_TIMEOUT_S.
+    """
 
 # Prompt template
 SYSTEM_TEMPLATE = (
@@ -28,22 +48,50 @@ PROMPT_TEMPLATE = ChatPromptTemplate.from_messages([
 ])
 
 
-def init_models():
+def make_chat_model(kind: str = CHAT_MODEL):
     """
-    Should be called once at startup to load heavy models/pipelines.
+    Returns the chat model selected by CHAT_MODEL: "vertex" (Gemini) or "fake"
+    (a local streaming stand-in for offline tests and benchmarks).
     """
-    global sentiment_analyzer, chat_model
+    if kind == "fake":
+        from pocketcoach.llm_logic.fake_llm import FakeStreamingChatModel
+        return FakeStreamingChatModel(
+            latency_s=FAKE_LLM_LATENCY_S,
+            tokens_per_s=FAKE_LLM_TOKENS_PER_S,
+            failure_rate=FAKE_LLM_FAILURE_RATE,
+            slow_rate=FAKE_LLM_SLOW_RATE,
+            slow_latency_s=FAKE_LLM_SLOW_LATENCY_S,
+        )
+    if kind == "vertex":
+        # Imported here, Vertex AI pulls in the whole google-cloud-aiplatform SDK
+        from langchain_google_vertexai import ChatVertexAI
+        return ChatVertexAI(model_name="gemini-2.0-flash")
+    raise ValueError(f"Unknown CHAT_MODEL {kind}, use 'vertex' or 'fake'")
 
-    sentiment_analyzer = load_model()
+def get_chat_model():
+    """
+    Returns the process-wide chat model, creating it on first use.
+    """
+    global chat_model
+    if chat_model is None:
+        with _chat_model_lock:
+            if chat_model is None:
+                chat_model = make_chat_model()
+    return chat_model
 
-    chat_model = ChatVertexAI(model_name="gemini-2.0-flash")
+def init_models():
+    """
+    Loads the classifier and the chat model up front instead of on first use.
+    """
+    get_batcher()
+    get_chat_model()
 
 def analyze_sentiment(text: str):
     """
     Returns (label: str, score: float). On error, returns ("UNKNOWN", 0.0).
     """
     try:
-        classifications = sentiment_analyzer(text)
+        classifications = classify_cached(text)
         print(f'Result of the classification is: {classifications}')
         if isinstance(classifications, list) and classifications:
             top_class = max(classifications, key=lambda x: x['score'])
@@ -52,6 +100,28 @@ def analyze_sentiment(text: str):
         print(f"[Sentiment] error: {e}")
     return "UNKNOWN", 0.0
 
+async def analyze_sentiment_async(text: str):
+    """
+    Same as analyze_sentiment, awaiting the batcher instead of blocking a thread.
+    """
+    try:
+        if not batcher_loaded():
+            # Request arrived before the warm-up finished, load off the event loop
+            await asyncio.to_thread(get_batcher)
+        classifications = await aclassify_cached(text)
+        if isinstance(classifications, list) and classifications:
+            top_class = max(classifications, key=lambda x: x['score'])
+            return top_class.get("label", ""), top_class.get("score", 0.0)
+    except Exception as e:
+        print(f"[Sentiment] error: {e}")
+    return "UNKNOWN", 0.0
+
+def get_sentiment_stats() -> dict:
+    """
+    Queue-depth and batch-size statistics of the sentiment batcher.
+    """
+    return get_batcher_stats()
+
 _QUESTIONS_CACHE = None
 
 def load_questions():
@@ -66,39 +136,222 @@ def pick_random_question() -> str:
     questions = load_questions()
     return random.choice(questions)
 
-def build_and_run_chain(
+def build_prompt_vars(
     user_text: str,
-    memory: ConversationBufferMemory,
-    system_prompt: str = "You are a helpful therapist assistant. Be empathetic and concise."
-):
-
-    # Sentiment analysis
-    sentiment_label, sentiment_score = analyze_sentiment(user_text)
+    memory: "ConversationBufferMemory",
+    system_prompt: str,
+    sentiment_label: str,
+    summary: str = None,
+    unsummarized: int = None,
+) -> dict:
+    # Running summary plus the newest turns it does not cover, within the history token budget
+    history_str = compact_history(memory, summary, unsummarized=unsummarized)
 
-    # Load history and truncate
-    mem_vars = memory.load_memory_variables({})
-    history_str = mem_vars.get("history", "")
-    # Truncate to last 2000 characters
-    if len(history_str) > 2000:
-        history_str = history_str[-2000:]
-
-    # Prompt variables
-    prompt_vars = {
+    return {
         "system_prompt": system_prompt,
         "sentiment_label": sentiment_label,
         "history": history_str,
         "user_text": user_text,
     }
 
+def build_and_run_chain(
+    user_text: str,
+    memory: "ConversationBufferMemory",
+    system_prompt: str = "You are a helpful therapist assistant. Be empathetic and concise.",
+    summary: str = None,
+    unsummarized: int = None,
+):
+
+    # Sentiment analysis
+    with timed("sentiment"):
+        sentiment_label, sentiment_score = analyze_sentiment(user_text)
+
+    # Prompt variables
+    prompt_vars = build_prompt_vars(user_text, memory, system_prompt, sentiment_label, summary, unsummarized)
+
     # Build sequence and invoke
-    sequence = PROMPT_TEMPLATE | chat_model
-    resp = sequence.invoke(prompt_vars)
+    sequence = PROMPT_TEMPLATE | get_chat_model()
+    with timed("llm"):
+        resp = sequence.invoke(prompt_vars)
     response = resp.content.strip()
 
-    # Saaaaave
-    memory.save_context({"user_text": user_text}, {"response": response})
+    # The memory is not updated here: it is the cached memory of the session and
+    # picks up the new turn when both messages are appended to the history.
 
     return {
         "sentiment": {"label": sentiment_label, "score": sentiment_score},
         "llm_response": response,
     }
+
+# LLM calls in flight (waiting for a slot or running), for /stats and /metrics
+_llm_stats = {
+    "calls": 0, "in_flight": 0, "busy": 0, "timeouts": 0, "errors": 0,
+    "hedges": 0, "hedge_wins": 0, "hedges_skipped": 0,
+}
+_llm_slots = None
+
+def _get_llm_slots() -> asyncio.Semaphore:
+    # Created on first use, inside the event loop of the serving process
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_slots
+
+def get_llm_stats() -> dict:
+    return dict(_llm_stats, max_concurrency=LLM_MAX_CONCURRENCY)
+
+async def _acquire_llm_slot():
+    try:
+        await asyncio.wait_for(_get_llm_slots().acquire(), LLM_QUEUE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        _llm_stats["busy"] += 1
+        raise LLMBusyError(f"All {LLM_MAX_CONCURRENCY} LLM slots busy for {LLM_QUEUE_TIMEOUT_S}s")
+
+async def _hedged(call, timeout_s: float = LLM_TIMEOUT_S, hedge_after_s: float = LLM_HEDGE_AFTER_S):
+    """
+    Awaits `call()` and returns its result. With `hedge_after_s` > 0 a second
+    identical call is started if the first has not answered after that many
+    seconds, or as soon as it fails, and the first successful answer wins.
+    Gives up after `timeout_s` seconds overall.
+
+    The caller holds an LLM slot for the first call. The hedge takes a slot of
+    its own and is skipped when none is free, so hedging never goes past
+    LLM_MAX_CONCURRENCY calls.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    attempts = {asyncio.ensure_future(call())}
+    hedge = None
+    error = None
+    try:
+        while attempts:
+            wait_s = start + timeout_s - loop.time()
+            if wait_s <= 0:
+                break
+            if hedge is None and hedge_after_s > 0:
+                wait_s = min(wait_s, max(0.0, start + hedge_after_s - loop.time()))
+            done, _ = await asyncio.wait(attempts, timeout=wait_s, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                attempts.discard(attempt)
+                if attempt.exception() is None:
+                    if attempt is hedge:
+                        _llm_stats["hedge_wins"] += 1
+                    return attempt.result()
+                error = attempt.exception()
+            if hedge is None and hedge_after_s > 0 and (error is not None or loop.time() - start >= hedge_after_s):
+                slots = _get_llm_slots()
+                if slots.locked():
+                    _llm_stats["hedges_skipped"] += 1
+                    hedge_after_s = 0
+                    continue
+                await slots.acquire()
+                hedge = asyncio.ensure_future(call())
+                # Released however the hedge ends, even if cancelled before it started
+                hedge.add_done_callback(lambda _: slots.release())
+                attempts.add(hedge)
+                _llm_stats["hedges"] += 1
+        if error is not None and not attempts:
+            raise error
+        _llm_stats["timeouts"] += 1
+        raise LLMTimeoutError(f"No LLM answer within {timeout_s}s")
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+
+async def ainvoke_llm(prompt_vars: dict, template: ChatPromptTemplate = PROMPT_TEMPLATE) -> str:
+    """
+    Runs the prompt through the shared chat model on the event loop, within
+    the LLM_MAX_CONCURRENCY slots, with a timeout and an optional hedge.
+    """
+    if chat_model is None:
+        await asyncio.to_thread(get_chat_model)
+    sequence = template | chat_model
+    _llm_stats["in_flight"] += 1
+    try:
+        await _acquire_llm_slot()
+        try:
+            _llm_stats["calls"] += 1
+            with timed("llm"):
+                resp = await _hedged(lambda: sequence.ainvoke(prompt_vars))
+        finally:
+            _get_llm_slots().release()
+    except (LLMBusyError, LLMTimeoutError):
+        raise
+    except Exception:
+        _llm_stats["errors"] += 1
+        raise
+    finally:
+        _llm_stats["in_flight"] -= 1
+    return resp.content.strip()
+
+async def arun_chain(
+    user_text: str,
+    memory: "ConversationBufferMemory",
+    system_prompt: str = "You are a helpful therapist assistant. Be empathetic and concise.",
+    summary: str = None,
+    unsummarized: int = None,
+):
+    """
+    Async variant of build_and_run_chain that holds no thread while the LLM answers.
+    """
+    with timed("sentiment"):
+        sentiment_label, sentiment_score = await analyze_sentiment_async(user_text)
+    prompt_vars = build_prompt_vars(user_text, memory, system_prompt, sentiment_label, summary, unsummarized)
+    response = await ainvoke_llm(prompt_vars)
+    return {
+        "sentiment": {"label": sentiment_label, "score": sentiment_score},
+        "llm_response": response,
+    }
+
+async def astream_chain(
+    user_text: str,
+    memory: "ConversationBufferMemory",
+    system_prompt: str = "You are a helpful therapist assistant. Be empathetic and concise.",
+    summary: str = None,
+    unsummarized: int = None,
+):
+    """
+    Streaming variant of build_and_run_chain. Returns (sentiment, chunks) where
+    chunks is an async iterator over the LLM output text as tokens arrive.
+    """
+    with timed("sentiment"):
+        sentiment_label, sentiment_score = await analyze_sentiment_async(user_text)
+    prompt_vars = build_prompt_vars(user_text, memory, system_prompt, sentiment_label, summary, unsummarized)
+    if chat_model is None:
+        await asyncio.to_thread(get_chat_model)
+    sequence = PROMPT_TEMPLATE | chat_model
+
+    async def chunks():
+        # The slot is held while the answer streams, a stall of more than
+        # LLM_TIMEOUT_S between chunks ends it
+        _llm_stats["in_flight"] += 1
+        try:
+            await _acquire_llm_slot()
+            stream = sequence.astream(prompt_vars)
+            try:
+                _llm_stats["calls"] += 1
+                with timed("llm"):
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), LLM_TIMEOUT_S)
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            _llm_stats["timeouts"] += 1
+                            raise LLMTimeoutError(f"No LLM output for {LLM_TIMEOUT_S}s")
+                        if chunk.content:
+                            yield chunk.content
+            finally:
+                await stream.aclose()
+                _get_llm_slots().release()
+        finally:
+            _llm_stats["in_flight"] -= 1
+
+    return {"label": sentiment_label, "score": sentiment_score}, chunks()
+
+async def asummarize_history(previous_summary: str, messages: list) -> str:
+    """
+    Folds `messages` into the running summary of a session using the chat
+    model, within the same LLM slots and timeout as the chat turns.
+    """
+    return await ainvoke_llm(summary_prompt_vars(previous_summary, messages), SUMMARY_PROMPT)
@@ -1,19 +1,18 @@
 from pocketcoach.dl_logic.data import get_data, clean_data_set, pad, clean
 from pocketcoach.params import *
 from pathlib import Path
-from pocketcoach.dl_logic.model import train_base_model
+from datetime import datetime
+import json
+import time
+from pocketcoach.dl_logic.model import train_base_model, train_base_model_on_dataset
+from pocketcoach.dl_logic.input_pipeline import make_dataset
 import tensorflow as tf
-from pocketcoach.dl_logic.tokenizer import save, load_tokenizer
-from pocketcoach.dl_logic.model import load_model
+from pocketcoach.dl_logic.tokenizer import save, save_compact, load_tokenizer
+from pocketcoach.dl_logic.service import classify
 
-def preprocess():
+def load_clean_data():
     """
-    - Reads the train, test, and validation data sets.
-    - Performs basic cleaning of the data-sets
-    - Fits a tokenizer on the training set
-    - Stores the tokenizer
-    - Train and evaluate model
-    - Store model and return it
+    Reads and cleans the train, validation and test data sets.
     """
 
     print("Read data")
@@ -26,26 +25,50 @@ def preprocess():
     test_cleaned_df = clean_data_set(test_df)
     validation_cleaned_df = clean_data_set(validation_df)
 
+    return train_cleaned_df, validation_cleaned_df, test_cleaned_df
+
+def preprocess(input_pipeline=TRAIN_INPUT_PIPELINE):
+    """
+    - Reads the train, test, and validation data sets.
+    - Performs basic cleaning of the data-sets
+    - Fits a tokenizer on the training set
+    - Stores the tokenizer
+    - Train and evaluate model, from padded NumPy arrays ("numpy") or a
+      length-bucketed tf.data pipeline ("tf_data")
+    - Store model and return it
+    """
+
+    train_cleaned_df, validation_cleaned_df, test_cleaned_df = load_clean_data()
+
     print("Create Tokenizer")
     X = train_cleaned_df['text']
     tokenizer = tf.keras.preprocessing.text.Tokenizer()
     tokenizer.fit_on_texts(X)
 
     save(tokenizer)
+    save_compact(tokenizer)
 
     vocab_size = len(tokenizer.word_index)
 
-    X_train = pad(X, tokenizer)
-    y_train = train_cleaned_df['label']
+    if input_pipeline == "tf_data":
+        train_ds = make_dataset(X, train_cleaned_df['label'], tokenizer, shuffle=True)
+        val_ds = make_dataset(validation_cleaned_df['text'], validation_cleaned_df['label'], tokenizer)
+        test_ds = make_dataset(test_cleaned_df['text'], test_cleaned_df['label'], tokenizer)
 
-    X_val = pad(validation_cleaned_df['text'], tokenizer)
-    y_val = validation_cleaned_df['label']
+        model = train_base_model_on_dataset(train_ds, val_ds, vocab_size)
+        evaluation = model.evaluate(test_ds, return_dict=True)
+    else:
+        X_train = pad(X, tokenizer)
+        y_train = train_cleaned_df['label']
 
-    X_test = pad(test_cleaned_df['text'], tokenizer)
-    y_test = test_cleaned_df['label']
+        X_val = pad(validation_cleaned_df['text'], tokenizer)
+        y_val = validation_cleaned_df['label']
 
-    model = train_base_model(X_train, y_train, X_val, y_val, vocab_size)
-    evaluation = model.evaluate(X_test, y_test, return_dict=True)
+        X_test = pad(test_cleaned_df['text'], tokenizer)
+        y_test = test_cleaned_df['label']
+
+        model = train_base_model(X_train, y_train, X_val, y_val, vocab_size)
+        evaluation = model.evaluate(X_test, y_test, return_dict=True)
     print(f"Model evalauated {evaluation}")
 
     model.save(BASE_MODEL_NAME)
@@ -53,9 +76,79 @@ def preprocess():
     print(f"✅ Model has been trained and stored as {BASE_MODEL_NAME}")
 
 
-def classify(text):
-    print(f"Predicting text {text}")
-    model = load_model()
-    prediction = model.predict(text)
-    print(f"Result of the prediction is {prediction}")
-    return prediction
+class EpochTimer(tf.keras.callbacks.Callback):
+    def on_train_begin(self, logs=None):
+        self.epoch_times = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_times.append(time.perf_counter() - self._start)
+
+def benchmark_input_pipelines(epochs=5):
+    """
+    Trains for `epochs` epochs (no early stopping) and reports the epoch times
+    and test accuracy of:
+    - "numpy": the fixed-length model from padded NumPy arrays (production)
+    - "numpy_variable_length": the variable-length model (global max pooling
+      instead of Flatten) from the same padded arrays
+    - "tf_data": the variable-length model from the bucketed tf.data pipeline
+    The input pipeline is compared on the same variable-length model, the
+    architecture change on the same NumPy input. Results are stored as JSON in
+    LOCAL_DATA_PATH/benchmarks.
+    """
+
+    train_cleaned_df, validation_cleaned_df, test_cleaned_df = load_clean_data()
+    X = train_cleaned_df['text']
+    tokenizer = tf.keras.preprocessing.text.Tokenizer()
+    tokenizer.fit_on_texts(X)
+    vocab_size = len(tokenizer.word_index)
+
+    results = {"epochs": epochs, "train_rows": len(X)}
+
+    X_train, X_val, X_test = pad(X, tokenizer), pad(validation_cleaned_df['text'], tokenizer), pad(test_cleaned_df['text'], tokenizer)
+    for name, variable_length in (("numpy", False), ("numpy_variable_length", True)):
+        timer = EpochTimer()
+        model = train_base_model(
+            X_train, train_cleaned_df['label'], X_val, validation_cleaned_df['label'],
+            vocab_size, epochs=epochs, callbacks=[timer], variable_length=variable_length
+        )
+        evaluation = model.evaluate(X_test, test_cleaned_df['label'], return_dict=True)
+        results[name] = _benchmark_result(timer, evaluation)
+
+    timer = EpochTimer()
+    train_ds = make_dataset(X, train_cleaned_df['label'], tokenizer, shuffle=True)
+    val_ds = make_dataset(validation_cleaned_df['text'], validation_cleaned_df['label'], tokenizer)
+    test_ds = make_dataset(test_cleaned_df['text'], test_cleaned_df['label'], tokenizer)
+    model = train_base_model_on_dataset(train_ds, val_ds, vocab_size, epochs=epochs, callbacks=[timer])
+    evaluation = model.evaluate(test_ds, return_dict=True)
+    results["tf_data"] = _benchmark_result(timer, evaluation)
+
+    # Same model, NumPy vs tf.data input
+    results["pipeline_speedup"] = results["numpy_variable_length"]["mean_epoch_s"] / results["tf_data"]["mean_epoch_s"]
+    results["pipeline_accuracy_delta"] = results["tf_data"]["test_accuracy"] - results["numpy_variable_length"]["test_accuracy"]
+    # Same NumPy input, fixed vs variable-length model
+    results["architecture_speedup"] = results["numpy"]["mean_epoch_s"] / results["numpy_variable_length"]["mean_epoch_s"]
+    results["architecture_accuracy_delta"] = results["numpy_variable_length"]["test_accuracy"] - results["numpy"]["test_accuracy"]
+
+    out_dir = Path(LOCAL_DATA_PATH).joinpath("benchmarks")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir.joinpath(f"input_pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(json.dumps(results, indent=2))
+    print(f"✅ Benchmark stored as {out_path}")
+    return results
+
+def _benchmark_result(timer, evaluation):
+    # The first epoch includes tracing and, for tf.data, filling the cache
+    steady = timer.epoch_times[1:] or timer.epoch_times
+    return {
+        "epoch_times_s": timer.epoch_times,
+        "first_epoch_s": timer.epoch_times[0],
+        "mean_epoch_s": sum(steady) / len(steady),
+        "test_accuracy": evaluation["accuracy"],
+        "test_loss": evaluation["loss"],
+    }
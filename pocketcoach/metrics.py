@@ -0,0 +1,158 @@
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Set by api.prefork for several workers: the counters, histograms and gauges
+# below are then kept in files shared by all workers (prometheus_client reads
+# the variable when first imported) and /metrics of any worker reports their sum
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# From 1 ms (cache hits, session lookups) up to 30 s (slow LLM turns)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    "pocketcoach_stage_seconds", "Time spent in one stage of a request", ["stage"], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter("pocketcoach_stage_errors_total", "Stages that raised an exception", ["stage"])
+REQUEST_SECONDS = Histogram(
+    "pocketcoach_request_seconds", "HTTP request latency until the response started",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "pocketcoach_requests_in_progress", "HTTP requests being served", multiprocess_mode="livesum"
+)
+# Sampled by the worker answering the scrape, per worker (pid label) under prefork
+THREADPOOL_BUSY = Gauge(
+    "pocketcoach_threadpool_busy_threads", "Worker threads running blocking request work", multiprocess_mode="liveall"
+)
+THREADPOOL_SIZE = Gauge(
+    "pocketcoach_threadpool_size", "Maximum worker threads for blocking request work", multiprocess_mode="liveall"
+)
+
+# Stage timings of the current request, for its Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Times the block into the stage histogram and the Server-Timing header of
+    the current request, counting an error if it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def server_timing(timings) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings)
+
+
+class StatsCollector:
+    """
+    Exposes the numbers of a `stats()` dict (batcher, caches, analytics queue)
+    at scrape time: keys in `counters` as counters, the others as gauges.
+
+    These live in the memory of one process, so in MULTIPROCESS mode they
+    describe the worker answering the scrape only and carry its `pid` label.
+    """
+
+    def __init__(self, prefix: str, stats, counters=()):
+        self.prefix = prefix
+        self.stats = stats
+        self.counters = set(counters)
+
+    def collect(self):
+        # Read on every scrape, the collector is registered before the fork
+        labels = {"pid": str(os.getpid())} if MULTIPROCESS else {}
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"pocketcoach_{self.prefix}_{key}"
+            family = CounterMetricFamily if key in self.counters else GaugeMetricFamily
+            metric = family(name, f"{self.prefix} {key}", labels=list(labels))
+            metric.add_metric(list(labels.values()), value)
+            yield metric
+
+
+_stats_collectors = []
+
+def register_stats(prefix: str, stats, counters=()):
+    collector = StatsCollector(prefix, stats, counters)
+    _stats_collectors.append(collector)
+    if not MULTIPROCESS:
+        REGISTRY.register(collector)
+
+
+def render_metrics():
+    """
+    Returns (body, content type) in the Prometheus text format. In MULTIPROCESS
+    mode the metrics of all workers, merged from their files, plus the stats
+    of this worker.
+    """
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in _stats_collectors:
+        registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route and adding a
+    Server-Timing header with the stages timed while handling the request.
+    Stages of a streamed body finish after the headers are sent and only
+    reach the histograms.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = []
+        _request_timings.set(timings)
+        start = time.perf_counter()
+        started = False
+
+        def observe(status):
+            elapsed = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+            return elapsed
+
+        async def send_with_timing(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                elapsed = observe(message["status"])
+                header = server_timing(timings + [("total", elapsed)])
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            if not started:
+                # Unhandled exception, the error response is sent further out
+                observe(500)
@@ -7,3 +7,128 @@ LOCAL_REGISTRY_PATH = os.environ.get("LOCAL_REGISTRY_PATH")
 SYSTEM_PROMPT = os.environ.get("SYSTEM_PROMPT")
 API_URL = os.environ.get("API_URL")
 LOGIN_URL = os.environ.get("LOGIN_URL")
+
+##################  SENTIMENT BATCHING  ##################
+SENTIMENT_MAX_BATCH_SIZE = int(os.environ.get("SENTIMENT_MAX_BATCH_SIZE", "32"))
+SENTIMENT_MAX_WAIT_MS = float(os.environ.get("SENTIMENT_MAX_WAIT_MS", "5"))
+
+##################  BULK CLASSIFICATION  ##################
+# /classify/batch and /classify/stream score texts in batches of this size,
+# with at most CLASSIFY_BULK_CONCURRENCY batches in the model at once
+CLASSIFY_BULK_BATCH_SIZE = int(os.environ.get("CLASSIFY_BULK_BATCH_SIZE", "256"))
+CLASSIFY_BULK_CONCURRENCY = int(os.environ.get("CLASSIFY_BULK_CONCURRENCY", "1"))
+CLASSIFY_MAX_BATCH_TEXTS = int(os.environ.get("CLASSIFY_MAX_BATCH_TEXTS", "10000"))
+
+##################  CLASSIFIER SERVICE  ##################
+# 0 keeps TensorFlow's default (one thread per core)
+TF_INTRA_OP_THREADS = int(os.environ.get("TF_INTRA_OP_THREADS", "0"))
+TF_INTER_OP_THREADS = int(os.environ.get("TF_INTER_OP_THREADS", "0"))
+# "keras" (SavedModel via TensorFlow), or an exported "tflite" / "onnx" model
+# that runs without TensorFlow, see `make export_model`
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "keras")
+MODEL_TFLITE_PATH = os.environ.get("MODEL_TFLITE_PATH", "models/base_model.tflite")
+MODEL_ONNX_PATH = os.environ.get("MODEL_ONNX_PATH", "models/base_model.onnx")
+# Results of repeated texts for /classify and the chat sentiment, by cleaned
+# text and model version, expiring after the TTL. 0 entries disables
+CLASSIFY_CACHE_SIZE = int(os.environ.get("CLASSIFY_CACHE_SIZE", "10000"))
+CLASSIFY_CACHE_TTL_S = float(os.environ.get("CLASSIFY_CACHE_TTL_S", "3600"))
+
+##################  STARTUP  ##################
+# Models loaded in the background after startup (classifier, chat_model,
+# whisper), the others load on first use. Empty disables the warm-up.
+WARM_UP_MODELS = [name.strip() for name in os.environ.get("WARM_UP_MODELS", "classifier,chat_model").split(",") if name.strip()]
+
+##################  PRE-FORK SERVING  ##################
+# `python -m api.prefork`: worker processes forked after the master loaded
+# PREFORK_MODELS, which they then share copy-on-write (the chat model and a
+# keras classifier are not fork safe and are loaded by each worker)
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", "1"))
+PREFORK_MODELS = [name.strip() for name in os.environ.get("PREFORK_MODELS", "classifier,whisper").split(",") if name.strip()]
+# Workers are replaced after this many requests, or once their private
+# (unshared) memory exceeds this many MB, 0 disables
+WORKER_MAX_REQUESTS = int(os.environ.get("WORKER_MAX_REQUESTS", "0"))
+WORKER_MAX_MEMORY_MB = int(os.environ.get("WORKER_MAX_MEMORY_MB", "0"))
+# Directory where several workers keep their /metrics values to report them
+# summed up, emptied at startup. Empty uses a new temporary directory.
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR", "")
+
+##################  TRANSCRIPTION  ##################
+# Also write every /transcribe-audio/ result to raw_data/ (in the background)
+SAVE_TRANSCRIPTS = os.environ.get("SAVE_TRANSCRIPTS", "true").lower() in ("1", "true", "yes")
+
+##################  STREAMING TRANSCRIPTION  ##################
+# Decode the sliding window after every STREAM_STEP_S seconds of new audio and
+# finalize text once the window grows beyond STREAM_WINDOW_S seconds
+STREAM_STEP_S = float(os.environ.get("STREAM_STEP_S", "1.0"))
+STREAM_WINDOW_S = float(os.environ.get("STREAM_WINDOW_S", "15"))
+
+##################  SESSION STORE  ##################
+# "json" keeps one file per session under sessions/, "sqlite" uses SESSION_DB_PATH
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "json")
+# Directory of the JSON session files and the user directory
+SESSIONS_PATH = os.environ.get("SESSIONS_PATH", "sessions")
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "sessions/sessions.db")
+# Size of the striped pool of per-session locks, sessions sharing a stripe
+# wait for each other
+SESSION_LOCK_STRIPES = int(os.environ.get("SESSION_LOCK_STRIPES", "64"))
+
+##################  HISTORY API  ##################
+# Largest page of GET /chat/{session_id}/history?limit=...&last=...
+HISTORY_PAGE_MAX = int(os.environ.get("HISTORY_PAGE_MAX", "500"))
+# Answer unchanged histories with 304 from an in-process cache of validators,
+# turn off when several worker processes write sessions
+HISTORY_VALIDATOR_CACHE = os.environ.get("HISTORY_VALIDATOR_CACHE", "true").lower() in ("1", "true", "yes")
+
+##################  CONVERSATION MEMORY  ##################
+# Live per-session memories kept in the LRU cache
+MEMORY_CACHE_SIZE = int(os.environ.get("MEMORY_CACHE_SIZE", "1024"))
+# Check cached memories against the stored message count on every hit, needed
+# when several worker processes write sessions
+MEMORY_CACHE_VALIDATE = os.environ.get("MEMORY_CACHE_VALIDATE", "false").lower() in ("1", "true", "yes")
+# Approximate tokens of history (running summary + newest turns) sent to the LLM
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "500"))
+# Fold older turns into the running summary every N turns, 0 disables summaries
+HISTORY_SUMMARY_EVERY = int(os.environ.get("HISTORY_SUMMARY_EVERY", "4"))
+# Newest turns always kept verbatim and left out of the summary
+HISTORY_VERBATIM_TURNS = int(os.environ.get("HISTORY_VERBATIM_TURNS", "3"))
+
+##################  ANALYTICS  ##################
+# bigquery, jsonl or sqlite (local stand-ins writing to ANALYTICS_PATH) or none
+ANALYTICS_SINK = os.environ.get("ANALYTICS_SINK", "bigquery")
+ANALYTICS_PATH = os.environ.get("ANALYTICS_PATH", "raw_data/analytics.jsonl")
+ANALYTICS_SPILL_PATH = os.environ.get("ANALYTICS_SPILL_PATH", "raw_data/analytics_spill.jsonl")
+ANALYTICS_QUEUE_SIZE = int(os.environ.get("ANALYTICS_QUEUE_SIZE", "10000"))
+ANALYTICS_BATCH_SIZE = int(os.environ.get("ANALYTICS_BATCH_SIZE", "500"))
+ANALYTICS_FLUSH_INTERVAL_S = float(os.environ.get("ANALYTICS_FLUSH_INTERVAL_S", "2"))
+ANALYTICS_MAX_RETRIES = int(os.environ.get("ANALYTICS_MAX_RETRIES", "5"))
+# After a batch failed all retries, spill without trying the sink for this long
+ANALYTICS_BREAKER_S = float(os.environ.get("ANALYTICS_BREAKER_S", "30"))
+
+##################  CHAT MODEL  ##################
+# "vertex" (Gemini) or "fake" (offline stand-in with simulated latency/token rate)
+CHAT_MODEL = os.environ.get("CHAT_MODEL", "vertex")
+FAKE_LLM_LATENCY_S = float(os.environ.get("FAKE_LLM_LATENCY_S", "0.3"))
+FAKE_LLM_TOKENS_PER_S = float(os.environ.get("FAKE_LLM_TOKENS_PER_S", "50"))
+# Share of fake calls that fail, or take FAKE_LLM_SLOW_LATENCY_S to answer
+FAKE_LLM_FAILURE_RATE = float(os.environ.get("FAKE_LLM_FAILURE_RATE", "0"))
+FAKE_LLM_SLOW_RATE = float(os.environ.get("FAKE_LLM_SLOW_RATE", "0"))
+FAKE_LLM_SLOW_LATENCY_S = float(os.environ.get("FAKE_LLM_SLOW_LATENCY_S", "5"))
+# /chat awaits the chat model on the event loop (true) or calls it from the
+# request threadpool (false). Calls beyond LLM_MAX_CONCURRENCY wait up to
+# LLM_QUEUE_TIMEOUT_S for a slot (503 after), answers take at most
+# LLM_TIMEOUT_S (504 after). LLM_HEDGE_AFTER_S > 0 starts a second call when
+# the first is that slow or fails, the first answer wins
+LLM_ASYNC = os.environ.get("LLM_ASYNC", "true").lower() in ("1", "true", "yes")
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "64"))
+LLM_QUEUE_TIMEOUT_S = float(os.environ.get("LLM_QUEUE_TIMEOUT_S", "10"))
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "30"))
+LLM_HEDGE_AFTER_S = float(os.environ.get("LLM_HEDGE_AFTER_S", "0"))
+
+##################  TEXT CLEANING  ##################
+# Worker processes for cleaning datasets longer than CLEAN_CHUNK_SIZE, 0 = one per CPU
+CLEAN_N_JOBS = int(os.environ.get("CLEAN_N_JOBS", "0"))
+CLEAN_CHUNK_SIZE = int(os.environ.get("CLEAN_CHUNK_SIZE", "50000"))
+
+##################  TRAINING  ##################
+# "numpy" (padded arrays) or "tf_data" (length-bucketed, cached, prefetched tf.data)
+TRAIN_INPUT_PIPELINE = os.environ.get("TRAIN_INPUT_PIPELINE", "numpy")
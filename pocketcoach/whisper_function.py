@@ -1,68 +1,142 @@
 # Whisper speech-to-Text
 import os
-from transformers import pipeline
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pocketcoach.params import SAVE_TRANSCRIPTS
 
-def transcribe_audio(audio_file_path, model_type="online"):
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_MODEL_PATH = os.path.join(SCRIPT_DIR, "..", "models", "whisper-tiny-local")
+RAW_DATA_DIR = os.path.join(SCRIPT_DIR, "..", "raw_data")
+
+# ASR pipelines keyed by model_type ("online"/"local"), loaded once per process
+_PIPELINES = {}
+_pipelines_lock = threading.Lock()
+
+def get_asr_pipeline(model_type="online"):
+    """
+    Return the cached ASR pipeline for `model_type`, loading it on first use.
+    """
+    transcription_pipe = _PIPELINES.get(model_type)
+    if transcription_pipe is not None:
+        return transcription_pipe
+
+    with _pipelines_lock:
+        transcription_pipe = _PIPELINES.get(model_type)
+        if transcription_pipe is not None:
+            return transcription_pipe
+
+        # Imported here, transformers pulls in torch
+        from transformers import pipeline
+
+        if model_type == "online":
+            print("Initializing online model pipeline...")
+            transcription_pipe = pipeline(
+                "automatic-speech-recognition",
+                model="openai/whisper-tiny",
+            )
+        else:  # local model
+            if not os.path.exists(LOCAL_MODEL_PATH):
+                raise FileNotFoundError(f"Local model directory not found at: {LOCAL_MODEL_PATH}")
+            print("Initializing local model pipeline...")
+            transcription_pipe = pipeline(
+                "automatic-speech-recognition",
+                model=LOCAL_MODEL_PATH
+            )
+            transcription_pipe.model.generation_config.forced_decoder_ids = None
+            transcription_pipe.model.generation_config.suppress_tokens = None
+
+        _PIPELINES[model_type] = transcription_pipe
+        return transcription_pipe
+
+_save_executor = None
+_save_executor_lock = threading.Lock()
+
+def save_transcription(transcription, model_type, filepath=None):
+    """Save transcription to a text file in raw_data directory."""
+    if filepath is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = os.path.join(RAW_DATA_DIR, f"transcription_{model_type}_{timestamp}.txt")
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(str(transcription))
+    print(f"Transcription saved to: {filepath}")
+    return filepath
+
+def save_transcription_async(transcription, model_type):
+    """
+    Queue the transcription to be written by a background thread.
+    Returns the path of the file that will be written.
     """
-    Transcribe audio file and save the transcription to raw_data directory.
+    global _save_executor
+    if _save_executor is None:
+        with _save_executor_lock:
+            if _save_executor is None:
+                _save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcript-writer")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    filepath = os.path.join(RAW_DATA_DIR, f"transcription_{model_type}_{timestamp}.txt")
+    _save_executor.submit(save_transcription, transcription, model_type, filepath)
+    return filepath
+
+def transcribe_audio(audio, model_type="online", save=SAVE_TRANSCRIPTS, sampling_rate=16000):
+    """
+    Transcribe audio and optionally save the transcription to raw_data directory.
 
     Args:
-        audio_file_path (str): Path to the audio file to transcribe
+        audio (str | np.ndarray): Path to an audio file, or a mono float array
+            sampled at `sampling_rate` (see pocketcoach.audio.decode_audio)
         model_type (str): Either "online" or "local" to specify which model to use
+        save (bool): Write the transcription to raw_data/ in the background
 
     Returns:
-        tuple: (transcription_result, saved_file_path)
+        tuple: (transcription_result, saved_file_path or None)
     """
-    # Get the absolute path to the script's directory
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # Construct absolute paths
-    model_path = os.path.join(script_dir, "..", "models", "whisper-tiny-local")
-    raw_data_dir = os.path.join(script_dir, "..", "raw_data")
-
     # Verify directories exist
-    if not os.path.exists(raw_data_dir):
-        raise FileNotFoundError(f"Raw data directory not found at: {raw_data_dir}")
-    if model_type == "local" and not os.path.exists(model_path):
-        raise FileNotFoundError(f"Local model directory not found at: {model_path}")
+    if save and not os.path.exists(RAW_DATA_DIR):
+        raise FileNotFoundError(f"Raw data directory not found at: {RAW_DATA_DIR}")
 
-    def save_transcription(transcription, model_type):
-        """Save transcription to a text file in raw_data directory."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"transcription_{model_type}_{timestamp}.txt"
-        filepath = os.path.join(raw_data_dir, filename)
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(str(transcription))
-        print(f"Transcription saved to: {filepath}")
-        return filepath
-
-    # Initialize the appropriate pipeline
-    if model_type == "online":
-        print("Initializing online model pipeline...")
-        transcription_pipe = pipeline(
-            "automatic-speech-recognition",
-            model="openai/whisper-tiny",
-        )
-    else:  # local model
-        print("Initializing local model pipeline...")
-        transcription_pipe = pipeline(
-            "automatic-speech-recognition",
-            model=model_path
-        )
-        transcription_pipe.model.generation_config.forced_decoder_ids = None
-        transcription_pipe.model.generation_config.suppress_tokens = None
+    transcription_pipe = get_asr_pipeline(model_type)
+    if not isinstance(audio, str):
+        # Hand the samples straight to the model, no file to decode again
+        audio = {"raw": audio, "sampling_rate": sampling_rate}
 
     # Perform transcription
     print(f"\nTranscribing with {model_type} model...")
-    result = transcription_pipe(audio_file_path, return_timestamps=True)
+    result = transcription_pipe(audio, return_timestamps=True)
 
     # Save transcription
-    saved_file_path = save_transcription(result, model_type)
+    saved_file_path = save_transcription_async(result, model_type) if save else None
 
     return result, saved_file_path
 
+def transcribe_batch(audios, model_type="online", sampling_rate=16000, batch_size=None):
+    """
+    Transcribe several audio clips with a single pipeline invocation.
+
+    Args:
+        audios (list): File paths, 1-D float arrays sampled at `sampling_rate`,
+            or {"raw": array, "sampling_rate": int} dicts
+        model_type (str): Either "online" or "local" to specify which model to use
+        sampling_rate (int): Sampling rate of plain arrays in `audios`
+        batch_size (int): Clips per forward pass, defaults to all of them
+
+    Returns:
+        list: One transcription result per clip, in input order
+    """
+    if not audios:
+        return []
+    inputs = [
+        audio if isinstance(audio, (str, dict)) else {"raw": audio, "sampling_rate": sampling_rate}
+        for audio in audios
+    ]
+    transcription_pipe = get_asr_pipeline(model_type)
+    print(f"\nTranscribing {len(inputs)} clips with {model_type} model...")
+    return transcription_pipe(
+        inputs,
+        batch_size=batch_size or len(inputs),
+        return_timestamps=True,
+    )
+
 # Example usage when running this script directly
 if __name__ == "__main__":
     # Get the absolute path to the audio file
@@ -0,0 +1,110 @@
+# Streaming Whisper speech-to-Text over a sliding window
+import numpy as np
+from pocketcoach.params import *
+from pocketcoach.whisper_function import get_asr_pipeline
+
+PCM_DTYPES = {
+    "pcm_s16le": ("<i2", 32768.0),
+    "pcm_f32le": ("<f4", 1.0),
+}
+
+class StreamingTranscriber:
+    """
+    Incrementally transcribes PCM audio as it arrives.
+
+    Audio is collected in a window that is decoded again after every `step_s`
+    seconds of new audio, producing "partial" events for the words heard so
+    far. Once the window is longer than `window_s` seconds, all timestamped
+    chunks but the last one are emitted as a "final" event and their audio is
+    dropped from the window, so decoding cost stays bounded.
+    """
+
+    def __init__(
+        self,
+        model_type="local",
+        sampling_rate=16000,
+        encoding="pcm_s16le",
+        step_s=STREAM_STEP_S,
+        window_s=STREAM_WINDOW_S,
+    ):
+        if encoding not in PCM_DTYPES:
+            raise ValueError(f"Unsupported encoding {encoding}, use one of {list(PCM_DTYPES)}")
+        self.model_type = model_type
+        self.sampling_rate = sampling_rate
+        self.dtype, self.scale = PCM_DTYPES[encoding]
+        self.step = int(step_s * sampling_rate)
+        self.window = int(window_s * sampling_rate)
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._pending_bytes = b""
+        self._undecoded = 0
+        self._segment = 0
+
+    def feed_bytes(self, frame: bytes):
+        """
+        Adds raw PCM bytes, keeping incomplete samples for the next frame.
+        Returns the events produced by this frame.
+        """
+        data = self._pending_bytes + frame
+        item_size = np.dtype(self.dtype).itemsize
+        usable = len(data) - len(data) % item_size
+        self._pending_bytes = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=self.dtype).astype(np.float32)
+        if self.scale != 1.0:
+            samples /= self.scale
+        return self.feed(samples)
+
+    def feed(self, samples):
+        """
+        Adds float samples in [-1, 1]. Returns a (possibly empty) list of events.
+        """
+        self._buffer = np.concatenate([self._buffer, np.asarray(samples, dtype=np.float32)])
+        self._undecoded += len(samples)
+        if self._undecoded < self.step:
+            return []
+
+        self._undecoded = 0
+        result = self._decode()
+        if len(self._buffer) >= self.window:
+            return self._commit(result, force=False)
+        return [self._event("partial", result.get("text", ""))]
+
+    def finish(self):
+        """
+        Decodes whatever audio is left and finalizes it.
+        """
+        if len(self._buffer) == 0:
+            return []
+        return self._commit(self._decode(), force=True)
+
+    def _decode(self):
+        transcription_pipe = get_asr_pipeline(self.model_type)
+        return transcription_pipe(
+            {"raw": self._buffer, "sampling_rate": self.sampling_rate},
+            return_timestamps=True,
+        )
+
+    def _commit(self, result, force):
+        chunks = result.get("chunks") or []
+        done = [c for c in chunks[:-1] if c.get("timestamp") and c["timestamp"][1] is not None]
+
+        if force or not done:
+            events = [self._event("final", result.get("text", ""))]
+            self._buffer = np.zeros(0, dtype=np.float32)
+            self._undecoded = 0
+            return events
+
+        cut = int(done[-1]["timestamp"][1] * self.sampling_rate)
+        text = "".join(c.get("text", "") for c in done)
+        self._buffer = self._buffer[cut:]
+        events = [self._event("final", text)]
+        remainder = "".join(c.get("text", "") for c in chunks[len(done):])
+        if remainder.strip():
+            events.append(self._event("partial", remainder))
+        return events
+
+    def _event(self, kind, text):
+        event = {"type": kind, "segment": self._segment, "text": text.strip()}
+        if kind == "final":
+            self._segment += 1
+        return event
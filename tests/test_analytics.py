@@ -0,0 +1,64 @@
+import time
+from api.analytics import AnalyticsExporter, SinkError
+
+
+class FlakySink:
+    def __init__(self):
+        self.down = True
+        self.calls = 0
+        self.rows = []
+
+    def write(self, rows):
+        self.calls += 1
+        if self.down:
+            raise SinkError("sink down")
+        self.rows.extend(rows)
+
+
+def _exporter(tmp_path, sink, breaker_s):
+    return AnalyticsExporter(
+        sink, batch_size=2, flush_interval_s=0.05, max_retries=3, backoff_s=0.01,
+        spill_path=tmp_path / "spill.jsonl", breaker_s=breaker_s,
+    )
+
+
+def _wait_for(condition, timeout_s=5.0):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_open_breaker_spills_without_retrying(tmp_path):
+    sink = FlakySink()
+    exporter = _exporter(tmp_path, sink, breaker_s=60)
+    for i in range(10):
+        exporter.submit({"i": i})
+    _wait_for(lambda: exporter.stats()["spilled"] == 10)
+    exporter.close()
+
+    stats = exporter.stats()
+    # Only the first batch went through its retries, the others were spilled
+    assert sink.calls == 4
+    assert stats["breaker_trips"] == 1
+    assert stats["breaker_open"] and stats["spill_pending"]
+    assert stats["dropped"] == 0
+
+
+def test_spill_is_replayed_once_the_sink_is_back(tmp_path):
+    sink = FlakySink()
+    exporter = _exporter(tmp_path, sink, breaker_s=0.1)
+    for i in range(6):
+        exporter.submit({"i": i})
+    _wait_for(lambda: exporter.stats()["spilled"] == 6)
+
+    sink.down = False
+    time.sleep(0.15)
+    exporter.submit({"i": 6})
+    _wait_for(lambda: exporter.stats()["replayed"] == 6)
+    exporter.close()
+
+    stats = exporter.stats()
+    assert sorted(row["i"] for row in sink.rows) == list(range(7))
+    assert not stats["breaker_open"] and not stats["spill_pending"]
+    assert not list(tmp_path.glob("spill.*"))
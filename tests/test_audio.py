@@ -0,0 +1,70 @@
+import io
+import os
+import sys
+import stat
+import threading
+import numpy as np
+import pytest
+import soundfile as sf
+from pocketcoach.audio import decode_audio, AudioDecodeError, TARGET_SAMPLING_RATE
+
+# Stands in for ffmpeg: reads the input, writes `stderr_bytes` of warnings
+# before any output, then one second of silence, and exits with `code`
+FAKE_FFMPEG = """#!{python}
+import sys
+sys.stdin.buffer.read()
+sys.stderr.write("warning: bad frame\\n" * ({stderr_bytes} // 19))
+sys.stderr.write("last error line\\n")
+sys.stderr.flush()
+if {code} == 0:
+    sys.stdout.buffer.write(b"\\0" * 4 * {rate})
+sys.exit({code})
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    def install(stderr_bytes=0, code=0):
+        path = tmp_path / "ffmpeg"
+        path.write_text(FAKE_FFMPEG.format(python=sys.executable, stderr_bytes=stderr_bytes, code=code, rate=TARGET_SAMPLING_RATE))
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return install
+
+
+def _decode_with_timeout(data: bytes, timeout_s=20):
+    outcome = {}
+
+    def run():
+        try:
+            outcome["audio"] = decode_audio(io.BytesIO(data))
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout_s)
+    assert not thread.is_alive(), "decoding hangs"
+    return outcome
+
+
+def test_wav_is_decoded_without_ffmpeg():
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros((44100, 2), dtype=np.float32), 44100, format="WAV")
+    audio = decode_audio(io.BytesIO(buffer.getvalue()))
+    assert audio.dtype == np.float32
+    assert audio.shape == (TARGET_SAMPLING_RATE,)
+
+
+def test_verbose_ffmpeg_stderr_does_not_block(fake_ffmpeg):
+    fake_ffmpeg(stderr_bytes=1 << 20)
+    outcome = _decode_with_timeout(b"not a wav file")
+    assert outcome["audio"].shape == (TARGET_SAMPLING_RATE,)
+
+
+def test_ffmpeg_failure_reports_the_end_of_stderr(fake_ffmpeg):
+    fake_ffmpeg(stderr_bytes=1 << 20, code=1)
+    outcome = _decode_with_timeout(b"not a wav file")
+    assert isinstance(outcome["error"], AudioDecodeError)
+    assert "last error line" in str(outcome["error"])
+    assert len(str(outcome["error"])) < 5000
@@ -0,0 +1,117 @@
+import os
+import asyncio
+import threading
+import pytest
+from pocketcoach.dl_logic.batcher import MicroBatcher
+
+
+class FakeModel:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def predict_batch(self, texts):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise ValueError("model failed")
+        return [text.upper() for text in texts]
+
+
+def test_full_batch_is_flushed_without_waiting():
+    model = FakeModel()
+    # A flush on the wait deadline would time out the results below
+    batcher = MicroBatcher(model.predict_batch, max_batch_size=4, max_wait_ms=60_000)
+    futures = [batcher.submit(text) for text in ["a", "b", "c", "d"]]
+    assert [future.result(timeout=5) for future in futures] == ["A", "B", "C", "D"]
+    assert model.batches == [["a", "b", "c", "d"]]
+    batcher.close()
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+    model = FakeModel()
+    batcher = MicroBatcher(model.predict_batch, max_batch_size=32, max_wait_ms=20)
+    assert batcher.classify("a", timeout=5) == "A"
+    assert model.batches == [["a"]]
+    batcher.close()
+
+
+def test_concurrent_callers_get_their_own_result():
+    model = FakeModel()
+    batcher = MicroBatcher(model.predict_batch, max_batch_size=8, max_wait_ms=20)
+    texts = [f"text {i}" for i in range(50)]
+    results = {}
+
+    def call(text):
+        results[text] = batcher.classify(text, timeout=5)
+
+    threads = [threading.Thread(target=call, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {text: text.upper() for text in texts}
+    assert all(len(batch) <= 8 for batch in model.batches)
+    batcher.close()
+
+
+def test_error_is_raised_in_every_waiting_caller():
+    batcher = MicroBatcher(FakeModel(fail=True).predict_batch, max_batch_size=3, max_wait_ms=60_000)
+    futures = [batcher.submit(text) for text in ["a", "b", "c"]]
+    for future in futures:
+        with pytest.raises(ValueError, match="model failed"):
+            future.result(timeout=5)
+    assert batcher.stats()["errors"] == 1
+    batcher.close()
+
+
+def test_aclassify_awaits_the_batched_result():
+    batcher = MicroBatcher(FakeModel().predict_batch, max_batch_size=2, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(batcher.aclassify("a"), batcher.aclassify("b"))
+
+    assert asyncio.run(main()) == ["A", "B"]
+    batcher.close()
+
+
+def test_stats():
+    batcher = MicroBatcher(FakeModel().predict_batch, max_batch_size=2, max_wait_ms=60_000)
+    for pair in (["a", "b"], ["c", "d"]):
+        for future in [batcher.submit(text) for text in pair]:
+            future.result(timeout=5)
+    stats = batcher.stats()
+    batcher.close()
+
+    assert stats["requests"] == 4 and stats["batches"] == 2
+    assert stats["avg_batch_size"] == 2.0
+    assert stats["last_batch_size"] == stats["max_batch_size_seen"] == 2
+    assert stats["batch_size_counts"] == {2: 2}
+    assert stats["queue_depth"] == 0 and stats["errors"] == 0
+
+
+def test_closed_batcher_rejects_requests():
+    batcher = MicroBatcher(FakeModel().predict_batch)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit("a")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_starts_its_own_worker():
+    batcher = MicroBatcher(FakeModel().predict_batch, max_batch_size=4, max_wait_ms=5)
+    assert batcher.classify("parent", timeout=5) == "PARENT"
+
+    pid = os.fork()
+    if pid == 0:
+        # The parent's worker thread does not exist in the child
+        try:
+            ok = batcher.classify("child", timeout=5) == "CHILD" and batcher._pid == os.getpid()
+        except BaseException:
+            ok = False
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert batcher.classify("parent again", timeout=5) == "PARENT AGAIN"
+    batcher.close()
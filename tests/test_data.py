@@ -0,0 +1,51 @@
+import random
+import pandas as pd
+import pytest
+from pocketcoach.dl_logic.data import clean, clean_batch
+
+TRICKY_TEXTS = ["İstanbul", "ΣΑΣ", "  Hello, World! 42 ", "straße", "ǅemal", "ﬁne", "", "OK"]
+
+
+def _random_texts(n=3000, seed=0):
+    rng = random.Random(seed)
+    alphabet = "aZ İıΣσςß0é,.! \tǅﬁΩ"
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        for _ in range(n)
+    ]
+
+
+@pytest.mark.parametrize("dtype", [object, "string"])
+def test_clean_batch_series_matches_clean(dtype):
+    texts = TRICKY_TEXTS + _random_texts()
+    series = pd.Series(texts, index=range(10, 10 + len(texts)), name="text", dtype=dtype)
+    cleaned = clean_batch(series, n_jobs=1)
+    assert list(cleaned.index) == list(series.index)
+    assert cleaned.name == "text"
+    assert list(cleaned) == [clean(text) for text in texts]
+
+
+def test_clean_batch_list_matches_clean():
+    texts = TRICKY_TEXTS + _random_texts()
+    assert clean_batch(texts, n_jobs=1) == [clean(text) for text in texts]
+
+
+def test_clean_batch_chunked_matches_clean():
+    texts = TRICKY_TEXTS + _random_texts(500)
+    assert clean_batch(texts, n_jobs=2, chunk_size=100) == [clean(text) for text in texts]
+
+
+def test_clean_batch_keeps_missing_values():
+    cleaned = clean_batch(pd.Series(["A!", None], dtype="string"), n_jobs=1)
+    assert cleaned[0] == "a"
+    assert cleaned.isna()[1]
+
+
+@pytest.mark.parametrize("dtype", [object, "string"])
+def test_clean_batch_chunked_series_keeps_missing_values_and_dtype(dtype):
+    texts = (["A!", None] * 150) + TRICKY_TEXTS
+    series = pd.Series(texts, dtype=dtype)
+    cleaned = clean_batch(series, n_jobs=2, chunk_size=50)
+    assert cleaned.dtype == series.dtype
+    assert list(cleaned.isna()) == list(series.isna())
+    assert [c for c, t in zip(cleaned, texts) if t is not None] == [clean(t) for t in texts if t is not None]
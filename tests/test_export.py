@@ -0,0 +1,34 @@
+import os
+import importlib.util
+import pytest
+from pocketcoach.params import BASE_MODEL_NAME, MODEL_TFLITE_PATH, MODEL_ONNX_PATH
+from pocketcoach.dl_logic.tokenizer import TOKENIZER_NAME, TOKENIZER_VOCAB_NAME
+
+# An exported model may differ from the Keras model by quantization noise only
+MIN_LABEL_AGREEMENT = 0.99
+MAX_SCORE_DIFF = 0.05
+
+
+def _skip_unless_available(path, runtimes):
+    missing = [p for p in (BASE_MODEL_NAME or "BASE_MODEL_NAME", path) if not os.path.exists(p)]
+    if not (os.path.isfile(TOKENIZER_VOCAB_NAME) or os.path.isfile(TOKENIZER_NAME)):
+        missing.append(TOKENIZER_NAME)
+    if missing:
+        pytest.skip(f"Not exported or trained yet: {', '.join(missing)}")
+    if importlib.util.find_spec("tensorflow") is None:
+        pytest.skip("The Keras reference model needs tensorflow")
+    if not any(importlib.util.find_spec(runtime) for runtime in runtimes):
+        pytest.skip(f"No runtime installed, needs one of {', '.join(runtimes)}")
+
+
+@pytest.mark.parametrize("backend, path, runtimes", [
+    ("tflite", MODEL_TFLITE_PATH, ("tflite_runtime", "tensorflow")),
+    ("onnx", MODEL_ONNX_PATH, ("onnxruntime",)),
+])
+def test_exported_model_matches_keras(backend, path, runtimes):
+    _skip_unless_available(path, runtimes)
+    from pocketcoach.dl_logic.export import check_parity
+
+    report = check_parity(backend)
+    assert report["label_agreement"] >= MIN_LABEL_AGREEMENT
+    assert report["max_score_diff"] <= MAX_SCORE_DIFF
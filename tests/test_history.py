@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+
+pytest.importorskip("langchain")
+from langchain.memory import ConversationBufferMemory
+from pocketcoach.llm_logic.history import compact_history, count_tokens
+from pocketcoach import params
+from api import chat_manager
+from api.session_store import JsonSessionStore
+
+TURNS = [("hello there", "hi, how are you"), ("quite tired today", "what kept you up"), ("work stuff", "tell me more")]
+
+
+def _memory(turns=TURNS):
+    memory = ConversationBufferMemory(memory_key="history", return_messages=False)
+    for user_text, response in turns:
+        memory.save_context({"user_text": user_text}, {"response": response})
+    return memory
+
+
+def _cost(line):
+    # Tokens of a rendered line plus its newline
+    return count_tokens(line) + 1
+
+
+LINES = [line for user_text, response in TURNS for line in (f"Human: {user_text}", f"AI: {response}")]
+
+
+def test_everything_fits_in_an_exact_budget():
+    budget = sum(map(_cost, LINES))
+    assert compact_history(_memory(), token_budget=budget) == "\n".join(LINES)
+
+
+def test_oldest_messages_are_dropped_one_token_short():
+    budget = sum(map(_cost, LINES)) - 1
+    assert compact_history(_memory(), token_budget=budget) == "\n".join(LINES[1:])
+
+
+def test_only_the_newest_message_is_cut():
+    # Its end is kept, starting at a word boundary
+    assert compact_history(_memory(), token_budget=2) == "me more"
+    assert compact_history(_memory(), token_budget=3) == "tell me more"
+
+
+def test_summary_takes_at_most_half_the_budget():
+    summary = " ".join(["word"] * 100)
+    history = compact_history(_memory(), summary=summary, token_budget=40)
+    summary_line, *lines = history.split("\n")
+    assert summary_line.startswith("Summary of the earlier conversation: word")
+    assert not summary_line.endswith(" ")
+    assert count_tokens(summary_line) <= 20
+    assert lines == LINES[-len(lines):] and lines
+    assert sum(map(_cost, history.split("\n"))) <= 40 + 1
+
+
+def test_only_unsummarized_messages_are_rendered():
+    memory = _memory()
+    history = compact_history(memory, summary="they said hello", token_budget=500, unsummarized=2)
+    assert history.split("\n") == ["Summary of the earlier conversation: they said hello"] + LINES[-2:]
+
+    assert compact_history(memory, summary="all covered", token_budget=500, unsummarized=0) == (
+        "Summary of the earlier conversation: all covered"
+    )
+    assert compact_history(memory, token_budget=500, unsummarized=None) == "\n".join(LINES)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """
+    A session of 5 turns in a JSON store in `tmp_path`, with a fake summarizer
+    recording the messages it was asked to fold in.
+    """
+    store = JsonSessionStore(tmp_path)
+    monkeypatch.setattr(chat_manager, "get_session_store", lambda: store)
+    monkeypatch.setattr(chat_manager, "_memory_cache", type(chat_manager._memory_cache)())
+    monkeypatch.setattr(chat_manager, "HISTORY_SUMMARY_EVERY", 2)
+    monkeypatch.setattr(chat_manager, "HISTORY_VERBATIM_TURNS", 1)
+    calls = []
+
+    async def fake_summarize(previous_summary, messages):
+        calls.append((previous_summary, [m["content"] for m in messages]))
+        return f"summary of {len(messages)} messages"
+
+    monkeypatch.setattr(chat_manager, "asummarize_history", fake_summarize)
+    session_id, _ = chat_manager.get_or_create_session("s1")
+    for turn in range(5):
+        chat_manager.append_to_history(session_id, "user", f"u{turn}")
+        chat_manager.append_to_history(session_id, "assistant", f"a{turn}")
+    chat_manager.get_memory_for_session(session_id)
+    return store, session_id, calls
+
+
+def test_summary_folds_all_but_the_verbatim_turns(session):
+    store, session_id, calls = session
+    assert asyncio.run(chat_manager.update_summary_if_due(session_id))
+
+    assert calls == [(None, ["u0", "a0", "u1", "a1", "u2", "a2", "u3", "a3"])]
+    assert store.get_summary(session_id) == {"text": "summary of 8 messages", "upto": 8}
+    _, summary, unsummarized = chat_manager.get_memory_for_session(session_id)
+    assert summary == "summary of 8 messages"
+    assert unsummarized == 2
+
+
+def test_summary_waits_for_enough_new_turns(session):
+    store, session_id, calls = session
+    asyncio.run(chat_manager.update_summary_if_due(session_id))
+
+    # One more turn is not enough with HISTORY_SUMMARY_EVERY=2
+    chat_manager.append_to_history(session_id, "user", "u5")
+    chat_manager.append_to_history(session_id, "assistant", "a5")
+    assert not asyncio.run(chat_manager.update_summary_if_due(session_id))
+
+    chat_manager.append_to_history(session_id, "user", "u6")
+    chat_manager.append_to_history(session_id, "assistant", "a6")
+    assert asyncio.run(chat_manager.update_summary_if_due(session_id))
+    assert calls[-1] == ("summary of 8 messages", ["u4", "a4", "u5", "a5"])
+    assert store.get_summary(session_id)["upto"] == 12
+    assert chat_manager.get_memory_for_session(session_id)[2] == 2
+
+
+def test_summary_is_not_updated_while_disabled(session, monkeypatch):
+    _, session_id, calls = session
+    monkeypatch.setattr(chat_manager, "HISTORY_SUMMARY_EVERY", 0)
+    assert not asyncio.run(chat_manager.update_summary_if_due(session_id))
+    assert calls == []
+
+
+def test_cache_switches_are_read_at_call_time(session, monkeypatch):
+    # As api.prefork sets them, after api.chat_manager was imported
+    store, session_id, _ = session
+    monkeypatch.setattr(chat_manager, "_history_versions", type(chat_manager._history_versions)())
+    monkeypatch.setattr(params, "MEMORY_CACHE_VALIDATE", True)
+    monkeypatch.setattr(params, "HISTORY_VALIDATOR_CACHE", False)
+
+    # Written by another worker process
+    store.append(session_id, {"role": "user", "content": "u5"})
+    store.append(session_id, {"role": "assistant", "content": "a5"})
+    memory, _, _ = chat_manager.get_memory_for_session(session_id)
+    assert memory.chat_memory.messages[-1].content == "a5"
+    assert chat_manager.get_memory_cache_stats()["stale"] >= 1
+
+    chat_manager.get_history_version(session_id)
+    assert chat_manager.get_cached_history_version(session_id) is None
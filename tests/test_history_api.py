@@ -0,0 +1,86 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from collections import OrderedDict
+from fastapi.testclient import TestClient
+from api import chat_manager
+from api import fast
+from api.session_store import JsonSessionStore
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    A client of the app (without its startup) over a JSON store in `tmp_path`
+    holding session "s1" with 7 messages.
+    """
+    store = JsonSessionStore(tmp_path)
+    monkeypatch.setattr(chat_manager, "get_session_store", lambda: store)
+    monkeypatch.setattr(chat_manager, "_history_versions", OrderedDict())
+    monkeypatch.setattr(chat_manager, "_memory_cache", OrderedDict())
+    chat_manager.get_or_create_session("s1")
+    for i in range(7):
+        chat_manager.append_to_history("s1", "user" if i % 2 == 0 else "assistant", f"message {i}")
+    return TestClient(fast.app)
+
+
+def _history(client, **params):
+    response = client.get("/chat/s1/history", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_cursor_pages_cover_the_history_once(client):
+    ids = []
+    after = -1
+    while True:
+        page = _history(client, after=after, limit=3)
+        ids += [m["id"] for m in page["history"]]
+        assert page["total"] == 7
+        assert page["has_earlier"] == (after >= 0)
+        if not page["has_more"]:
+            break
+        after = page["history"][-1]["id"]
+    assert ids == list(range(7))
+
+
+def test_last_returns_the_newest_messages(client):
+    page = _history(client, last=2)
+    assert [m["content"] for m in page["history"]] == ["message 5", "message 6"]
+    assert page["has_earlier"] and not page["has_more"]
+    assert _history(client)["history"] == _history(client, after=-1, limit=7)["history"]
+
+
+@pytest.mark.parametrize("params", [{"last": 2, "after": 1}, {"last": 0}, {"limit": fast.HISTORY_PAGE_MAX + 1}, {"after": -2}])
+def test_invalid_page_arguments(client, params):
+    assert client.get("/chat/s1/history", params=params).status_code == 400
+
+
+def test_missing_session(client):
+    assert client.get("/chat/missing/history").status_code == 404
+
+
+def test_unchanged_history_is_not_modified(client):
+    response = client.get("/chat/s1/history", params={"last": 2})
+    etag = response.headers["etag"]
+
+    cached = client.get("/chat/s1/history", params={"last": 2}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["etag"] == etag
+    since = client.get("/chat/s1/history", params={"last": 2}, headers={"If-Modified-Since": response.headers["last-modified"]})
+    assert since.status_code == 304
+
+    # Another page of the same history has its own validator
+    other = client.get("/chat/s1/history", params={"last": 3}, headers={"If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["etag"] != etag
+
+
+def test_append_changes_the_validator(client):
+    etag = client.get("/chat/s1/history", params={"last": 2}).headers["etag"]
+    chat_manager.append_to_history("s1", "assistant", "message 7")
+
+    response = client.get("/chat/s1/history", params={"last": 2}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert [m["content"] for m in response.json()["history"]] == ["message 6", "message 7"]
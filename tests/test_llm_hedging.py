@@ -0,0 +1,177 @@
+import asyncio
+from functools import partial
+import pytest
+
+pytest.importorskip("langchain")
+from langchain.prompts.chat import ChatPromptTemplate
+from pocketcoach.llm_logic import llm_logic
+from pocketcoach.llm_logic.fake_llm import FakeStreamingChatModel
+
+FAST_S = 0.01
+SLOW_S = 5.0
+HEDGE_AFTER_S = 0.1
+
+
+@pytest.fixture(autouse=True)
+def fresh_slots(monkeypatch):
+    monkeypatch.setattr(llm_logic, "_llm_slots", None)
+    monkeypatch.setattr(llm_logic, "_llm_stats", dict.fromkeys(llm_logic._llm_stats, 0))
+    monkeypatch.setattr(llm_logic, "LLM_MAX_CONCURRENCY", 2)
+
+
+def _model(latency_s, response):
+    return FakeStreamingChatModel(latency_s=latency_s, tokens_per_s=0, responses=[response])
+
+
+class Calls:
+    """
+    Runs successive calls on the given models and records which got cancelled.
+    """
+
+    def __init__(self, *models):
+        self.models = iter(models)
+        self.started = []
+        self.cancelled = []
+
+    def __call__(self):
+        return self._run(next(self.models))
+
+    async def _run(self, model):
+        self.started.append(model)
+        try:
+            return (await model.ainvoke("hi")).content
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+
+
+async def _hold_caller_slot():
+    # ainvoke_llm holds a slot for the first call before hedging
+    await llm_logic._acquire_llm_slot()
+    return llm_logic._get_llm_slots()
+
+
+def test_hedge_wins_and_the_slow_call_is_cancelled():
+    slow, fast = _model(SLOW_S, "slow"), _model(FAST_S, "fast")
+    calls = Calls(slow, fast)
+
+    async def main():
+        slots = await _hold_caller_slot()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await llm_logic._hedged(calls, timeout_s=SLOW_S * 2, hedge_after_s=HEDGE_AFTER_S)
+        elapsed = loop.time() - start
+        await asyncio.sleep(0)
+        slots.release()
+        return result, elapsed, slots
+
+    result, elapsed, slots = asyncio.run(main())
+    assert result == "fast"
+    assert HEDGE_AFTER_S <= elapsed < SLOW_S
+    assert calls.cancelled == [slow]
+    assert llm_logic._llm_stats["hedges"] == llm_logic._llm_stats["hedge_wins"] == 1
+    # The hedge gave its slot back
+    assert slots._value == 2
+
+
+def test_no_hedge_when_the_first_call_answers_in_time():
+    calls = Calls(_model(FAST_S, "first"), _model(FAST_S, "hedge"))
+
+    async def main():
+        slots = await _hold_caller_slot()
+        try:
+            return await llm_logic._hedged(calls, timeout_s=1, hedge_after_s=HEDGE_AFTER_S)
+        finally:
+            slots.release()
+
+    assert asyncio.run(main()) == "first"
+    assert len(calls.started) == 1
+    assert llm_logic._llm_stats["hedges"] == 0
+
+
+def test_hedge_is_skipped_when_all_slots_are_taken():
+    calls = Calls(_model(0.3, "first"), _model(FAST_S, "hedge"))
+
+    async def main():
+        slots = await _hold_caller_slot()
+        # Another request holds the second and last slot
+        await llm_logic._acquire_llm_slot()
+        try:
+            return await llm_logic._hedged(calls, timeout_s=1, hedge_after_s=HEDGE_AFTER_S)
+        finally:
+            slots.release()
+            slots.release()
+
+    assert asyncio.run(main()) == "first"
+    assert len(calls.started) == 1
+    assert llm_logic._llm_stats["hedges_skipped"] == 1
+    assert llm_logic._llm_stats["hedges"] == 0
+
+
+def test_failed_call_is_hedged_at_once():
+    failing = FakeStreamingChatModel(latency_s=FAST_S, tokens_per_s=0, failure_rate=1.0)
+    calls = Calls(failing, _model(FAST_S, "hedge"))
+
+    async def main():
+        slots = await _hold_caller_slot()
+        try:
+            return await llm_logic._hedged(calls, timeout_s=1, hedge_after_s=SLOW_S)
+        finally:
+            slots.release()
+
+    assert asyncio.run(main()) == "hedge"
+
+
+def test_timeout_cancels_every_attempt():
+    slow, slower = _model(SLOW_S, "slow"), _model(SLOW_S, "slower")
+    calls = Calls(slow, slower)
+
+    async def main():
+        slots = await _hold_caller_slot()
+        try:
+            await llm_logic._hedged(calls, timeout_s=0.3, hedge_after_s=HEDGE_AFTER_S)
+        finally:
+            await asyncio.sleep(0)
+            slots.release()
+
+    with pytest.raises(llm_logic.LLMTimeoutError):
+        asyncio.run(main())
+    assert sorted(model.responses[0] for model in calls.cancelled) == ["slow", "slower"]
+    assert llm_logic._llm_stats["timeouts"] == 1
+
+
+class CountingModel(FakeStreamingChatModel):
+    """
+    Records the most calls the model ever had running at once.
+    """
+
+    running: int = 0
+    max_running: int = 0
+
+    async def _agenerate(self, *args, **kwargs):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            return await super()._agenerate(*args, **kwargs)
+        finally:
+            self.running -= 1
+
+
+def test_ainvoke_llm_never_goes_past_the_slots(monkeypatch):
+    model = CountingModel(latency_s=FAST_S, tokens_per_s=0, slow_rate=0.5, slow_latency_s=0.5, responses=["answer"])
+    monkeypatch.setattr(llm_logic, "chat_model", model)
+    monkeypatch.setattr(llm_logic, "_hedged", partial(llm_logic._hedged, timeout_s=5, hedge_after_s=HEDGE_AFTER_S))
+    template = ChatPromptTemplate.from_messages([("human", "{user_text}")])
+
+    async def main():
+        answers = await asyncio.gather(*(llm_logic.ainvoke_llm({"user_text": "hi"}, template) for _ in range(8)))
+        await asyncio.sleep(0)
+        return answers, llm_logic._get_llm_slots()._value
+
+    answers, free_slots = asyncio.run(main())
+    stats = llm_logic._llm_stats
+    assert answers == ["answer"] * 8
+    assert model.max_running == 2
+    assert free_slots == 2
+    assert stats["calls"] == 8 and stats["in_flight"] == 0
+    assert stats["hedges"] >= 1 and stats["hedges_skipped"] >= 1
@@ -0,0 +1,50 @@
+import os
+import sys
+import subprocess
+import pytest
+
+# Run in a fresh interpreter: prometheus_client reads PROMETHEUS_MULTIPROC_DIR on import
+FORKED_WORKERS = """
+import os
+from prometheus_client.parser import text_string_to_metric_families
+from pocketcoach.metrics import MULTIPROCESS, timed, register_stats, render_metrics
+
+assert MULTIPROCESS
+register_stats("queue", lambda: {"depth": 3, "requests": 7}, counters=("requests",))
+children = []
+for _ in range(2):
+    pid = os.fork()
+    if pid == 0:
+        with timed("work"):
+            pass
+        os._exit(0)
+    children.append(pid)
+for pid in children:
+    os.waitpid(pid, 0)
+
+samples = {
+    (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+    for family in text_string_to_metric_families(render_metrics()[0].decode())
+    for sample in family.samples
+}
+assert samples[("pocketcoach_stage_seconds_count", (("stage", "work"),))] == 2, samples
+pid = str(os.getpid())
+assert samples[("pocketcoach_queue_depth", (("pid", pid),))] == 3, samples
+assert samples[("pocketcoach_queue_requests_total", (("pid", pid),))] == 7, samples
+"""
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_multiprocess_metrics_are_summed_over_workers(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    result = subprocess.run([sys.executable, "-c", FORKED_WORKERS], capture_output=True, text=True, env=env)
+    assert result.returncode == 0, result.stderr
+
+
+def test_stats_have_no_pid_label_in_one_process():
+    from prometheus_client import CollectorRegistry, generate_latest
+    from pocketcoach.metrics import StatsCollector
+
+    registry = CollectorRegistry()
+    registry.register(StatsCollector("queue", lambda: {"depth": 3, "busy": True, "name": "x"}))
+    assert generate_latest(registry).decode().splitlines()[-1] == "pocketcoach_queue_depth 3.0"
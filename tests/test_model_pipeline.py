@@ -0,0 +1,56 @@
+import sys
+import subprocess
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from pocketcoach.dl_logic.model_pipeline import ModelPipeline
+from pocketcoach.dl_logic.tokenizer import CompactTokenizer, save_compact
+
+WORDS = ["i", "feel", "happy", "sad", "so", "angry", "today"]
+TEXTS = ["I feel so happy today", "i feel sad", "SO ANGRY!", "unknown words only", ""]
+
+
+def _model(inputs, training=False):
+    # Logits depending on the first id, like a classifier with 6 emotions
+    inputs = np.asarray(inputs)
+    return np.eye(6, dtype=np.float32)[inputs[:, 0] % 6] * 3 + inputs[:, :6] / 10
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    fitted = SimpleNamespace(
+        char_level=False,
+        oov_token=None,
+        num_words=None,
+        word_index={word: i for i, word in enumerate(WORDS, 1)},
+        filters='!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n',
+        lower=True,
+        split=" ",
+    )
+    path = tmp_path / "tokenizer.vocab"
+    save_compact(fitted, path)
+    return ModelPipeline(model=_model, tokenizer=CompactTokenizer(path))
+
+
+def test_call_matches_predict_batch(pipeline):
+    batch = pipeline.predict_batch(TEXTS)
+    assert len(batch) == len(TEXTS)
+    for text, result in zip(TEXTS, batch):
+        single = pipeline(text)
+        assert [c["label"] for c in single] == [c["label"] for c in result]
+        assert [c["score"] for c in single] == pytest.approx([c["score"] for c in result])
+        assert sum(c["score"] for c in single) == pytest.approx(1.0)
+
+
+def test_predict_batch_of_nothing(pipeline):
+    assert pipeline.predict_batch([]) == []
+
+
+def test_import_needs_neither_tensorflow_nor_transformers():
+    code = (
+        "import sys, pocketcoach.dl_logic.model_pipeline, pocketcoach.dl_logic.lite_backend; "
+        "loaded = {'tensorflow', 'keras', 'transformers'} & set(sys.modules); "
+        "sys.exit(', '.join(sorted(loaded)) or None)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
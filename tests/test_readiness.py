@@ -0,0 +1,38 @@
+import pytest
+from api import readiness
+
+
+@pytest.fixture(autouse=True)
+def models(monkeypatch):
+    monkeypatch.setattr(readiness, "_MODELS", {})
+
+
+def test_ready_once_the_warmed_up_models_are_loaded():
+    readiness.register("classifier", lambda: None)
+    readiness.register("chat_model", lambda: None)
+    assert not readiness.is_ready(["classifier", "chat_model"])
+    for thread in readiness.start_warm_up(["classifier", "chat_model"]):
+        thread.join()
+    assert readiness.is_ready(["classifier", "chat_model"])
+
+
+def test_models_left_out_of_the_warm_up_do_not_block_readiness():
+    readiness.register("classifier", lambda: None)
+    readiness.register("chat_model", lambda: None)
+    for thread in readiness.start_warm_up(["classifier"]):
+        thread.join()
+    assert readiness.model_states()["chat_model"]["state"] == "pending"
+    assert readiness.is_ready(["classifier"])
+
+
+def test_failed_required_model_is_not_ready_but_optional_one_is_ignored():
+    def fail():
+        raise RuntimeError("no weights")
+
+    readiness.register("classifier", fail)
+    readiness.register("whisper", fail, required=False)
+    assert not readiness.load("classifier")
+    assert not readiness.load("whisper")
+    assert readiness.model_states()["classifier"]["error"] == "RuntimeError: no weights"
+    assert not readiness.is_ready(["classifier", "whisper"])
+    assert readiness.is_ready(["whisper"])
@@ -0,0 +1,67 @@
+import pytest
+from pocketcoach.dl_logic.result_cache import ResultCache
+
+RESULT = [{"label": "joy", "score": 0.9}, {"label": "fear", "score": 0.1}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("pocketcoach.dl_logic.result_cache.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_get_returns_a_copy():
+    cache = ResultCache(max_entries=10)
+    cache.set_version("v1")
+    cache.put(cache.key("hello"), RESULT)
+    result = cache.get(cache.key("hello"))
+    assert result == RESULT
+    result[0]["score"] = 0.0
+    assert cache.get(cache.key("hello")) == RESULT
+    assert cache.stats()["hits"] == 2
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResultCache(max_entries=10, ttl_s=60)
+    cache.put(cache.key("hello"), RESULT)
+    clock[0] += 59
+    assert cache.get(cache.key("hello")) == RESULT
+    clock[0] += 2
+    assert cache.get(cache.key("hello")) is None
+    stats = cache.stats()
+    assert (stats["expired"], stats["size"], stats["bytes"]) == (1, 0, 0)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put(cache.key("a"), RESULT)
+    cache.put(cache.key("b"), RESULT)
+    assert cache.get(cache.key("a")) is not None  # "b" is now the oldest
+    cache.put(cache.key("c"), RESULT)
+    assert cache.get(cache.key("b")) is None
+    assert cache.get(cache.key("a")) is not None
+    assert cache.get(cache.key("c")) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_new_version_drops_entries_and_changes_keys():
+    cache = ResultCache(max_entries=10)
+    cache.set_version("v1")
+    old_key = cache.key("hello")
+    cache.put(old_key, RESULT)
+    cache.set_version("v2")
+    assert cache.stats()["size"] == 0
+    assert cache.key("hello") != old_key
+    assert cache.get(cache.key("hello")) is None
+    cache.set_version("v2")
+    cache.put(cache.key("hello"), RESULT)
+    cache.set_version("v2")  # same version keeps the entries
+    assert cache.get(cache.key("hello")) == RESULT
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResultCache(max_entries=0)
+    cache.put(cache.key("hello"), RESULT)
+    assert cache.get(cache.key("hello")) is None
+    assert cache.stats()["size"] == 0
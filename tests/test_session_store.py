@@ -0,0 +1,148 @@
+import json
+import threading
+import multiprocessing
+import pytest
+from api.session_store import JsonSessionStore, SQLiteSessionStore
+
+PROCESSES = 4
+THREADS = 4
+APPENDS = 25
+
+
+def _append_worker(sessions_dir, session_ids, worker):
+    store = JsonSessionStore(sessions_dir)
+
+    def run(thread):
+        for i in range(APPENDS):
+            session_id = session_ids[(thread + i) % len(session_ids)]
+            store.append(session_id, {"role": "user", "content": f"{worker}-{thread}-{i}"})
+
+    threads = [threading.Thread(target=run, args=(thread,)) for thread in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@pytest.fixture
+def concurrent_appends(tmp_path):
+    """
+    Runs PROCESSES x THREADS writers appending to the given sessions of a
+    JSON store in `tmp_path`, returns the store.
+    """
+    def run(session_ids):
+        store = JsonSessionStore(tmp_path)
+        for session_id in session_ids:
+            store.create(session_id)
+        # fork: the writers need no pickling and start with this interpreter's imports
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=_append_worker, args=(tmp_path, session_ids, worker))
+            for worker in range(PROCESSES)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=120)
+        assert [worker.exitcode for worker in workers] == [0] * PROCESSES
+        return store
+
+    return run
+
+
+@pytest.mark.parametrize("n_sessions", [1, 16])
+def test_concurrent_appends_are_not_lost(concurrent_appends, n_sessions):
+    session_ids = [f"session-{i}" for i in range(n_sessions)]
+    store = concurrent_appends(session_ids)
+
+    stored = [message["content"] for session_id in session_ids for message in store.messages(session_id)]
+    expected = {f"{w}-{t}-{i}" for w in range(PROCESSES) for t in range(THREADS) for i in range(APPENDS)}
+    assert len(stored) == len(expected)
+    assert set(stored) == expected
+
+
+def test_index_matches_messages_after_concurrent_appends(concurrent_appends):
+    store = concurrent_appends(["session-0", "session-1"])
+    for session_id in ("session-0", "session-1"):
+        messages, start, total = store.page(session_id)
+        assert (start, total) == (0, len(messages))
+        assert messages == [dict(message, id=i) for i, message in enumerate(store.messages(session_id))]
+
+
+def test_delete_of_missing_session_raises(tmp_path):
+    store = JsonSessionStore(tmp_path)
+    store.create("session")
+    store.delete("session")
+    with pytest.raises(KeyError):
+        store.delete("session")
+    assert not store.exists("session")
+
+
+@pytest.mark.parametrize("make_store", [JsonSessionStore, lambda path: SQLiteSessionStore(path / "sessions.db")])
+def test_message_count_follows_appends(tmp_path, make_store):
+    store = make_store(tmp_path)
+    store.create("session")
+    assert store.message_count("session") == 0
+    for i in range(3):
+        store.append("session", {"role": "user", "content": f"message {i}"})
+    assert store.message_count("session") == len(store.messages("session")) == 3
+    with pytest.raises(KeyError):
+        store.message_count("missing")
+
+
+@pytest.mark.parametrize("make_store", [JsonSessionStore, lambda path: SQLiteSessionStore(path / "sessions.db")])
+def test_page_slices_with_ids(tmp_path, make_store):
+    store = make_store(tmp_path)
+    store.create("session")
+    for i in range(5):
+        store.append("session", {"role": "user", "content": f"message {i}"})
+
+    messages, start, total = store.page("session", 1, 3)
+    assert [m["id"] for m in messages] == [1, 2] and (start, total) == (1, 5)
+    messages, start, _ = store.page("session", -2)
+    assert [m["content"] for m in messages] == ["message 3", "message 4"] and start == 3
+    assert store.page("session", 7) == ([], 5, 5)
+    with pytest.raises(KeyError):
+        store.page("missing")
+
+
+def _json_session(tmp_path, n_messages):
+    store = JsonSessionStore(tmp_path)
+    store.create("session")
+    for i in range(n_messages):
+        store.append("session", {"role": "user", "content": f"message {i}"})
+    return store, tmp_path / "session.idx"
+
+
+def test_truncated_index_is_rebuilt(tmp_path):
+    store, index_path = _json_session(tmp_path, 4)
+    intact = index_path.read_bytes()
+    # Cut at a whole (start, end) pair, the header still matches the file
+    index_path.write_bytes(intact[:-16])
+
+    messages, _, total = store.page("session")
+    assert total == 4 and [m["content"] for m in messages][-1] == "message 3"
+    assert index_path.read_bytes() == intact
+
+
+def test_stale_index_is_rebuilt(tmp_path):
+    store, index_path = _json_session(tmp_path, 2)
+    stale = index_path.read_bytes()
+    store.append("session", {"role": "assistant", "content": "reply"})
+    index_path.write_bytes(stale)
+
+    assert store.message_count("session") == 3
+    messages, _, _ = store.page("session", -1)
+    assert messages == [{"role": "assistant", "content": "reply", "id": 2}]
+    assert index_path.read_bytes() != stale
+
+
+def test_index_is_built_for_hand_written_files(tmp_path):
+    store = JsonSessionStore(tmp_path)
+    messages = [{"role": "user", "content": "héllo ✨"}, {"role": "assistant", "content": "hi"}]
+    (tmp_path / "session.json").write_text(json.dumps({"messages": messages}, ensure_ascii=False), encoding="utf-8")
+
+    page, _, total = store.page("session", 1)
+    assert total == 2 and page == [dict(messages[1], id=1)]
+    assert store.page("session", 0, 1)[0] == [dict(messages[0], id=0)]
+    assert (tmp_path / "session.idx").exists()
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from pocketcoach.dl_logic.tokenizer import CompactTokenizer, save_compact
+
+KERAS_FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+# Ids as a Keras Tokenizer fitted with oov_token="<oov>" would assign them
+WORD_INDEX = {"<oov>": 1, "i": 2, "feel": 3, "happy": 4, "so": 5, "très": 6, "angry": 7}
+
+
+def _tokenizer(tmp_path, oov_token="<oov>", num_words=None, lower=True, maxlen=4):
+    fitted = SimpleNamespace(
+        char_level=False,
+        oov_token=oov_token,
+        num_words=num_words,
+        word_index=dict(WORD_INDEX),
+        filters=KERAS_FILTERS,
+        lower=lower,
+        split=" ",
+    )
+    path = tmp_path / "tokenizer.vocab"
+    save_compact(fitted, path, maxlen=maxlen)
+    return CompactTokenizer(path)
+
+
+def test_lookup(tmp_path):
+    tokenizer = _tokenizer(tmp_path)
+    assert [tokenizer.lookup(word) for word in WORD_INDEX] == list(WORD_INDEX.values())
+    assert tokenizer.lookup("unknown") == 1
+    assert tokenizer.lookup("") == 1
+
+
+def test_texts_to_sequences_lowercases_filters_and_splits(tmp_path):
+    tokenizer = _tokenizer(tmp_path)
+    texts = ["I feel SO happy!", "feel,happy\ti", "  i   feel  ", "Très ANGRY?!", "", "?!"]
+    assert tokenizer.texts_to_sequences(texts) == [[2, 3, 5, 4], [3, 4, 2], [2, 3], [6, 7], [], []]
+
+
+def test_unknown_words_map_to_oov_or_are_dropped(tmp_path):
+    assert _tokenizer(tmp_path).texts_to_sequences(["i feel blue"]) == [[2, 3, 1]]
+    assert _tokenizer(tmp_path, oov_token=None).texts_to_sequences(["i feel blue"]) == [[2, 3]]
+
+
+def test_words_beyond_num_words(tmp_path):
+    # Keras maps ids >= num_words to the OOV id, or drops them without one
+    assert _tokenizer(tmp_path, num_words=6).texts_to_sequences(["so très angry"]) == [[5, 1, 1]]
+    assert _tokenizer(tmp_path, oov_token=None, num_words=6).texts_to_sequences(["so très angry"]) == [[5]]
+
+
+def test_case_is_kept_without_lower(tmp_path):
+    assert _tokenizer(tmp_path, lower=False).texts_to_sequences(["I feel Happy"]) == [[1, 3, 1]]
+
+
+def test_encode_batch_pads_at_the_end_and_truncates_at_the_front(tmp_path):
+    tokenizer = _tokenizer(tmp_path, maxlen=4)
+    texts = ["i", "i feel so happy today", "", "so happy"]
+    expected = np.array([[2, 0, 0, 0], [3, 5, 4, 1], [0, 0, 0, 0], [5, 4, 0, 0]], dtype=np.int32)
+
+    encoded = tokenizer.encode_batch(texts)
+    assert encoded.dtype == np.int32
+    np.testing.assert_array_equal(encoded, expected)
+    np.testing.assert_array_equal(tokenizer.encode_batch(texts, maxlen=2), [[2, 0], [4, 1], [0, 0], [5, 4]])
+
+    # A reused buffer is cleared first
+    out = np.full((4, 4), 99, dtype=np.int32)
+    assert tokenizer.encode_batch(texts, out=out) is out
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_not_a_vocab_file(tmp_path):
+    path = tmp_path / "tokenizer.vocab"
+    path.write_bytes(b"not a vocabulary")
+    with pytest.raises(ValueError):
+        CompactTokenizer(path)
+    with pytest.raises(ValueError):
+        save_compact(SimpleNamespace(char_level=True), tmp_path / "char.vocab")
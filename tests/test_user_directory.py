@@ -0,0 +1,69 @@
+import json
+import multiprocessing
+from api.user_directory import UserDirectory
+
+
+def _directory(tmp_path):
+    return UserDirectory(log_path=tmp_path / "users.jsonl", legacy_path=tmp_path / "user_sessions.json")
+
+
+def _login(log_path, legacy_path, username, results):
+    results.put(UserDirectory(log_path, legacy_path).get_or_create(username)[0])
+
+
+def test_get_or_create_appends_one_line_per_user(tmp_path):
+    directory = _directory(tmp_path)
+    session_id, created = directory.get_or_create("ana")
+    assert created
+    assert directory.get_or_create("ana") == (session_id, False)
+    assert directory.username_for(session_id) == "ana"
+
+    lines = (tmp_path / "users.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [{"username": "ana", "session_id": session_id}]
+
+
+def test_concurrent_processes_share_one_session(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    args = (tmp_path / "users.jsonl", tmp_path / "user_sessions.json", "ana", results)
+    workers = [ctx.Process(target=_login, args=args) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    session_ids = {results.get(timeout=30) for _ in workers}
+    for worker in workers:
+        worker.join()
+
+    assert len(session_ids) == 1
+    assert len((tmp_path / "users.jsonl").read_text().splitlines()) == 1
+
+
+def test_legacy_file_is_imported_once(tmp_path):
+    (tmp_path / "user_sessions.json").write_text(json.dumps({"ana": "s1", "bob": "s2"}))
+    directory = _directory(tmp_path)
+    assert directory.as_dict() == {"ana": "s1", "bob": "s2"}
+
+    # Later changes to the legacy file are ignored once the log exists
+    (tmp_path / "user_sessions.json").write_text(json.dumps({"eve": "s3"}))
+    assert _directory(tmp_path).as_dict() == {"ana": "s1", "bob": "s2"}
+
+
+def test_miss_reads_entries_appended_elsewhere(tmp_path):
+    directory = _directory(tmp_path)
+    other = _directory(tmp_path)
+    assert directory.session_for("ana") is None
+
+    session_id, _ = other.get_or_create("ana")
+    assert directory.session_for("ana") == session_id
+    assert directory.username_for(session_id) == "ana"
+    assert directory.username_for("unknown") is None
+
+
+def test_partial_and_corrupt_lines_are_skipped(tmp_path):
+    log_path = tmp_path / "users.jsonl"
+    log_path.write_text('{"username": "ana", "session_id": "s1"}\nnot json\n{"username": "bob"')
+    directory = _directory(tmp_path)
+    assert directory.as_dict() == {"ana": "s1"}
+
+    with open(log_path, "a") as f:
+        f.write(', "session_id": "s2"}\n')
+    assert directory.session_for("bob") == "s2"